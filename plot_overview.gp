@@ -0,0 +1,59 @@
+# Overview plots of a whole batch of simulations, from the tables written by
+# team_2_plot.py (which runs this script for you if Gnuplot is installed):
+#   $ python3 team_2_plot.py
+# or, once the tables exist:
+#   $ gnuplot plot_overview.gp
+# The images are written next to the tables, in output/plots.
+if (!exists("dir")) dir = "output/plots"
+
+set terminal png size 1000,700
+set style line 1 lt 1 lw 3 linecolor rgb "red"
+set style line 2 lt 1 lw 3 linecolor rgb "blue"
+set style line 3 lt 1 lw 3 linecolor rgb "green"
+
+# Each allele's frequency over time: the 5-95% and 25-75% bands and the median
+# (written only if the trajectories were saved)
+bands = dir."/bands.tsv"
+if (system("[ -e '".bands."' ] && echo 1 || echo 0") + 0) {
+    set output dir."/frequency_bands.png"
+    set title "Allele Frequencies Over Time (5-95% and 25-75% of simulations, median)"
+    set xlabel "Generation"
+    set ylabel "Allele Frequency"
+    set yrange [0.0:1.0]
+    set key top right
+    set style fill transparent solid 0.15 noborder
+    plot bands using 1:3:7 with filledcurves linecolor rgb "red" notitle, \
+         bands using 1:4:6 with filledcurves linecolor rgb "red" notitle, \
+         bands using 1:5 with lines ls 1 title "a_0", \
+         bands using 1:9:13 with filledcurves linecolor rgb "blue" notitle, \
+         bands using 1:10:12 with filledcurves linecolor rgb "blue" notitle, \
+         bands using 1:11 with lines ls 2 title "a_1", \
+         bands using 1:15:19 with filledcurves linecolor rgb "green" notitle, \
+         bands using 1:16:18 with filledcurves linecolor rgb "green" notitle, \
+         bands using 1:17 with lines ls 3 title "a_2"
+    set output
+}
+
+# The generations to fixation
+set output dir."/fixation_histogram.png"
+set title "Generations to Fixation"
+set xlabel "Generation"
+set ylabel "Simulations"
+set autoscale y
+set yrange [0:*]
+set nokey
+set style fill solid 0.5 border
+plot dir."/fixation_histogram.tsv" using (($1 + $2 + 1)/2):3:($2 - $1 + 1) \
+     with boxes linecolor rgb "black"
+set output
+
+# How often each allele became fixed
+set output dir."/fixation_shares.png"
+set title "Fixations by Allele"
+set xlabel "Allele fixed"
+set ylabel "Fraction of Simulations"
+set yrange [0.0:1.0]
+set boxwidth 0.6
+set xrange [-0.5:3.5]
+plot dir."/fixation_shares.tsv" using 0:3:xtic(1) with boxes linecolor rgb "purple"
+set output
@@ -0,0 +1,297 @@
+"""
+    A batched engine that simulates many replicates of the same species at once.
+
+    For small populations (like the default 95 individuals), simulating one
+    generation with the vectorized kernel takes only a few array operations, so
+    most of the time goes to Python overhead per generation. This engine instead
+    stores R replicates as a single (R, N, 2) array of alleles and an (R, N)
+    array of sexes, and advances all of them together, so that the overhead is
+    shared by the whole batch. Replicates that have reached fixation are dropped
+    from the arrays, and the rest carry on until every one of them is finished.
+
+    The mating model is exactly that of simulateGenerationVectorized() (see
+    team_2_kernel.py), applied to each replicate independently. The replicates
+    in a batch share one random number stream, though, so replicate i of a batch
+    is not the same run as replicate i of the "vectorized" engine with the same
+    seed (it is, of course, statistically equivalent).
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import math
+import numpy as np
+from team_2_random import DriftRandom
+from team_2_profiling import NULL_PROFILER
+
+
+def simulateGenerationBatched( alleles, sexes, litterSampler, rng,
+                               profiler=NULL_PROFILER ):
+    """
+        Simulates a single generation of reproduction for a batch of
+        populations of the same size.
+
+        Params:
+            alleles: a uint8 array of shape (R, N, 2) holding the alleles of
+                     each individual of each population
+            sexes: a bool array of shape (R, N); True means female
+            litterSampler: the species' LitterSizeSampler
+            rng: a numpy.random.Generator
+            profiler: a Profiler to time the phases of the generation with (see
+                      team_2_profiling.py)
+        Return: a 2-tuple of the child generations' (alleles, sexes), with the
+                same shapes as the parents'
+    """
+    numReplicates, size = sexes.shape
+    rows = np.arange(numReplicates)[:, np.newaxis]
+
+    # Separate the parents by sex: sorting each row puts its males first
+    byParentSex = np.argsort( sexes, axis=1, kind="stable" )
+    numFemales = np.count_nonzero( sexes, axis=1 )
+    numMales = size - numFemales
+    if not ( numMales.all() and numFemales.all() ):
+        stuck = int( np.flatnonzero( (numMales == 0) | (numFemales == 0) )[0] )
+        exit( "Sorry, the population can no longer reproduce (it has "
+              + str(numMales[stuck]) + " males and " + str(numFemales[stuck])
+              + " females)." )
+    profiler.lap("partition")
+
+    # Draw litter sizes for every population until each has enough children
+    numLitters = int( 1.1 * size / max(litterSampler.mean, 1e-9) ) + 16
+    litterSizes = litterSampler.drawMany( numReplicates*numLitters, rng ) \
+                               .reshape( numReplicates, numLitters )
+    childrenSoFar = np.cumsum( litterSizes, axis=1 )
+    while ( childrenSoFar[:, -1] < size ).any():
+        moreLitters = litterSampler.drawMany( numReplicates*numLitters, rng ) \
+                                   .reshape( numReplicates, numLitters )
+        litterSizes = np.concatenate( (litterSizes, moreLitters), axis=1 )
+        childrenSoFar = np.cumsum( litterSizes, axis=1 )
+    numLitters = litterSizes.shape[1]
+
+    # As in the single-population kernel, only the litters up to (and
+    # including) the one that reached the population size count
+    litterCounts = np.count_nonzero( childrenSoFar < size, axis=1 ) + 1
+    totalChildren = childrenSoFar[ np.arange(numReplicates), litterCounts - 1 ]
+    profiler.lap("litters")
+    profiler.count("litters", litterCounts.sum())
+    profiler.count("children", totalChildren.sum())
+    profiler.count("childrenDiscarded", totalChildren.sum() - numReplicates*size)
+
+    # Choose the parents of each litter: an index into the row's males for
+    # dads, and into its females (which come after the males) for moms
+    dads = rng.integers( 0, numMales[:, np.newaxis], size=(numReplicates, numLitters) )
+    moms = numMales[:, np.newaxis] \
+           + rng.integers( 0, numFemales[:, np.newaxis],
+                           size=(numReplicates, numLitters) )
+    profiler.lap("parents")
+
+    # Pick which children survive: a random subset (in birth order) of each
+    # population's children, so that any overshoot is trimmed at random
+    mostChildren = int( totalChildren.max() )
+    if mostChildren > size:
+        keys = rng.random( (numReplicates, mostChildren) )
+        keys[ np.arange(mostChildren) >= totalChildren[:, np.newaxis] ] = 2.0
+        children = np.sort( np.argpartition(keys, size - 1, axis=1)[:, :size], axis=1 )
+    else:
+        children = np.broadcast_to( np.arange(size), (numReplicates, size) )
+    profiler.lap("trim")
+
+    # Find each surviving child's litter with a single search over all the
+    # populations' (offset) running totals
+    rowLength = mostChildren + 1
+    offsets = rows * rowLength
+    flatTotals = ( np.minimum(childrenSoFar, mostChildren) + offsets ).ravel()
+    litters = np.searchsorted( flatTotals, (children + offsets).ravel(), side="right" )
+    litters = litters.reshape( numReplicates, size ) - rows * numLitters
+
+    # Turn the litters' parents into the parents' positions in the population
+    dads = np.take_along_axis( byParentSex,
+                               np.take_along_axis(dads, litters, axis=1), axis=1 )
+    moms = np.take_along_axis( byParentSex,
+                               np.take_along_axis(moms, litters, axis=1), axis=1 )
+    profiler.lap("parents")
+
+    # Each child gets one random allele from each parent, in random order
+    flatAlleles = alleles.reshape(-1)
+    rowStarts = rows * size
+    fromDad = flatAlleles[ 2*(rowStarts + dads)
+                           + rng.integers(0, 2, size=(numReplicates, size)) ]
+    fromMom = flatAlleles[ 2*(rowStarts + moms)
+                           + rng.integers(0, 2, size=(numReplicates, size)) ]
+    swap = rng.integers( 0, 2, size=(numReplicates, size) ).astype(bool)
+    childAlleles = np.empty( (numReplicates, size, 2), dtype=np.uint8 )
+    childAlleles[:, :, 0] = np.where( swap, fromMom, fromDad )
+    childAlleles[:, :, 1] = np.where( swap, fromDad, fromMom )
+
+    childSexes = rng.integers( 0, 2, size=(numReplicates, size) ).astype(bool)
+    profiler.lap("genotypes")
+
+    return childAlleles, childSexes
+
+
+def countAllelesBatched( alleles ):
+    """
+        Param alleles: a uint8 array of shape (R, N, 2)
+        Return: an int64 array of shape (R, 3) with the number of copies of
+                alleles 0, 1 and 2 in each population
+    """
+    flat = alleles.reshape( len(alleles), -1 )
+    return np.stack( [ np.count_nonzero(flat == allele, axis=1)
+                       for allele in range(3) ], axis=1 ).astype(np.int64)
+
+
+def heterozygositiesBatched( alleles ):
+    """
+        Param alleles: a uint8 array of shape (R, N, 2)
+        Return: a list of the fraction of heterozygotes in each population
+    """
+    numHeterozygotes = np.count_nonzero( alleles[:, :, 0] != alleles[:, :, 1], axis=1 )
+    return ( numHeterozygotes / alleles.shape[1] ).tolist()
+
+
+def startingPopulations( species, numReplicates, generator ):
+    """
+        Arranges each replicate's starting population at random: a random
+        arrangement of the species' alleles, and random sexes.
+
+        Params:
+            species: the Species whose allele counts to start from
+            numReplicates: the number of populations to arrange
+            generator: a numpy.random.Generator
+        Return: a 2-tuple: the (R, N, 2) array of alleles, and the (R, N)
+                array of sexes
+    """
+    size = species.getPopulationSize()
+    pool = np.repeat( np.arange(3, dtype=np.uint8), species.getAlleleCounts() )
+    arrangements = np.argsort( generator.random( (numReplicates, 2*size) ),
+                               axis=1 )
+    alleles = pool[arrangements].reshape( numReplicates, size, 2 )
+    sexes = generator.integers( 0, 2, size=(numReplicates, size) ).astype(bool)
+    return alleles, sexes
+
+
+def simulateDriftBatched( species, numReplicates, endAfterFixedNumGenerations=False,
+                          numGenerations=0, rng=None, recorders=None,
+                          profiler=None, populations=None ):
+    """
+        Simulates genetic drift in many independent populations of a species.
+
+        Each replicate starts from its own random arrangement of the species'
+        alleles (and random sexes), just as if a separate Species had been
+        created for it.
+
+        Parameters:
+            species: the Species to simulate. Its population size, current
+                     allele counts and litter sizes are used; its individuals
+                     are left untouched.
+            numReplicates: the number of populations to simulate
+            endAfterFixedNumGenerations: If true, the simulation will run for a
+                     predetermined number of generations. If false, each
+                     replicate will continue until one allele has become fixed.
+            numGenerations: the number of generations to run (only used with
+                     endAfterFixedNumGenerations)
+            rng: the DriftRandom to draw all random numbers from (a freshly
+                 seeded one is used if None)
+            recorders: a list of numReplicates Recorders (see
+                 team_2_recording.py), one per replicate, to hand each
+                 generation's frequencies to instead of keeping them all
+            profiler: a Profiler to time each generation of the whole batch
+                 with (see team_2_profiling.py). Its run count goes up by
+                 numReplicates.
+            populations: the replicates' starting populations, as returned by
+                 startingPopulations() (if None, they are arranged from rng)
+
+        Returns: a list of numReplicates lists of 3-tuples, each one the
+                 frequencies over time of a replicate, as returned by
+                 simulateDrift() (or the list of recorders, if given)
+    """
+    # Sanity-check the input
+    if (not endAfterFixedNumGenerations) and numGenerations != 0:
+        exit("Sorry, you can't request that we simulate drift until fixation while "
+             + "also running a fixed number of generations.")
+    elif endAfterFixedNumGenerations and numGenerations < 0:
+        exit("Sorry, number of generations to simulate must be positive.")
+
+    if math.fsum(species.getProbOfProducingNumOffspring().values()) != 1.0:
+        exit( "Sorry, probabilities of producing offspring must sum to 1 "\
+              + "(yours sum to "\
+              + str( math.fsum(species.getProbOfProducingNumOffspring().values()) )\
+              + ")." )
+
+    if rng is None:
+        rng = DriftRandom()
+    if profiler is None:
+        profiler = NULL_PROFILER
+    generator = rng.generator
+
+    size = species.getPopulationSize()
+    totalAlleles = 2*size
+    litterSampler = species.getLitterSizeSampler()
+
+    if populations is None:
+        populations = startingPopulations( species, numReplicates, generator )
+    alleles, sexes = populations
+
+    def heterozygosities( alleles ):
+        """
+            Private to simulateDriftBatched(): only recorders keep the
+            heterozygosity, so don't work it out otherwise
+        """
+        if recorders is None:
+            return [ math.nan ] * len(alleles)
+        return heterozygositiesBatched( alleles )
+
+    counts = countAllelesBatched( alleles )
+    if recorders is None:
+        results = [ [] for replicate in range(numReplicates) ]
+        remember = lambda replicate, frequencies, heterozygosity: \
+                   results[replicate].append( tuple(frequencies) )
+    else:
+        if len(recorders) != numReplicates:
+            exit("Sorry, the batched engine needs exactly one recorder per replicate.")
+        remember = lambda replicate, frequencies, heterozygosity: \
+                   recorders[replicate].record( currentGen, tuple(frequencies),
+                                                heterozygosity )
+    currentGen = 0
+    for replicate, frequencies, heterozygosity in zip(
+            range(numReplicates), (counts / totalAlleles).tolist(),
+            heterozygosities(alleles) ):
+        remember( replicate, frequencies, heterozygosity )
+
+    # The replicates still being simulated (by their position in results)
+    active = np.arange( numReplicates )
+    if not endAfterFixedNumGenerations:
+        unfinished = ( counts != totalAlleles ).all( axis=1 )
+        active, alleles, sexes = active[unfinished], alleles[unfinished], \
+                                 sexes[unfinished]
+
+    while len(active) > 0 and not ( endAfterFixedNumGenerations
+                                    and currentGen >= numGenerations ):
+        profiler.startGeneration()
+        alleles, sexes = simulateGenerationBatched( alleles, sexes, litterSampler,
+                                                    generator, profiler )
+        currentGen += 1
+
+        counts = countAllelesBatched( alleles )
+        for replicate, frequencies, heterozygosity in zip(
+                active.tolist(), (counts / totalAlleles).tolist(),
+                heterozygosities(alleles) ):
+            remember( replicate, frequencies, heterozygosity )
+        profiler.lap("record")
+
+        # Drop the replicates that have just reached fixation
+        if not endAfterFixedNumGenerations:
+            unfinished = ( counts != totalAlleles ).all( axis=1 )
+            if not unfinished.all():
+                active, alleles, sexes = active[unfinished], alleles[unfinished], \
+                                         sexes[unfinished]
+        profiler.lap("mask")
+        profiler.endGeneration()
+
+    for replicate in range(numReplicates):
+        profiler.endRun()
+
+    if recorders is not None:
+        for recorder in recorders:
+            recorder.finish()
+        return recorders
+    return results
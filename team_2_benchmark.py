@@ -0,0 +1,266 @@
+"""
+    Benchmarks for the drift simulator.
+
+    Times, for every combination of population size, litter-size distribution,
+    starting frequencies and engine in the grid:
+        - building the Species
+        - simulating a single generation
+        - simulating a fixed number of generations with simulateDrift()
+        - writing the resulting trajectory (binary and tab-separated)
+    and reports generations/sec, individuals/sec and peak memory. The results
+    are saved as JSON, so that a later run can be compared against them.
+
+    The "batched" engine simulates BATCH_REPLICATES populations at once, so
+    its generations/sec and individuals/sec count the generations of every
+    population in the batch, and its construction time is that of building
+    all of the batch's populations. The "leap" engine counts the generations it
+    leaps over.
+
+    Usage:
+        $ python3 team_2_benchmark.py
+        $ python3 team_2_benchmark.py --pop-sizes 95,10000 --engines vectorized
+        $ python3 team_2_benchmark.py --compare benchmarks/baseline.json
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from team_2_species import Species
+from team_2_simulator import simulateDrift
+from team_2_wright_fisher import simulateDriftWrightFisher
+from team_2_leap import simulateDriftLeap
+from team_2_batched import simulateDriftBatched, startingPopulations
+from team_2_random import DriftRandom
+from team_2_trajectories import TrajectoryWriter, writeTsv
+
+# Named litter-size distributions (see probOfLitterSize in team_2_settings.py)
+LITTER_SIZES = { "default": { 1: 0.95, 2: 0.05 },
+                 "cat": { 1: 0.1, 2: 0.2, 3: 0.4, 4: 0.2, 5: 0.1 },
+                 "turtle": { 100: 0.1, 101: 0.4, 102: 0.3, 103: 0.2 } }
+
+# Named starting frequencies
+STARTING_FREQUENCIES = { "default": ( 0.45, 0.42, 0.13 ),
+                         "even": ( 0.34, 0.33, 0.33 ),
+                         "rare": ( 0.9, 0.09, 0.01 ) }
+
+ENGINES = [ "individual", "vectorized", "wrightfisher", "batched", "leap" ]
+
+# The number of populations the "batched" engine simulates together
+BATCH_REPLICATES = 100
+
+# How much slower a measurement may be than its baseline before --compare
+# calls it a regression
+REGRESSION_TOLERANCE = 1.10
+
+
+def bestTime( function, repeats, setup=None ):
+    """
+        Return: the fastest of `repeats` timings of function() (in seconds).
+                If setup is given, function(setup()) is timed instead, without
+                counting the time spent in setup().
+    """
+    best = float("inf")
+    for repeat in range(repeats):
+        arguments = () if setup is None else ( setup(), )
+        start = time.perf_counter()
+        function( *arguments )
+        best = min( best, time.perf_counter() - start )
+    return best
+
+
+def benchmarkPoint( popSize, litterName, frequencyName, engine, numGenerations,
+                    repeats, seed ):
+    """
+        Benchmarks a single point of the grid.
+
+        Return: a dictionary of the measurements
+    """
+    probOfLitterSize = LITTER_SIZES[litterName]
+    startingFrequencies = STARTING_FREQUENCIES[frequencyName]
+    compact = engine != "individual"
+    numReplicates = BATCH_REPLICATES if engine == "batched" else 1
+
+    def makeSpecies():
+        rng = DriftRandom(seed)
+        species = Species( popSize, startingFrequencies, probOfLitterSize,
+                           compact=compact, rng=rng )
+        if engine == "batched":
+            # The batch's populations are built along with the species
+            return species, startingPopulations( species, numReplicates,
+                                                 rng.generator )
+        return species
+
+    def simulate( species, generations ):
+        if engine == "wrightfisher":
+            return simulateDriftWrightFisher( species, True, generations,
+                                              DriftRandom(seed) )
+        if engine == "leap":
+            return simulateDriftLeap( species, True, generations, DriftRandom(seed) )
+        if engine == "batched":
+            species, populations = species
+            results = simulateDriftBatched( species, numReplicates, True,
+                                            generations, DriftRandom(seed),
+                                            populations=populations )
+            # (The first population's trajectory stands in for the batch's)
+            return results[0]
+        return simulateDrift( species, True, generations, engine, DriftRandom(seed) )
+
+    # Warm up (imports, caches, etc.) before timing anything
+    simulate( makeSpecies(), 1 )
+
+    constructionTime = bestTime( makeSpecies, repeats )
+    generationTime = bestTime( lambda species: simulate(species, 1), repeats,
+                               makeSpecies )
+    runTime = bestTime( lambda species: simulate(species, numGenerations), repeats,
+                        makeSpecies )
+
+    # Time writing the trajectory in both formats
+    trajectory = simulate( makeSpecies(), numGenerations )
+    generations = None
+    if engine == "leap":
+        # The leap engine only returns the generations it leapt to
+        generations = [ generation for generation, _ in trajectory ]
+        trajectory = [ frequencies for _, frequencies in trajectory ]
+    with tempfile.TemporaryDirectory() as directory:
+        def writeBinary():
+            with TrajectoryWriter( os.path.join(directory, "trajectories.bin") ) \
+                    as writer:
+                writer.addRun( trajectory, generations )
+        binaryWriteTime = bestTime( writeBinary, repeats )
+        tsvWriteTime = bestTime(
+            lambda: writeTsv( os.path.join(directory, "run.tsv"), trajectory,
+                              generations ),
+            repeats )
+
+    # Measure memory separately, since tracing slows everything down
+    tracemalloc.start()
+    simulate( makeSpecies(), numGenerations )
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return { "popSize": popSize,
+             "litterSizes": litterName,
+             "startingFrequencies": frequencyName,
+             "engine": engine,
+             "generations": numGenerations,
+             "replicates": numReplicates,
+             "constructionSeconds": constructionTime,
+             "generationSeconds": generationTime,
+             "runSeconds": runTime,
+             "generationsPerSecond": numGenerations * numReplicates / runTime,
+             "individualsPerSecond": numGenerations * numReplicates * popSize
+                                     / runTime,
+             "binaryWriteSeconds": binaryWriteTime,
+             "tsvWriteSeconds": tsvWriteTime,
+             "peakMemoryBytes": peakMemory }
+
+
+def pointKey( result ):
+    """
+        Return: what identifies a grid point, for comparing against a baseline
+    """
+    return ( result["popSize"], result["litterSizes"],
+             result["startingFrequencies"], result["engine"],
+             result["generations"] )
+
+
+def compareToBaseline( results, baseline ):
+    """
+        Prints the change in generations/sec for every grid point that is also
+        in the baseline.
+
+        Return: the number of regressions (points at least
+                REGRESSION_TOLERANCE times slower than the baseline)
+    """
+    baselineByKey = { pointKey(result): result for result in baseline["results"] }
+    numRegressions = 0
+    print("\nComparison to baseline (generations/sec, new / old):")
+    for result in results:
+        old = baselineByKey.get( pointKey(result) )
+        if old is None:
+            continue
+        ratio = result["generationsPerSecond"] / old["generationsPerSecond"]
+        flag = ""
+        if ratio * REGRESSION_TOLERANCE < 1:
+            flag = "  <-- REGRESSION"
+            numRegressions += 1
+        print( "  " + str(pointKey(result)) + ": " + format(ratio, ".2f") + "x"
+               + flag )
+    return numRegressions
+
+
+def parseList( text, convert=str ):
+    return [ convert(item) for item in text.split(",") if item != "" ]
+
+
+def main( arguments ):
+    parser = argparse.ArgumentParser( description="Benchmark the drift simulator." )
+    parser.add_argument( "--pop-sizes", default="95,1000,10000",
+                         help="comma-separated population sizes" )
+    parser.add_argument( "--litters", default="default,cat",
+                         help="comma-separated litter-size distributions ("
+                              + ", ".join(LITTER_SIZES) + ")" )
+    parser.add_argument( "--frequencies", default="default",
+                         help="comma-separated starting frequencies ("
+                              + ", ".join(STARTING_FREQUENCIES) + ")" )
+    parser.add_argument( "--engines", default=",".join(ENGINES),
+                         help="comma-separated engines (" + ", ".join(ENGINES) + ")" )
+    parser.add_argument( "--generations", type=int, default=20,
+                         help="generations per timed run" )
+    parser.add_argument( "--repeats", type=int, default=3,
+                         help="timings per measurement (the fastest is kept)" )
+    parser.add_argument( "--seed", type=int, default=1 )
+    parser.add_argument( "--output", default="benchmarks/latest.json",
+                         help="where to save the results" )
+    parser.add_argument( "--compare", default=None,
+                         help="a previously saved result file to compare against" )
+    options = parser.parse_args( arguments )
+
+    results = []
+    header = ( "popSize", "litters", "freqs", "engine", "gens/sec",
+               "indiv/sec", "build (s)", "peak MB" )
+    print( "%9s %8s %8s %13s %12s %12s %10s %9s" % header )
+    for popSize in parseList( options.pop_sizes, int ):
+        for litterName in parseList( options.litters ):
+            for frequencyName in parseList( options.frequencies ):
+                for engine in parseList( options.engines ):
+                    result = benchmarkPoint( popSize, litterName, frequencyName,
+                                             engine, options.generations,
+                                             options.repeats, options.seed )
+                    results.append( result )
+                    print( "%9d %8s %8s %13s %12.1f %12.3g %10.4f %9.2f"
+                           % ( popSize, litterName, frequencyName, engine,
+                               result["generationsPerSecond"],
+                               result["individualsPerSecond"],
+                               result["constructionSeconds"],
+                               result["peakMemoryBytes"] / 2**20 ) )
+
+    outputDir = os.path.dirname( options.output )
+    if outputDir != "" and not os.path.exists( outputDir ):
+        os.makedirs( outputDir )
+    with open( options.output, "w" ) as outputFile:
+        json.dump( { "python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "machine": platform.machine(),
+                     "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                     "results": results },
+                   outputFile, indent=1 )
+    print( "\nSaved results to " + options.output )
+
+    if options.compare is not None:
+        with open( options.compare ) as baselineFile:
+            if compareToBaseline( results, json.load(baselineFile) ) > 0:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit( main( sys.argv[1:] ) )
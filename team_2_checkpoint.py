@@ -0,0 +1,112 @@
+"""
+    Checkpoints of a simulation in progress.
+
+    A checkpoint is a compressed NumPy .npz file holding everything needed to
+    carry on a run exactly where it left off:
+        alleles, sexes: the current population (see Population)
+        results:        the frequencies over time so far, one row per generation
+                        (if the run has no Recorder)
+        recorderGenerations, recorderFrequencies, recorderHeterozygosities:
+                        the generations a Recorder has kept so far (if the run
+                        has one; see Recorder.toArrays())
+        counts:         the allele counts, if the run has switched to the
+                        reduced allele-count engine (see reduceAfterLoss)
+        metadata:       UTF-8 JSON with the species' parameters, the options
+                        simulateDrift() was called with, the number of males
+                        (for the reduced engine), the rest of the Recorder's
+                        state and the complete state of the random number
+                        generators
+
+    Since the random number generator state is saved along with the population,
+    a resumed run produces bit-for-bit the same results as one that was never
+    interrupted. See resumeDrift() in team_2_simulator.py.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import json
+import os
+import numpy as np
+from team_2_population import Population
+from team_2_recording import Recorder
+
+
+def encodeRandomState( state ):
+    """
+        Return: a DriftRandom's state (see DriftRandom.getstate()) in a form
+                that can be written as JSON
+    """
+    seed, randomState, generatorState = state
+    version, internalState, gaussNext = randomState
+    return { "seed": seed,
+             "random": [ version, list(internalState), gaussNext ],
+             "generator": generatorState }
+
+
+def decodeRandomState( encoded ):
+    """
+        Return: the DriftRandom state encoded by encodeRandomState()
+    """
+    version, internalState, gaussNext = encoded["random"]
+    return ( encoded["seed"], ( version, tuple(internalState), gaussNext ),
+             encoded["generator"] )
+
+
+def saveCheckpoint( path, population, results, rng, metadata, counts=None,
+                    recorder=None ):
+    """
+        Writes a checkpoint. The file is written under a temporary name and then
+        renamed, so a run killed mid-write leaves the previous checkpoint intact.
+
+        Params:
+            path: the checkpoint file
+            population: the current population, as a Population
+            results: the frequencies over time so far
+            rng: the run's DriftRandom
+            metadata: a JSON-friendly dictionary of everything else needed to
+                      resume the run
+            counts: the allele counts (only for the reduced engine)
+            recorder: the run's Recorder, if it has one
+    """
+    metadata = dict( metadata, rng=encodeRandomState( rng.getstate() ) )
+    if recorder is not None:
+        metadata["recorder"] = recorder.toDict()
+    arrays = { "alleles": population.alleles,
+               "sexes": population.sexes,
+               "results": np.asarray(results, dtype=np.float64),
+               "metadata": np.frombuffer( json.dumps(metadata).encode("utf-8"),
+                                          dtype=np.uint8 ) }
+    if counts is not None:
+        arrays["counts"] = np.asarray(counts, dtype=np.int64)
+    if recorder is not None:
+        for name, array in recorder.toArrays().items():
+            arrays[ "recorder" + name[0].upper() + name[1:] ] = array
+
+    directory = os.path.dirname(path)
+    if directory != "" and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open( path + ".partial", "wb" ) as checkpointFile:
+        np.savez_compressed( checkpointFile, **arrays )
+    os.replace( path + ".partial", path )
+
+
+def loadCheckpoint( path ):
+    """
+        Reads a checkpoint written by saveCheckpoint().
+
+        Return: a 6-tuple of ( the Population, the frequencies over time so far
+                (a list of 3-tuples), the DriftRandom state, the metadata
+                dictionary, the allele counts or None, the Recorder or None )
+    """
+    with np.load( path ) as checkpoint:
+        metadata = json.loads( checkpoint["metadata"].tobytes().decode("utf-8") )
+        population = Population( checkpoint["alleles"], checkpoint["sexes"] )
+        results = [ tuple(row) for row in checkpoint["results"].tolist() ]
+        counts = checkpoint["counts"] if "counts" in checkpoint.files else None
+        recorder = None
+        if "recorder" in metadata:
+            recorder = Recorder.fromDict( metadata["recorder"], {
+                name: checkpoint[ "recorder" + name[0].upper() + name[1:] ]
+                for name in [ "generations", "frequencies", "heterozygosities" ] } )
+    return ( population, results, decodeRandomState( metadata["rng"] ),
+             metadata, counts, recorder )
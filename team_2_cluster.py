@@ -0,0 +1,411 @@
+"""
+    Spreading simulations over several machines that share a filesystem.
+
+    A job store (a SQLite database on the shared filesystem) holds a queue of
+    jobs, each a block of replicates of one set of settings. A coordinator
+    fills the store with the jobs of a batch (or of every point of a sweep);
+    any number of workers, on any machines that can see the file, then take
+    jobs from it, run them, and write their statistics back; finally the
+    coordinator merges each batch's statistics. No server is needed: all the
+    coordination goes through SQLite's file locks.
+
+    Leases: a worker that takes a job holds a lease on it, which it renews
+    every LEASE_SECONDS / 3 seconds while the job runs. If the worker dies (or
+    its machine does), the lease runs out and another worker takes the job
+    over. A job that fails (with an error, or by killing its worker) is
+    retried, up to MAX_ATTEMPTS times in all. Since each replicate's random
+    numbers depend only on the seed and its number, a job gives the same
+    results no matter who runs it, or how often.
+
+    As with sweeps, only the statistics of each job come back (see
+    FixationStatistics in team_2_statistics.py), not the frequencies over time.
+
+    Each worker runs its jobs over --workers processes (by default, the
+    numberOfWorkers of the settings the job was submitted with), so give it
+    the number of cores of the machine it runs on.
+
+    Jobs are never checkpointed (checkpointEvery is ignored), since the
+    workers would share the checkpoints.
+
+    Usage:
+        $ python3 team_2_cluster.py submit jobs.db --seed 1234 --job-runs 500
+                                                  (the batch in team_2_settings.py)
+        $ python3 team_2_cluster.py submit-sweep jobs.db grid.json --seed 1234
+        $ python3 team_2_cluster.py work jobs.db --workers 8
+                                                  (on each machine)
+        $ python3 team_2_cluster.py status jobs.db
+        $ python3 team_2_cluster.py collect jobs.db
+
+    SQLite's locking is only as good as the shared filesystem's: it works on
+    most NFS setups, but not on some network filesystems that ignore locks.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from team_2_runner import currentSettings, iterReplicates, iterAdaptiveReplicates
+from team_2_statistics import FixationStatistics
+from team_2_sweep import normalizeParameters, expandGrid, pointHash, \
+                         describePoint, writeSummary, summarizeEstimate
+from team_2_estimate import estimateStatistics
+
+# How long (in seconds) a worker's claim on a job lasts without being renewed
+LEASE_SECONDS = 300
+
+# How many times a job is tried before it is given up on
+MAX_ATTEMPTS = 3
+
+# How long (in seconds) an idle worker waits before looking for jobs again
+POLL_SECONDS = 10
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        tag TEXT NOT NULL,            -- the batch (or sweep point) it belongs to
+        settings TEXT NOT NULL,       -- JSON, as returned by currentSettings()
+        seed INTEGER NOT NULL,
+        firstReplicate INTEGER NOT NULL,
+        numReplicates INTEGER NOT NULL,
+        state TEXT NOT NULL,          -- pending, leased, done or failed
+        worker TEXT,
+        leaseExpires REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,                  -- JSON, from FixationStatistics.toDict()
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobsByState ON jobs (state, leaseExpires);
+"""
+
+
+def openStore( path ):
+    """
+        Opens (creating it if necessary) a job store.
+
+        Return: a sqlite3 connection, in autocommit mode (so each transaction
+                is begun explicitly)
+    """
+    connection = sqlite3.connect( path, timeout=120, isolation_level=None )
+    connection.executescript( SCHEMA )
+    return connection
+
+
+def addJobs( connection, tag, settings, numRuns, seed, jobRuns, firstReplicate=0 ):
+    """
+        Adds a batch's jobs to the store: numRuns replicates, jobRuns per job.
+
+        Params:
+            connection: the job store
+            tag: the name the batch's results are collected under
+            settings: the simulation parameters, as returned by currentSettings()
+            numRuns: the number of replicates in the batch
+            seed: the batch's seed
+            jobRuns: the number of replicates per job
+            firstReplicate: the number of the batch's first replicate
+        Return: the number of jobs added
+    """
+    if jobRuns < 1:
+        exit("Sorry, each job needs at least one replicate.")
+    text = json.dumps( dict( settings, probOfLitterSize=sorted(
+                                 settings["probOfLitterSize"].items() ) ) )
+    jobs = [ ( tag, text, seed, first,
+               min(jobRuns, firstReplicate + numRuns - first), "pending" )
+             for first in range(firstReplicate, firstReplicate + numRuns, jobRuns) ]
+    connection.execute( "BEGIN IMMEDIATE" )
+    connection.executemany( "INSERT INTO jobs (tag, settings, seed, firstReplicate, "
+                            + "numReplicates, state) VALUES (?, ?, ?, ?, ?, ?)", jobs )
+    connection.execute( "COMMIT" )
+    return len(jobs)
+
+
+def loadSettings( text ):
+    """
+        Return: the settings stored (as JSON) with a job
+    """
+    settings = json.loads( text )
+    settings["probOfLitterSize"] = dict( settings["probOfLitterSize"] )
+    return normalizeParameters( settings )
+
+
+def claimJob( connection, worker ):
+    """
+        Takes the next job that is waiting (or whose lease has run out) and
+        leases it to a worker. A job whose lease has run out MAX_ATTEMPTS times
+        (e.g. because it keeps killing its worker) is marked as failed instead.
+
+        Return: a (job id, settings, seed, firstReplicate, numReplicates) tuple,
+                or None if no job is waiting
+    """
+    now = time.time()
+    connection.execute( "BEGIN IMMEDIATE" )
+    try:
+        connection.execute( "UPDATE jobs SET state = 'failed', error = ? WHERE "
+                            + "state = 'leased' AND leaseExpires < ? AND attempts >= ?",
+                            ("The lease ran out on every attempt (the worker died).",
+                             now, MAX_ATTEMPTS) )
+        row = connection.execute(
+            "SELECT id, settings, seed, firstReplicate, numReplicates FROM jobs "
+            + "WHERE state = 'pending' OR (state = 'leased' AND leaseExpires < ? "
+            + "AND attempts < ?) ORDER BY id LIMIT 1", (now, MAX_ATTEMPTS) ).fetchone()
+        if row is not None:
+            connection.execute( "UPDATE jobs SET state = 'leased', worker = ?, "
+                                + "leaseExpires = ?, attempts = attempts + 1 "
+                                + "WHERE id = ?", (worker, now + LEASE_SECONDS, row[0]) )
+        connection.execute( "COMMIT" )
+    except BaseException:
+        connection.execute( "ROLLBACK" )
+        raise
+    if row is None:
+        return None
+    return ( row[0], loadSettings(row[1]), row[2], row[3], row[4] )
+
+
+def hasUnfinishedJobs( connection ):
+    """
+        Return: true if some job is still waiting or being run
+    """
+    return connection.execute( "SELECT COUNT(*) FROM jobs WHERE state IN "
+                               + "('pending', 'leased')" ).fetchone()[0] > 0
+
+
+def renewLeases( path, jobId, worker, stop ):
+    """
+        Keeps renewing a worker's lease on a job until stop is set. Private to
+        work() (it runs on a thread of its own).
+    """
+    connection = openStore( path )
+    while not stop.wait( LEASE_SECONDS / 3 ):
+        connection.execute( "UPDATE jobs SET leaseExpires = ? WHERE id = ? AND "
+                            + "worker = ? AND state = 'leased'",
+                            (time.time() + LEASE_SECONDS, jobId, worker) )
+    connection.close()
+
+
+def runJob( settings, seed, firstReplicate, numReplicates, numWorkers=None ):
+    """
+        Runs a job's replicates, over numWorkers processes (or the job's
+        numberOfWorkers, if None). They are never checkpointed: workers share
+        checkpointDir, and two of them may be running the same job (if a lease
+        ran out while its worker was still alive).
+
+        Return: their FixationStatistics
+    """
+    settings = dict( settings, recordingPolicy="summary", checkpointEvery=0 )
+    if numWorkers is None:
+        numWorkers = settings["numberOfWorkers"]
+    statistics = FixationStatistics()
+    if settings["adaptiveRuns"]:
+        replicates = iterAdaptiveReplicates( settings, statistics, numWorkers, seed )
+    else:
+        replicates = iterReplicates( settings, numReplicates, numWorkers, seed,
+                                     firstReplicate )
+    for recorder in replicates:
+        statistics.addEvents( *recorder.getEvents() )
+    return statistics
+
+
+def work( path, verbose=True, numWorkers=None ):
+    """
+        Runs jobs from a job store until there are none left.
+
+        Params:
+            path: the job store's file
+            verbose: if true, print progress
+            numWorkers: the number of processes to run each job over (None
+                        for the job's own numberOfWorkers)
+        Return: the number of jobs this worker finished
+    """
+    worker = socket.gethostname() + ":" + str(os.getpid())
+    connection = openStore( path )
+    numFinished = 0
+    while True:
+        job = claimJob( connection, worker )
+        if job is None:
+            if not hasUnfinishedJobs( connection ):
+                break
+            # Other workers have the rest; wait in case one of them dies
+            time.sleep( POLL_SECONDS )
+            continue
+
+        jobId, settings, seed, firstReplicate, numReplicates = job
+        if verbose:
+            print( worker + ": job " + str(jobId) + " (replicates "
+                   + str(firstReplicate) + "-"
+                   + str(firstReplicate + numReplicates - 1) + ")" )
+        stop = threading.Event()
+        renewer = threading.Thread( target=renewLeases,
+                                    args=(path, jobId, worker, stop), daemon=True )
+        renewer.start()
+        try:
+            statistics = runJob( settings, seed, firstReplicate, numReplicates,
+                                 numWorkers )
+        except (Exception, SystemExit):
+            stop.set()
+            renewer.join()
+            # Try again later (maybe elsewhere), unless it has failed too often
+            connection.execute( "UPDATE jobs SET state = CASE WHEN attempts >= ? "
+                                + "THEN 'failed' ELSE 'pending' END, error = ? "
+                                + "WHERE id = ? AND worker = ? AND state = 'leased'",
+                                (MAX_ATTEMPTS, traceback.format_exc(), jobId, worker) )
+            if verbose:
+                print( worker + ": job " + str(jobId) + " failed" )
+            continue
+        stop.set()
+        renewer.join()
+
+        # If our lease ran out and someone else already finished the job, their
+        # results are the same as ours
+        connection.execute( "UPDATE jobs SET state = 'done', result = ?, worker = ? "
+                            + "WHERE id = ? AND state != 'done'",
+                            (json.dumps(statistics.toDict()), worker, jobId) )
+        numFinished += 1
+
+    connection.close()
+    return numFinished
+
+
+def collect( connection ):
+    """
+        Merges the statistics of each batch's finished jobs (in job order).
+
+        Return: a dictionary mapping each tag to a (FixationStatistics, number
+                of jobs done, number of jobs, settings, seed) tuple
+    """
+    results = {}
+    for tag, settings, seed, state, result in connection.execute(
+            "SELECT tag, settings, seed, state, result FROM jobs ORDER BY id" ):
+        if tag not in results:
+            results[tag] = [ FixationStatistics(), 0, 0, loadSettings(settings), seed ]
+        entry = results[tag]
+        entry[2] += 1
+        if state == "done":
+            entry[0].merge( FixationStatistics.fromDict( json.loads(result) ) )
+            entry[1] += 1
+    return { tag: tuple(entry) for tag, entry in results.items() }
+
+
+def printStatus( connection ):
+    """
+        Prints how many jobs are in each state, and the errors of the failed
+        ones.
+    """
+    for state, count in connection.execute( "SELECT state, COUNT(*) FROM jobs "
+                                            + "GROUP BY state ORDER BY state" ):
+        print( state + ": " + str(count) )
+    for jobId, attempts, error in connection.execute(
+            "SELECT id, attempts, error FROM jobs WHERE state = 'failed'" ):
+        print( "\nJob " + str(jobId) + " failed " + str(attempts) + " times:\n"
+               + str(error) )
+
+
+def main( arguments ):
+    parser = argparse.ArgumentParser( description="Run simulations on several "
+                                      + "machines through a shared job store." )
+    commands = parser.add_subparsers( dest="command", required=True )
+
+    submit = commands.add_parser( "submit", help="queue the batch of simulations "
+                                  + "in team_2_settings.py" )
+    submit.add_argument( "store" )
+    submit.add_argument( "--seed", type=int, required=True )
+    submit.add_argument( "--job-runs", type=int, default=100,
+                         help="the number of simulations per job" )
+    submit.add_argument( "--tag", default="batch",
+                         help="the name to collect the results under" )
+
+    submitSweep = commands.add_parser( "submit-sweep", help="queue every point of "
+                                       + "a sweep (see team_2_sweep.py)" )
+    submitSweep.add_argument( "store" )
+    submitSweep.add_argument( "grid", help="a JSON file describing the grid" )
+    submitSweep.add_argument( "--seed", type=int, required=True )
+    submitSweep.add_argument( "--job-runs", type=int, default=100 )
+
+    workCommand = commands.add_parser( "work", help="run jobs until there are "
+                                       + "none left" )
+    workCommand.add_argument( "store" )
+    workCommand.add_argument( "--workers", type=int, default=None,
+                              help="the number of processes to run each job "
+                                   + "over (default: the job's numberOfWorkers)" )
+
+    statusCommand = commands.add_parser( "status", help="show the state of the jobs" )
+    statusCommand.add_argument( "store" )
+
+    collectCommand = commands.add_parser( "collect", help="merge the results" )
+    collectCommand.add_argument( "store" )
+    collectCommand.add_argument( "--grid", help="the sweep's grid, to write its "
+                                 + "summary table" )
+    collectCommand.add_argument( "--seed", type=int, help="the sweep's seed" )
+    collectCommand.add_argument( "--summary", default="output/sweep.tsv" )
+    collectCommand.add_argument( "--output", default="output/cluster",
+                                 help="where to write each batch's statistics" )
+    options = parser.parse_args( arguments )
+
+    if options.command == "work":
+        print( "Finished " + str(work( options.store, numWorkers=options.workers ))
+               + " jobs." )
+        return
+
+    connection = openStore( options.store )
+    if options.command == "submit":
+        settings = currentSettings()
+        if settings["adaptiveRuns"]:
+            # An adaptive batch decides for itself how many replicates it
+            # needs, so it is a single job
+            numJobs = addJobs( connection, options.tag, settings, 1, options.seed, 1 )
+        else:
+            numJobs = addJobs( connection, options.tag, settings,
+                               settings["numberOfRuns"], options.seed,
+                               options.job_runs )
+        print( "Queued " + str(numJobs) + " jobs." )
+    elif options.command == "submit-sweep":
+        with open( options.grid ) as gridFile:
+            grid = json.load( gridFile )
+        numJobs = 0
+        for parameters in expandGrid( grid ):
+            # An adaptive point is a single job (as above)
+            jobRuns = options.job_runs
+            numRuns = parameters["numberOfRuns"]
+            if parameters["adaptiveRuns"]:
+                jobRuns = numRuns = 1
+            numJobs += addJobs( connection, pointHash(parameters, options.seed),
+                                parameters, numRuns, options.seed, jobRuns )
+        print( "Queued " + str(numJobs) + " jobs." )
+    elif options.command == "status":
+        printStatus( connection )
+    else:
+        from team_2_main import printStatistics
+        results = collect( connection )
+        if options.grid is not None:
+            if options.seed is None:
+                exit("Sorry, collecting a sweep needs its --seed.")
+            with open( options.grid ) as gridFile:
+                grid = json.load( gridFile )
+            rows = []
+            for parameters in expandGrid( grid ):
+                tag = pointHash( parameters, options.seed )
+                if tag not in results:
+                    exit("Sorry, the point " + describePoint(parameters, grid)
+                         + " was never submitted (with this seed).")
+                statistics, done, total = results[tag][:3]
+                # Points that aren't finished yet are left empty
+                rows.append( ( parameters, statistics if done == total else None,
+                               summarizeEstimate( estimateStatistics(parameters) ) ) )
+            writeSummary( options.summary, rows, grid )
+            print( "Wrote the summary to " + options.summary )
+        else:
+            for tag, (statistics, done, total, settings, seed) in results.items():
+                print( "\n" + tag + ": " + str(done) + " of " + str(total)
+                       + " jobs done\n" )
+                printStatistics( statistics, os.path.join(options.output, tag),
+                                 seed, settings )
+    connection.close()
+
+
+if __name__ == "__main__":
+    main( sys.argv[1:] )
@@ -0,0 +1,239 @@
+"""
+    Quick estimates of the statistics printStatistics() reports, without
+    simulating anything.
+
+    Diffusion approximation
+    -----------------------
+    For a large population, the allele frequencies follow the neutral
+    Wright-Fisher diffusion with the effective population size Ne of the model
+    (see team_2_wright_fisher.py). Starting from frequencies p_0, p_1, p_2:
+
+      - allele i eventually becomes fixed with probability p_i, and is lost
+        with probability 1 - p_i;
+      - the mean number of generations until one allele is fixed (Littler,
+        1975) is
+            T = -4 Ne * sum_i (1 - p_i) ln(1 - p_i);
+      - each allele, taken by itself, drifts like one of two alleles, so the
+        mean generation in which allele i is lost (in the runs in which it is)
+        is the 2-allele result of Kimura and Ohta (1969),
+            T_i = -4 Ne * p_i ln(p_i) / (1 - p_i).
+
+    Ne changes from one generation to the next with the number of males, so we
+    use its value averaged over the Binomial(N, 1/2) sex ratios.
+
+    These are means only: the diffusion gives no closed form for the spread
+    of the fixation times, their percentiles, or when the first allele is lost,
+    nor for anything in a run of a fixed number of generations. Those are
+    reported as None.
+
+    The estimates are good to within a few percent when Ne is more than a few
+    dozen; since every run has to take at least one generation, they are too
+    low for tiny populations.
+
+    Exact solution
+    --------------
+    For populations of up to EXACT_POPULATION_LIMIT, estimateStatistics()
+    instead uses the exact Markov-chain solution of the Wright-Fisher
+    approximation (see team_2_markov.py), which gives everything
+    printStatistics() reports, in a second or so. It needs SciPy; without it,
+    the diffusion approximation is used for every population size.
+
+    Usage (reports the estimates for team_2_settings.py):
+        $ python3 team_2_estimate.py [--method auto|diffusion|exact]
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import argparse
+import math
+import sys
+import numpy as np
+from team_2_wright_fisher import probOfLittermates, probOfNumMales
+import team_2_markov
+
+# The largest population for which estimateStatistics() solves the Markov chain
+# exactly (rather than using the diffusion approximation)
+EXACT_POPULATION_LIMIT = 200
+
+
+def startingCounts( popSize, startingFrequencies ):
+    """
+        Return: the number of copies of each allele the species starts with
+                (rounded just as Species does it)
+    """
+    return tuple( int(round(freq * 2*popSize)) for freq in startingFrequencies )
+
+
+def meanEffectivePopulationSize( popSize, probOfLitterSize ):
+    """
+        Calculates the effective population size (see team_2_wright_fisher.py)
+        averaged over the number of males, which is Binomial(N, 1/2) (leaving
+        out the all-male and all-female generations, which can't reproduce).
+
+        Params:
+            popSize: the census population size N
+            probOfLitterSize: the litter-size probability dictionary
+        Return: the mean effective population size Ne (a float)
+    """
+    if popSize < 2:
+        exit("Sorry, a population needs at least 2 individuals to reproduce.")
+
+    # Average the coalescence probability, not Ne itself: that is what sets
+    # the rate of drift over many generations
+    numMales, probs = probOfNumMales( popSize )
+    meanInverse = float( np.sum( probs * (1/numMales + 1/(popSize - numMales)) ) )
+
+    s = probOfLittermates( popSize, probOfLitterSize )
+    sameCopy = (1/8) * ( 2*s + (1 - s) * meanInverse )
+    sameCopy *= (2*popSize - 2) / (2*popSize - 1)
+    return 1 / (2*sameCopy)
+
+
+class DiffusionEstimate:
+    """
+        The diffusion approximation's estimates of the fixation statistics of
+        a batch of simulations (see the top of this file). Answers the same
+        questions as FixationStatistics (in team_2_statistics.py), so it can be
+        handed to printStatistics(); the counts are expected numbers of runs,
+        and anything the approximation can't tell us is None.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, popSize, startingFrequencies, probOfLitterSize,
+                 numRuns=1, fixedNumberOfGenerations=0):
+        """
+            Params:
+                popSize: the population size
+                startingFrequencies: the 3-tuple of starting allele frequencies
+                probOfLitterSize: the litter-size probability dictionary
+                numRuns: the number of simulations to give expected counts for
+                fixedNumberOfGenerations: as in team_2_settings.py (0 means
+                                          every run goes on until fixation)
+        """
+        counts = startingCounts( popSize, startingFrequencies )
+        self.numRuns = numRuns
+        self.fixedNumberOfGenerations = fixedNumberOfGenerations
+        self.frequencies = tuple( count / sum(counts) for count in counts )
+        self.Ne = meanEffectivePopulationSize( popSize, probOfLitterSize )
+
+        self.fixationProbabilities = self.frequencies
+        if fixedNumberOfGenerations <= 0:
+            self.fixationsByAllele = [ numRuns * p for p in self.frequencies ]
+        else:
+            self.fixationsByAllele = [ None ] * 3
+
+    def getMean(self):
+        """
+            Return: the mean generations to fixation, or None in a run of a
+                    fixed number of generations
+        """
+        if self.fixedNumberOfGenerations > 0:
+            return None
+        return -4 * self.Ne * math.fsum( (1 - p) * math.log(1 - p)
+                                         for p in self.frequencies if p < 1 )
+
+    def getStandardDeviation(self):
+        return None
+
+    def getMin(self):
+        return None
+
+    def getMax(self):
+        return None
+
+    def getPercentile(self, percent):
+        return None
+
+    def getPercentFixations(self):
+        """
+            Return: the percentage of simulations in which an allele is
+                    fixed, or None in a run of a fixed number of generations
+        """
+        if self.fixedNumberOfGenerations > 0:
+            return None
+        return 100.0
+
+    def getLossCounts(self):
+        """
+            Return: a 3-tuple with the expected number of simulations in which
+                    each allele is lost (or Nones in a run of a fixed number of
+                    generations)
+        """
+        if self.fixedNumberOfGenerations > 0:
+            return ( None, ) * 3
+        return tuple( self.numRuns * (1 - p) for p in self.frequencies )
+
+    def getMeanLossGenerations(self):
+        """
+            Return: a 3-tuple with the mean generation in which each allele is
+                    lost (over the simulations in which it is), or None
+        """
+        if self.fixedNumberOfGenerations > 0:
+            return ( None, ) * 3
+        losses = []
+        for p in self.frequencies:
+            if p == 0:
+                losses.append( 0.0 )
+            elif p == 1:
+                losses.append( None )
+            else:
+                losses.append( -4 * self.Ne * p * math.log(p) / (1 - p) )
+        return tuple(losses)
+
+    def getMeanFirstLossGeneration(self):
+        return None
+
+
+def estimateStatistics( settings, method="auto" ):
+    """
+        Params:
+            settings: a dictionary of settings, as returned by
+                      currentSettings() in team_2_runner.py
+            method: "diffusion", "exact", or "auto" (exact for populations of
+                    up to EXACT_POPULATION_LIMIT, if SciPy is available)
+        Return: the estimated fixation statistics of a batch of simulations
+                with those settings (a DiffusionEstimate or an ExactSolution)
+    """
+    if method not in [ "auto", "diffusion", "exact" ]:
+        exit("Sorry, the estimation method must be auto, diffusion or exact.")
+    if method == "auto":
+        if ( settings["popSize"] <= EXACT_POPULATION_LIMIT
+             and team_2_markov.isAvailable() ):
+            method = "exact"
+        else:
+            method = "diffusion"
+
+    if method == "exact":
+        return team_2_markov.ExactSolution( settings["popSize"],
+                                            settings["startingFrequencies"],
+                                            settings["probOfLitterSize"],
+                                            settings["numberOfRuns"],
+                                            settings["fixedNumberOfGenerations"] )
+    return DiffusionEstimate( settings["popSize"], settings["startingFrequencies"],
+                              settings["probOfLitterSize"], settings["numberOfRuns"],
+                              settings["fixedNumberOfGenerations"] )
+
+
+def main( arguments ):
+    from team_2_runner import currentSettings
+    from team_2_main import printStatistics
+
+    parser = argparse.ArgumentParser(
+        description="Estimate the fixation statistics without simulating." )
+    parser.add_argument( "--method", default="auto",
+                         choices=[ "auto", "diffusion", "exact" ] )
+    parser.add_argument( "--output", default="output/estimate",
+                         help="the directory to write statistics.txt to" )
+    options = parser.parse_args( arguments )
+
+    estimate = estimateStatistics( currentSettings(), options.method )
+    if isinstance( estimate, DiffusionEstimate ):
+        print( "Diffusion estimate (Ne = " + str(estimate.Ne) + ")\n" )
+    else:
+        print( "Exact Markov-chain solution\n" )
+    printStatistics( estimate, options.output, "none (estimated)" )
+
+
+if __name__ == "__main__":
+    main( sys.argv[1:] )
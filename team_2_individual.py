@@ -8,6 +8,8 @@ class Individual:
 
         Young, Gibson, Jennings, and Smith
     """
+    __slots__ = ( "alleles", "sex" )
+
     def __init__(self, alleles, sex):
         """
             Constructs an individual with a certain set of alleles and a sex
@@ -34,3 +36,63 @@ class Individual:
         """
         return self.sex
 
+
+# The 2 alleles of each packed genotype (see PackedIndividual)
+GENOTYPE_ALLELES = tuple( (genotype // 3, genotype % 3) for genotype in range(9) )
+
+class PackedIndividual:
+    """
+        A lightweight stand-in for Individual, used inside the simulator.
+
+        The two alleles are packed into a single small int (the genotype,
+        3*allele0 + allele1, from 0 to 8) and the sex is a plain int (Sex.M or
+        Sex.F), and nothing is checked on construction. Use
+        fromIndividual() to turn a (validated) Individual into one.
+
+        It answers getAlleles() and getSex() just like an Individual, so code
+        that only reads individuals works with either.
+
+        Young, Gibson, Jennings, and Smith
+    """
+    __slots__ = ( "genotype", "sex" )
+
+    def __init__(self, genotype, sex):
+        """
+            Params:
+                genotype: 3*allele0 + allele1
+                sex: Sex.M or Sex.F
+        """
+        self.genotype = genotype
+        self.sex = sex
+
+    @classmethod
+    def fromIndividual(cls, individual):
+        """
+            Param individual: an Individual (or a PackedIndividual)
+            Return: the equivalent PackedIndividual
+        """
+        allele0, allele1 = individual.getAlleles()
+        return cls( 3*int(allele0) + int(allele1),
+                    Sex.M if individual.getSex() == Sex.M else Sex.F )
+
+    def toIndividual(self):
+        """
+            Return: the equivalent Individual
+        """
+        return Individual( GENOTYPE_ALLELES[self.genotype], self.sex )
+
+    @property
+    def alleles(self):
+        return GENOTYPE_ALLELES[self.genotype]
+
+    def getAlleles(self):
+        """
+            Return: the 2-tuple of alleles associated with this individual
+        """
+        return GENOTYPE_ALLELES[self.genotype]
+
+    def getSex(self):
+        """
+            Return: the sex of this individual (Sex.M or Sex.F)
+        """
+        return self.sex
@@ -0,0 +1,97 @@
+import numpy as np
+from team_2_population import Population
+from team_2_profiling import NULL_PROFILER
+
+def simulateGenerationVectorized( population, litterSampler, rng,
+                                  profiler=NULL_PROFILER ):
+    """
+        Simulates a single generation of reproduction for a whole population
+        using a handful of array operations, rather than one child at a time.
+
+        This follows exactly the same mating model as the per-individual
+        simulator in simulateDrift():
+        - The parents are separated into males and females
+        - Each litter has a father chosen uniformly at random from the males
+          and a mother chosen uniformly at random from the females (with
+          replacement)
+        - The size of each litter is drawn from the species' litter-size
+          distribution, and litters are produced until we have at least
+          [population size] children
+        - Each child receives a random allele from each parent, in random order,
+          and a random sex
+        - If the last litter overshot the population size, surplus children
+          are removed at random
+
+        Params:
+            population: the parent generation, as a Population
+            litterSampler: the species' LitterSizeSampler
+            rng: a numpy.random.Generator
+            profiler: a Profiler to time the phases of the generation with (see
+                      team_2_profiling.py)
+        Return: the child generation, as a Population of the same size
+    """
+    size = len(population)
+
+    # Separate the parents by sex
+    daddies = np.flatnonzero(~population.sexes)
+    mommies = np.flatnonzero(population.sexes)
+    if len(daddies) == 0 or len(mommies) == 0:
+        exit( "Sorry, the population can no longer reproduce (it has "
+              + str(len(daddies)) + " males and " + str(len(mommies))
+              + " females)." )
+    profiler.lap("partition")
+
+    # Draw litter sizes until we have enough children. We ask for a few more
+    # litters than we expect to need, so this almost always takes one pass.
+    meanLitterSize = litterSampler.mean
+    litterSizes = np.empty(0, dtype=np.int64)
+    totalChildren = 0
+    while totalChildren < size:
+        numLitters = int( 1.1 * (size - totalChildren) / max(meanLitterSize, 1e-9) ) + 16
+        litterSizes = np.concatenate(
+            (litterSizes, litterSampler.drawMany(numLitters, rng)) )
+        totalChildren = int(litterSizes.sum())
+
+    # Keep litters only up to (and including) the one that reached the
+    # population size, just as the one-child-at-a-time loop would
+    childrenSoFar = np.cumsum(litterSizes)
+    numLitters = int(np.searchsorted(childrenSoFar, size)) + 1
+    litterSizes = litterSizes[:numLitters]
+    totalChildren = int(childrenSoFar[numLitters - 1])
+    profiler.lap("litters")
+    profiler.count("litters", numLitters)
+    profiler.count("children", totalChildren)
+    profiler.count("childrenDiscarded", totalChildren - size)
+
+    # Choose the parents of each litter, then give each child its litter's
+    # parents
+    dads = daddies[ rng.integers(0, len(daddies), size=numLitters) ]
+    moms = mommies[ rng.integers(0, len(mommies), size=numLitters) ]
+    dads = np.repeat(dads, litterSizes)
+    moms = np.repeat(moms, litterSizes)
+    profiler.lap("parents")
+
+    # Trim the population back to the desired size by keeping a random subset
+    # (in birth order) of the children
+    if totalChildren > size:
+        keep = np.sort( rng.choice(totalChildren, size=size, replace=False) )
+        dads = dads[keep]
+        moms = moms[keep]
+    profiler.lap("trim")
+
+    # Each child gets one random allele from each parent...
+    fromDad = population.alleles[ dads, rng.integers(0, 2, size=size) ]
+    fromMom = population.alleles[ moms, rng.integers(0, 2, size=size) ]
+    # ...in random order, so that allele0 doesn't always come from dad
+    swap = rng.integers(0, 2, size=size).astype(bool)
+    childAlleles = np.empty((size, 2), dtype=np.uint8)
+    childAlleles[:, 0] = np.where(swap, fromMom, fromDad)
+    childAlleles[:, 1] = np.where(swap, fromDad, fromMom)
+
+    childSexes = rng.integers(0, 2, size=size).astype(bool)
+
+    # Count the genotypes (and, from them, the alleles) in one go
+    genotypeCounts, alleleCounts = Population.countGenotypes(childAlleles)
+    childPopulation = Population(childAlleles, childSexes, alleleCounts, genotypeCounts)
+    profiler.lap("genotypes")
+    return childPopulation
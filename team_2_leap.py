@@ -0,0 +1,315 @@
+"""
+    A leaping version of the Wright-Fisher engine, for very large populations.
+
+    The "wrightfisher" engine (see team_2_wright_fisher.py) takes the same time
+    per generation whatever the population size, but a population of 10^7
+    takes tens of millions of generations to reach fixation. While every
+    allele is common, though, the frequencies change very little from one
+    generation to the next, so this engine jumps over many generations at a
+    time, and only goes back to simulating one generation at a time when an
+    allele is close to being lost (or fixed).
+
+    Leaps
+    -----
+    Over t generations, the frequencies p of the Wright-Fisher model (with the
+    effective population size Ne of team_2_wright_fisher.py, averaged over the
+    sex ratio as in team_2_estimate.py) keep their mean, and have covariance
+
+        Cov(p_i', p_j') = (p_i [i = j] - p_i p_j) * (1 - (1 - 1/(2 Ne))^t).
+
+    A leap draws the new frequencies from the normal distribution with exactly
+    this mean and covariance, i.e. it is a single step of the diffusion
+    approximation, with a rate that is exact for t generations. What it gets
+    wrong is the shape of the distribution: the real one is skewed (an allele
+    can't go below 0) wherever the frequencies are close to the boundary
+    compared with how far they spread in t generations. So the leaps are
+    kept short enough that every allele present moves by no more than
+    leapTolerance times its distance from 0 and 1 (one standard deviation):
+
+        t <= 2 Ne * leapTolerance^2 * min(p_i, 1 - p_i)^2 / (p_i (1 - p_i)).
+
+    Near the boundaries this is t <= 2 Ne * leapTolerance^2 * p_i, so the
+    leaps shrink as an allele becomes rare; once they would be shorter than
+    MIN_LEAP generations, the engine simulates each generation exactly, just
+    as the "wrightfisher" engine does (advanceCounts()). Alleles are therefore
+    only ever lost, and fixed, in exact generations, so the generations at
+    which these happen are whole numbers as usual. A leap that would make an
+    allele vanish (a leapTolerance^-1 standard deviation event) is drawn again
+    with half the length.
+
+    The number of leaps grows like 1/leapTolerance^2, but only with the
+    logarithm of the population size (a few thousand, to fixation, for N from
+    10^6 to 10^9), and the exact generations start once an allele is down to
+    about MIN_LEAP/leapTolerance^2 * N/Ne copies, whatever N is. So a
+    simulation takes about the same time for any large population. Only the
+    leaps' end points are recorded, so recording policies see a generation
+    number that jumps, and the fixed number of generations (if any) is never
+    overshot.
+
+    Accuracy
+    --------
+    leapTolerance = 0 turns the leaps off: simulateDriftLeap() then gives
+    exactly the same simulations as the "wrightfisher" engine, from the same
+    species and random numbers. Otherwise, with the default species and
+    starting frequencies (means over the simulations, +/- the half-width of
+    their 95% confidence interval):
+
+        N       engine                     runs  generations to fixation
+        2000    leap (tolerance 0.1)       4000  5913 +/- 124
+        2000    simulateDrift()'s model    2000  5777 +/- 175
+                ("batched" engine)
+        2000    diffusion estimate                5848
+        10^4    leap (tolerance 0.1)       4000  28964 +/- 613
+        10^4    wrightfisher                600  28915 +/- 1483
+        10^4    diffusion estimate                29243
+        10^5    leap, tolerance 0.05-0.3   2000  287550 ... 292170 (+/- 8900)
+        10^5    leap, tolerance 0.5        2000  399101 +/- 12677
+        10^5    diffusion estimate                292437
+        10^7    leap (tolerance 0.1)   2 x 1000  29.5 and 29.3 million
+                                                 (+/- 1.3 million)
+        10^7    diffusion estimate                29.2 million
+
+    The spread and percentiles of the generations to fixation, how often
+    each allele is fixed, and the mean generation each one is lost agree
+    just as well. So up to a tolerance of 0.3, the leaps add no error that
+    a few thousand simulations can detect, and the leap engine is as good as
+    the Wright-Fisher approximation it leaps through (which, like the
+    "wrightfisher" engine, is poor for populations made of a handful of
+    litters). At 0.5, too many leaps overshoot an allele's loss and are
+    drawn again, which biases the simulations towards keeping rare alleles:
+    the mean time to fixation is about 35% too long, and the rare allele is
+    fixed too often. A simulation to fixation takes about 0.8 seconds with a
+    tolerance of 0.05, 0.3 with 0.1 and 0.04 with 0.3, and no longer (0.5
+    seconds at 0.1) for N = 10^7.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import math
+import numpy as np
+from team_2_random import DriftRandom
+from team_2_profiling import NULL_PROFILER
+from team_2_wright_fisher import advanceCounts, roundCounts
+from team_2_estimate import meanEffectivePopulationSize, startingCounts
+
+# Leaps shorter than this many generations are simulated one generation at a
+# time instead
+MIN_LEAP = 4
+
+
+def leapLength( counts, Ne, tolerance ):
+    """
+        Return: the number of generations the next leap may span from these
+                allele counts (see the top of this file)
+    """
+    frequencies = counts[ counts > 0 ] / counts.sum()
+    if len(frequencies) < 2:
+        # An allele is fixed; nothing will change again
+        return math.inf
+    distance = np.minimum( frequencies, 1 - frequencies )
+    return math.floor( 2*Ne * tolerance**2 * float( np.min(
+        distance**2 / (frequencies * (1 - frequencies)) ) ) )
+
+
+def leapCounts( counts, generations, Ne, rng ):
+    """
+        Advances the allele counts by a leap of many generations (see the top
+        of this file).
+
+        Params:
+            counts: the number of copies of each allele
+            generations: the number of generations to leap over
+            Ne: the effective population size
+            rng: a numpy.random.Generator
+        Return: the new counts (an integer array with the same sum), or None if
+                the leap would have made an allele vanish
+    """
+    total = int(counts.sum())
+    frequencies = counts / total
+    # z ~ N(0, I) turned into a draw with covariance diag(p) - p p^T
+    roots = np.sqrt( frequencies )
+    z = rng.standard_normal( len(counts) )
+    step = roots*z - frequencies * np.dot(roots, z)
+    spread = math.sqrt( -math.expm1( generations * math.log1p(-1/(2*Ne)) ) )
+    newFrequencies = frequencies + spread*step
+    if np.any( newFrequencies[ counts > 0 ] * total < 1 ):
+        return None
+    return roundCounts( newFrequencies * total, total, rng )
+
+
+def startingState( popSize, startingFrequencies, rng ):
+    """
+        Draws the allele counts and the number of males of a randomly arranged
+        population with the given starting frequencies, without building it
+        (for 10^8 individuals, that takes far longer than simulating them).
+        Uses the same rounding as the Species constructor: allele i gets
+        round(2N * frequency i) copies, and any surplus is discarded at random.
+
+        Params:
+            popSize: the population size
+            startingFrequencies: the 3-tuple of starting allele frequencies
+            rng: a numpy.random.Generator
+        Return: a 2-tuple: the allele counts (an integer array), and the
+                number of males
+    """
+    totalAlleles = 2*popSize
+    counts = np.array( startingCounts(popSize, startingFrequencies), dtype=np.int64 )
+    if counts.sum() < totalAlleles:
+        exit( "Sorry, starting frequencies don't produce enough alleles for "
+              + str(popSize) + " individuals." )
+    if counts.sum() > totalAlleles:
+        counts = rng.multivariate_hypergeometric( counts, totalAlleles )
+    return counts, int( rng.binomial(popSize, 0.5) )
+
+
+def leapDrift( popSize, probOfLitterSize, counts, numMales,
+               endAfterFixedNumGenerations, numGenerations, rng, recorder,
+               profiler, tolerance ):
+    """
+        Runs the simulation from the given allele counts and number of males.
+        Private to simulateDriftLeap() and simulateDriftLeapFromFrequencies(),
+        which take the same parameters.
+
+        Return: a 2-tuple: the results (as simulateDriftLeap() returns them),
+                and the final frequencies
+    """
+    # Sanity-check the input
+    if (not endAfterFixedNumGenerations) and numGenerations != 0:
+        exit("Sorry, you can't request that we simulate drift until fixation while "
+             + "also running a fixed number of generations.")
+    elif endAfterFixedNumGenerations and numGenerations < 0:
+        exit("Sorry, number of generations to simulate must be positive.")
+    if tolerance < 0:
+        exit("Sorry, the leap tolerance can't be negative.")
+
+    if math.fsum(probOfLitterSize.values()) != 1.0:
+        exit( "Sorry, probabilities of producing offspring must sum to 1 "\
+              + "(yours sum to "\
+              + str( math.fsum(probOfLitterSize.values()) )\
+              + ")." )
+
+    if rng is None:
+        rng = DriftRandom()
+    if profiler is None:
+        profiler = NULL_PROFILER
+
+    totalAlleles = 2*popSize
+    Ne = meanEffectivePopulationSize( popSize, probOfLitterSize )
+
+    currentGen = 0
+    frequencies = tuple(int(count)/totalAlleles for count in counts)
+    results = []
+    if recorder is None:
+        results.append( (currentGen, frequencies) )
+    else:
+        recorder.record( currentGen, frequencies )
+    while True:
+        if endAfterFixedNumGenerations:
+            if currentGen >= numGenerations:
+                break
+        elif counts.max() == totalAlleles:
+            break
+
+        profiler.startGeneration()
+        length = leapLength( counts, Ne, tolerance )
+        if endAfterFixedNumGenerations:
+            length = min( length, numGenerations - currentGen )
+        newCounts = None
+        while newCounts is None and length >= MIN_LEAP:
+            if counts.max() == totalAlleles:
+                newCounts = counts
+            else:
+                newCounts = leapCounts( counts, length, Ne, rng.generator )
+            if newCounts is None:
+                length //= 2
+        if newCounts is None:
+            length = 1
+            newCounts = advanceCounts( counts, numMales, popSize, probOfLitterSize,
+                                       rng.generator )
+            profiler.lap("advance")
+        else:
+            profiler.lap("leap")
+            profiler.count("leaps")
+        profiler.count("generations", length)
+        counts = newCounts
+        # The children become the next parents; each has a random sex
+        numMales = int( rng.generator.binomial(popSize, 0.5) )
+
+        frequencies = tuple(int(count)/totalAlleles for count in counts)
+        currentGen += int(length)
+        if recorder is None:
+            results.append( (currentGen, frequencies) )
+        else:
+            recorder.record( currentGen, frequencies )
+        profiler.lap("record")
+        profiler.endGeneration()
+
+    profiler.endRun()
+    if recorder is not None:
+        recorder.finish()
+        return recorder, frequencies
+    return results, frequencies
+
+
+def simulateDriftLeap( species, endAfterFixedNumGenerations=False,
+                       numGenerations=0, rng=None, recorder=None, profiler=None,
+                       tolerance=0.1 ):
+    """
+        Simulates genetic drift of three alleles in a given species, leaping
+        over many generations at a time as described at the top of this file.
+        Takes the same parameters as simulateDriftWrightFisher() (and one
+        more).
+
+        Note: only the species' allele frequencies are updated; its individuals
+        are left as they were in the first generation.
+
+        Parameters:
+            species: An object of the Species class
+            endAfterFixedNumGenerations: If true, the simulation will run for
+                                numGenerations generations. If false, it will
+                                continue until one allele has become fixed.
+            numGenerations: the number of generations to simulate
+            rng: a DriftRandom (a freshly seeded one is used if None)
+            recorder: a Recorder to hand each generation's frequencies to,
+                      instead of keeping them all (see team_2_recording.py)
+            profiler: a Profiler to time each step (leap or generation) with
+                      (see team_2_profiling.py)
+            tolerance: leapTolerance (see team_2_settings.py); 0 simulates every
+                       generation
+
+        Returns: a list of (generation, 3-tuple of frequencies) pairs, one for
+                 the start and one for each step. (If a recorder was given, the
+                 recorder is returned instead.)
+    """
+    results, frequencies = leapDrift( species.getPopulationSize(),
+                                      species.getProbOfProducingNumOffspring(),
+                                      np.array( species.getAlleleCounts(), dtype=np.int64 ),
+                                      species.getPopulationArrays().countSexes()[0],
+                                      endAfterFixedNumGenerations, numGenerations,
+                                      rng, recorder, profiler, tolerance )
+    species.setAlleleFrequencies( frequencies )
+    return results
+
+
+def simulateDriftLeapFromFrequencies( popSize, startingFrequencies, probOfLitterSize,
+                                      endAfterFixedNumGenerations=False,
+                                      numGenerations=0, rng=None, recorder=None,
+                                      profiler=None, tolerance=0.1 ):
+    """
+        Like simulateDriftLeap(), but starts from a randomly arranged
+        population with the given starting frequencies, without building a
+        Species (see startingState()). This is what the runner uses.
+
+        Params:
+            popSize: the population size
+            startingFrequencies: the 3-tuple of starting allele frequencies
+            probOfLitterSize: the litter-size probability dictionary
+            the rest: as for simulateDriftLeap()
+        Return: as for simulateDriftLeap()
+    """
+    if rng is None:
+        rng = DriftRandom()
+    counts, numMales = startingState( popSize, startingFrequencies, rng.generator )
+    return leapDrift( popSize, probOfLitterSize, counts, numMales,
+                      endAfterFixedNumGenerations, numGenerations, rng, recorder,
+                      profiler, tolerance )[0]
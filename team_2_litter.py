@@ -0,0 +1,54 @@
+from bisect import bisect_right
+import itertools
+import numpy as np
+
+class LitterSizeSampler:
+    """
+        Draws random litter sizes from a probability dictionary (see the Species
+        constructor), using a cumulative probability table built once up front.
+        A single draw is one uniform random number and a binary search, so it
+        takes O(log k) time for k possible litter sizes, no matter how the
+        probability is spread among them. Many litter sizes can also be drawn
+        at once with drawMany().
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, probabilityDictionary):
+        """
+            Param probabilityDictionary: a dictionary whose keys are numbers of
+                        offspring per litter and values are probabilities
+        """
+        items = sorted( probabilityDictionary.items() )
+        self.sizes = [ size for size, probability in items ]
+        self.cumulative = list( itertools.accumulate(
+            probability for size, probability in items ) )
+        if len(self.sizes) == 0 or self.cumulative[-1] <= 0:
+            exit("Sorry, at least one litter size must have a nonzero probability.")
+        self.total = self.cumulative[-1]
+
+        self.sizeArray = np.array( self.sizes, dtype=np.int64 )
+        self.cumulativeArray = np.array( self.cumulative, dtype=np.float64 )
+        self.mean = sum( size * probability for size, probability in items ) \
+                    / self.total
+
+    def draw(self, rng):
+        """
+            Param rng: a random.Random (e.g. a DriftRandom)
+            Return: a randomly chosen number of offspring in a litter
+        """
+        index = bisect_right( self.cumulative, rng.random() * self.total )
+        # Guard against rounding at the very top of the table
+        return self.sizes[ min(index, len(self.sizes) - 1) ]
+
+    def drawMany(self, numLitters, generator):
+        """
+            Params:
+                numLitters: the number of litter sizes to draw
+                generator: a numpy.random.Generator
+            Return: an array of numLitters randomly chosen litter sizes
+        """
+        uniforms = generator.random(numLitters) * self.total
+        indices = np.searchsorted( self.cumulativeArray, uniforms, side="right" )
+        np.minimum( indices, len(self.sizes) - 1, out=indices )
+        return self.sizeArray[indices]
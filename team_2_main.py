@@ -6,134 +6,118 @@
     Written for Python 3
 """
 
-from team_2_species import Species
 from team_2_simulator import *
 from team_2_settings import *
-import math
+from team_2_runner import currentSettings, iterReplicates, iterAdaptiveReplicates
+from team_2_random import newSeed
+from team_2_statistics import FixationStatistics
+from team_2_trajectories import TrajectoryWriter, writeTsv, TRAJECTORY_COLUMNS
+from team_2_profiling import Profiler, writeMetrics
+from team_2_plot import makePlots
+from team_2_output import BackgroundWriter
 import os
 
-
-def generationsToFixation(freqsOverTime):
-    """
-        Return: the first generation in which an allele became fixed in the
-                frequency-over-time data
-    """
-    for i in range(len(freqsOverTime)):
-        if 1.0 in freqsOverTime[i]:
-            return i
-    return -1
-
-def standardDev( listOfValues ):
-    """
-        Return: the standard deviation of the list of values
-                Note: sd(. . .) = sqrt( \sum_i( x_i - mean )^2 / n - 1 )
-                Note: this function discards values of -1 (which in our case
-                      indicates a dummy value)
-    """
-    mean = sum(listOfValues)/len(listOfValues)
-    sd = 0.0
-    for x in listOfValues:
-        if x != -1:
-            sd += (x - mean)**2
-    sd = math.sqrt(sd)/(len(listOfValues) - 1)
-    return sd
-
-def countFixationsByAllele( allRuns, listOfFixationGenerations ):
-    """
-        Counts the number of times each allele was fixed.
-        Params:
-            allRuns: The frequency data for all sample simulations
-            listOfFixationGenerations: The list indicating in which generation a
-                                       fixation occurred, as returned by
-                                       generationsToFixation()
-        Returns: a 3-tuple, which is:
-                   ( number of times allele 0 was fixed,
-                     times allele 1 was fixed,
-                     times allele 2 was fixed )
-    """
-    numFixations = [0.0] * 3
-    for i in range(len(allRuns)):
-        if listOfFixationGenerations[i] != -1: # if a fixation actually occurred here
-            freqsOverTime = allRuns[i]
-            thisRunsFixation = list(freqsOverTime[ listOfFixationGenerations[i] ])
-            numFixations = list( x + y for x,y in zip(numFixations, thisRunsFixation) )
-    return numFixations
+# The percentiles of generations to fixation we report
+PERCENTILES = [ 5, 25, 50, 75, 95 ]
 
 
-def printStatistics( allSimulations, outputDir ):
+def printStatistics( statistics, outputDir, seed, settings=None ):
     """
         Outputs (both to the standard out and to a text file in the output directory)
         a number of statistics on the full run of simulations.
 
         Parameters:
-            allRuns: The allele frequency data on all simulations
+            statistics: The FixationStatistics accumulated over all simulations
+                        (or a DiffusionEstimate, from team_2_estimate.py)
             outputDir: The directory in which we should write our files
-        Also uses:
-            global (from settings) numberOfRuns
-            global (from settings) popSize
-            global (from settings) fixedNumberOfGenerations
+            seed: The seed the simulations were run with
+            settings: The simulation parameters the simulations were run with,
+                      as returned by currentSettings() (by default, those in
+                      team_2_settings.py)
     """
+    if settings is None:
+        settings = currentSettings()
+    popSize = settings["popSize"]
+    fixedNumberOfGenerations = settings["fixedNumberOfGenerations"]
+    startingFrequencies = settings["startingFrequencies"]
+
     print("              Data on the fixation events            ")
     print("-----------------------------------------------------")
-    print("Sample size (number of simulations): " + str(numberOfRuns))
+    print("Sample size (number of simulations): " + str(statistics.numRuns))
     print("Population size: " + str(popSize))
     print("Fixed number of generations: " + str(fixedNumberOfGenerations))
-
-    timeToFixation = list(map(generationsToFixation, allSimulations))
+    print("Seed: " + str(seed))
 
     # Calculate the fixation percentage
-    numFixations = sum( 1 for x in timeToFixation if x != -1 )
     if fixedNumberOfGenerations <= 0:
         percentFixations = 100
     else:
-        percentFixations = (numFixations / len(allSimulations)) * 100
+        percentFixations = statistics.getPercentFixations()
     print("A fixation event occurred ", percentFixations, "% of the time.")
 
-    # Calculate the mean
-    # If we used a fixed number of generations, the mean is easy
-    if fixedNumberOfGenerations <= 0:
-        meanTimeToFixation = sum(timeToFixation) / len(allSimulations)
-    else: # Need to discard times we didn't have fixation
-        meanTimeToFixation = sum(x for x in timeToFixation if x != -1) / numFixations
+    meanTimeToFixation = statistics.getMean()
     print( "Mean generations to fixation: ", meanTimeToFixation )
 
-    # Calculate the standard deviation
-    sd = standardDev(timeToFixation)
+    sd = statistics.getStandardDeviation()
     print( "Standard deviation: ", sd )
 
-    # Calculate the min and max generations to fixation
-    print( "Max generations to fixation: ", max(timeToFixation) )
-    print( "Min generations to fixation: ", min(timeToFixation) )
+    # The min and max generations to fixation
+    print( "Max generations to fixation: ", statistics.getMax() )
+    print( "Min generations to fixation: ", statistics.getMin() )
+
+    percentiles = [ statistics.getPercentile(percent) for percent in PERCENTILES ]
+    print( "Percentiles of generations to fixation "
+           + str(tuple(PERCENTILES)) + ": ", percentiles )
 
-    # Print data on how often each allele became fixed
+    # Print data on how often each allele became fixed (an estimate may not
+    # know, in a run of a fixed number of generations)
+    numFixations = [ None if count is None else float(count)
+                     for count in statistics.fixationsByAllele ]
     print("\nStarting frequencies: " + str(startingFrequencies))
     print( "Number of times each allele became fixed (a_0, a_1, a_2): ",
-           countFixationsByAllele(allSimulations, timeToFixation) )
+           numFixations )
+
+    # Print data on when alleles were lost
+    numLosses = list( statistics.getLossCounts() )
+    meanLosses = list( statistics.getMeanLossGenerations() )
+    meanFirstLoss = statistics.getMeanFirstLossGeneration()
+    print( "Number of times each allele was lost (a_0, a_1, a_2): ", numLosses )
+    print( "Mean generation each allele was lost (a_0, a_1, a_2): ", meanLosses )
+    print( "Mean generations to the first loss: ", meanFirstLoss )
 
     # Write all of the above to a file for future reference
     if not os.path.exists( outputDir ):
         os.makedirs(outputDir)
-    outputFile = open( outDir + "/statistics.txt",
+    outputFile = open( outputDir + "/statistics.txt",
                        "w" )
     outputFile.write("              Data on the fixation events            \n")
     outputFile.write("-----------------------------------------------------\n")
     outputFile.write("Sample size (number of simulations): "
-                     + str(numberOfRuns) + "\n")
+                     + str(statistics.numRuns) + "\n")
     outputFile.write("Population size: " + str(popSize) + "\n")
     outputFile.write("Fixed number of generations: " + str(fixedNumberOfGenerations)
                      + "\n")
+    outputFile.write("Seed: " + str(seed) + "\n")
     outputFile.write( "A fixation event occurred " + str(percentFixations)
                       + "% of the time.\n" )
     outputFile.write( "Mean generations to fixation: " + str(meanTimeToFixation)
                       + "\n" )
     outputFile.write( "Standard deviation: " + str(sd) + "\n" )
-    outputFile.write( "Max generations to fixation: " + str(max(timeToFixation))
+    outputFile.write( "Max generations to fixation: " + str(statistics.getMax())
                       + "\n" )
-    outputFile.write( "Min generations to fixation: " + str(min(timeToFixation))
+    outputFile.write( "Min generations to fixation: " + str(statistics.getMin())
                       + "\n" )
+    outputFile.write( "Percentiles of generations to fixation "
+                      + str(tuple(PERCENTILES)) + ": " + str(percentiles) + "\n" )
     outputFile.write("\nStarting frequencies: " + str(startingFrequencies) + "\n")
     outputFile.write( "Number of times each allele became fixed (a_0, a_1, a_2): "
-                      + str(countFixationsByAllele(allSimulations, timeToFixation))
+                      + str(numFixations)
+                      + "\n" )
+    outputFile.write( "Number of times each allele was lost (a_0, a_1, a_2): "
+                      + str(numLosses) + "\n" )
+    outputFile.write( "Mean generation each allele was lost (a_0, a_1, a_2): "
+                      + str(meanLosses) + "\n" )
+    outputFile.write( "Mean generations to the first loss: " + str(meanFirstLoss)
                       + "\n" )
     outputFile.close()
 
@@ -147,33 +131,95 @@ def printStatistics( allSimulations, outputDir ):
 ##                               Main program                                      ##
 #####################################################################################
 
-# Create the output directory if necessary
-outDir = "output"
-if not os.path.exists( outDir ):
-    os.makedirs(outDir)
-
-allRuns = []
-# For each simulation, write the data to a file in the output directory
-for repetition in range(numberOfRuns):
-    theSpecies = Species( popSize, startingFrequencies, probOfLitterSize, name )
-    freqsOverTime = simulateDrift( theSpecies,
-                                   bool(fixedNumberOfGenerations > 0),
-                                   fixedNumberOfGenerations )
-    allRuns.append(freqsOverTime)
-
-    outputFile = open( outDir + "/frequency_over_time" + str(repetition) + ".tsv",
-                       "w" )
-    # Write the header
-    outputFile.write("#Generation\tAllele0 Freq\tAllele1 Freq\tAllele2 Freq\n")
-
-    # Write the actual data
-    for generation in range(len(freqsOverTime)):
-        outputFile.write( str(generation) + "\t" )
-        outputFile.write( '\t'.join( format( freq, "1.4f")
-                                     for freq in freqsOverTime[generation] ) )
-        outputFile.write( "\n" )
-
-    outputFile.close()
-
-# Output statistics about our simulations
-printStatistics( allRuns, outDir )
+if __name__ == "__main__":
+    # Create the output directory if necessary
+    outDir = "output"
+    if not os.path.exists( outDir ):
+        os.makedirs(outDir)
+
+    # Pick a seed now (if none was given), so that we can report it
+    if seed is None:
+        seed = newSeed()
+
+    # Each simulation's results are added to the statistics (and written out)
+    # as soon as it finishes, then thrown away
+    statistics = FixationStatistics()
+    # Record the fixation and loss events of each run
+    eventsFile = open( outDir + "/events.tsv", "w" )
+    eventsFile.write( "#Run\tFixation generation\tFixed allele"
+                      + "\tAllele0 lost\tAllele1 lost\tAllele2 lost"
+                      + "\tGenerations\tFinal a_0\tFinal a_1\tFinal a_2\n" )
+
+    # Trajectories go into a single binary file and/or one text file per run
+    # (with the "summary" recording policy, there's nothing to save)
+    trajectoryWriter = None
+    if recordingPolicy == "summary":
+        outputFormat = None
+    if outputFormat in ("binary", "both"):
+        trajectoryWriter = TrajectoryWriter( outDir + "/trajectories.bin",
+                                             TRAJECTORY_COLUMNS )
+
+    # The profiles of the simulations (if profiling is on)
+    totalProfile = Profiler()
+    runProfiles = []
+
+    def writeRun( repetition, recorder ):
+        """
+            Writes a single simulation's events and trajectory. Private to the
+            main program.
+        """
+        fixationGeneration, fixedAllele, losses = recorder.getEvents()
+        eventsFile.write( "\t".join( str(x) for x in
+                                     (repetition, fixationGeneration, fixedAllele)
+                                     + losses
+                                     + (recorder.getNumGenerations(),)
+                                     + recorder.getFinalFrequencies() ) + "\n" )
+
+        if trajectoryWriter is not None:
+            trajectoryWriter.addRun( recorder.getRows(), recorder.getGenerations() )
+        if outputFormat in ("tsv", "both"):
+            writeTsv( outDir + "/frequency_over_time" + str(repetition) + ".tsv",
+                      recorder.getRows(), recorder.getGenerations(),
+                      TRAJECTORY_COLUMNS )
+
+    # For each simulation, write the data to the output directory (in the
+    # background, while the next simulations run)
+    if adaptiveRuns:
+        replicates = iterAdaptiveReplicates( currentSettings(), statistics,
+                                             numberOfWorkers, seed )
+    else:
+        replicates = iterReplicates( currentSettings(), numberOfRuns,
+                                     numberOfWorkers, seed )
+    try:
+        with BackgroundWriter( outputQueueSize ) as writer:
+            for repetition, recorder in enumerate(replicates):
+                statistics.addEvents( *recorder.getEvents() )
+                if recorder.profile is not None:
+                    totalProfile.merge( recorder.profile )
+                    runProfiles.append( recorder.profile )
+                writer.submit( writeRun, repetition, recorder )
+
+            if trajectoryWriter is not None:
+                writer.submit( trajectoryWriter.close )
+            writer.submit( eventsFile.close )
+    finally:
+        # If a simulation (or a write) failed, the writer threw away the
+        # closes above: keep the events of the runs that finished, but don't
+        # leave a half-written trajectory file behind
+        eventsFile.close()
+        if trajectoryWriter is not None:
+            trajectoryWriter.discard()
+
+    # Output statistics about our simulations
+    printStatistics( statistics, outDir, seed )
+    if adaptiveRuns:
+        print( "\nStopped after " + str(statistics.numRuns) + " simulations. "
+               + "Confidence interval half-widths (" + str(confidenceLevel)
+               + "): mean generations to fixation ",
+               statistics.getMeanHalfWidth( confidenceLevel ),
+               ", fixation probabilities (a_0, a_1, a_2)",
+               list( statistics.getFixationProbabilityHalfWidths( confidenceLevel ) ) )
+    if profile:
+        writeMetrics( outDir + "/metrics.json", totalProfile, runProfiles )
+    if plotOverview:
+        makePlots( outDir )
@@ -0,0 +1,401 @@
+"""
+    An exact solution of the per-allele marginal chains of the Wright-Fisher
+    approximation (see team_2_wright_fisher.py), for small populations.
+
+    The "wrightfisher" engine is a Markov chain on the allele counts
+    (c_0, c_1, c_2): every generation, n = round(2 Ne) gene copies are drawn
+    multinomially from the current frequencies, where Ne depends on the number
+    of males, which is Binomial(N, 1/2), and the draw is scaled back to the 2N
+    copies of the population.
+
+    The full chain has about 2N^2 states, and each state can move to
+    thousands of others, so its transition matrix has ~10^8 entries even for
+    the default popSize of 95. We don't need it, though: everything
+    printStatistics() reports is about when an allele is fixed or lost, which
+    only depends on that allele's own count. A multinomial draw gives each
+    allele a binomial count, whatever the other two are doing, so each
+    allele's count is a Markov chain with just 2N+1 states:
+
+        P(c -> c') = sum over n of P(n) * P(Binomial(n, c/2N) scales to c'),
+
+    where P(n) comes from the distribution of the number of males. Its
+    transition matrix is sparse (each count can only move by a few standard
+    deviations), and the same for every allele and every starting frequency,
+    so it is cached on disk by population size and litter-size distribution.
+
+    Pushing each allele's starting count through its marginal chain one
+    generation at a time gives, for every generation t, the exact probability
+    that the allele has been fixed (or lost) by t. Since at most one allele can
+    be fixed,
+
+        P(fixation by t)  = sum_i P(allele i fixed by t),
+        P(first loss by t) = sum_i P(allele i lost by t)
+                             - sum_i P(allele i fixed by t)
+
+    (when an allele is fixed, the other two have both been lost). This gives
+    the whole distribution of the generations to fixation, the probability
+    that each allele is fixed, and the loss times, for runs until fixation and
+    for runs of a fixed number of generations alike.
+
+    Scaling the n copies drawn back to 2N, each count is rounded up with
+    probability equal to the fraction being rounded off, by itself here and
+    by systematic sampling (so that the counts add up to 2N) in the engine
+    (see roundCounts() in team_2_wright_fisher.py). Either way each count is
+    rounded up with the same probability, so each allele's count in the
+    engine follows its chain here exactly; the independently rounded chains
+    are just a way of working out those marginals. Every statistic is
+    therefore exact for the "wrightfisher" engine, the first loss included:
+    its formula above is inclusion-exclusion, since two alleles have both
+    been lost exactly when the third has been fixed.
+
+    The solution needs SciPy (pip3 install scipy) for its sparse matrices.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import hashlib
+import io
+import json
+import math
+import os
+import numpy as np
+from team_2_wright_fisher import effectivePopulationSize, probOfNumMales
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+# Change this whenever the way the transition matrices are built changes, so
+# that stale cached matrices aren't used
+MARKOV_CACHE_VERSION = 1
+
+# Transition probabilities below this are left out of the matrix (and the
+# rest of the row is scaled up to sum to 1)
+TRUNCATION = 1e-14
+
+# How much of each allele's probability may still be unabsorbed (neither lost
+# nor fixed) when we stop following a run until fixation
+TOLERANCE = 1e-10
+
+
+def isAvailable():
+    """
+        Return: true if SciPy (and so the exact solution) is available
+    """
+    return sparse is not None
+
+
+def drawSizeWeights( popSize, probOfLitterSize ):
+    """
+        Works out the distribution of the number of gene copies drawn each
+        generation, n = round(2 Ne), over the Binomial(N, 1/2) numbers of males
+        (leaving out the all-male and all-female generations, which can't
+        reproduce).
+
+        Return: a list of (n, probability) pairs
+    """
+    totalAlleles = 2*popSize
+    numMales, probs = probOfNumMales( popSize )
+    weights = {}
+    for males, prob in zip( numMales.tolist(), probs.tolist() ):
+        if prob < TRUNCATION:
+            continue
+        Ne = effectivePopulationSize( popSize, males, probOfLitterSize )
+        numDraws = min( max(int(round(2*Ne)), 1), totalAlleles )
+        weights[numDraws] = weights.get(numDraws, 0.0) + prob
+    total = math.fsum( weights.values() )
+    return sorted( (numDraws, prob / total) for numDraws, prob in weights.items() )
+
+
+def transitionRow( frequency, weights, totalAlleles, logFactorials ):
+    """
+        Params:
+            frequency: an allele's frequency in the parent generation
+            weights: the draw sizes and their probabilities, as returned by
+                     drawSizeWeights()
+            totalAlleles: the number of gene copies in the population (2N)
+            logFactorials: an array of log(k!) for k = 0 ... totalAlleles
+        Return: a vector of the probabilities of each count (0 ... totalAlleles)
+                of the allele in the child generation
+    """
+    row = np.zeros( totalAlleles + 1 )
+    if frequency <= 0.0 or frequency >= 1.0:
+        row[ 0 if frequency <= 0.0 else totalAlleles ] = 1.0
+        return row
+
+    for numDraws, weight in weights:
+        drawn = np.arange( numDraws + 1 )
+        logPmf = ( logFactorials[numDraws] - logFactorials[drawn]
+                   - logFactorials[numDraws - drawn]
+                   + drawn * math.log(frequency)
+                   + (numDraws - drawn) * math.log1p(-frequency) )
+        pmf = np.exp( logPmf )
+
+        # Scale the copies drawn back to totalAlleles, rounding up with
+        # probability equal to the remainder
+        whole, remainder = np.divmod( drawn * totalAlleles, numDraws )
+        roundUp = remainder / numDraws
+        np.add.at( row, whole, weight * pmf * (1 - roundUp) )
+        np.add.at( row, np.minimum(whole + 1, totalAlleles), weight * pmf * roundUp )
+    return row
+
+
+def buildTransitionMatrix( popSize, probOfLitterSize ):
+    """
+        Builds the transition matrix of a single allele's count (see the top of
+        this file).
+
+        Params:
+            popSize: the population size N
+            probOfLitterSize: the litter-size probability dictionary
+        Return: a (2N+1) x (2N+1) scipy.sparse CSR matrix whose entry (c, c')
+                is the probability that an allele with c copies has c' in the
+                next generation
+    """
+    if sparse is None:
+        exit("Sorry, the exact Markov-chain solution needs SciPy (pip3 install scipy).")
+    if popSize < 2:
+        exit("Sorry, a population needs at least 2 individuals to reproduce.")
+
+    totalAlleles = 2*popSize
+    weights = drawSizeWeights( popSize, probOfLitterSize )
+    logFactorials = np.concatenate( ( [0.0],
+        np.cumsum( np.log( np.arange(1, totalAlleles + 1) ) ) ) )
+
+    rows, columns, values = [], [], []
+    for count in range( totalAlleles + 1 ):
+        row = transitionRow( count / totalAlleles, weights, totalAlleles,
+                             logFactorials )
+        kept = np.flatnonzero( row >= TRUNCATION )
+        rows.append( np.full( len(kept), count ) )
+        columns.append( kept )
+        values.append( row[kept] / row[kept].sum() )
+
+    return sparse.csr_matrix( ( np.concatenate(values),
+                                ( np.concatenate(rows), np.concatenate(columns) ) ),
+                              shape=( totalAlleles + 1, totalAlleles + 1 ) )
+
+
+def matrixHash( popSize, probOfLitterSize ):
+    """
+        Return: a hash (a hex string) of everything that goes into a transition
+                matrix
+    """
+    key = { "popSize": popSize,
+            "probOfLitterSize": sorted( probOfLitterSize.items() ),
+            "truncation": TRUNCATION,
+            "version": MARKOV_CACHE_VERSION }
+    text = json.dumps( key, sort_keys=True, separators=(",", ":") )
+    return hashlib.sha256( text.encode("utf-8") ).hexdigest()
+
+
+def loadTransitionMatrix( popSize, probOfLitterSize, cacheDir="markov_cache" ):
+    """
+        Returns the transition matrix built by buildTransitionMatrix(), from
+        the cache directory if it was built before (and storing it there if
+        not). Cache files are written under a temporary name and then renamed,
+        so a crash never leaves a half-written one.
+
+        Params:
+            popSize: the population size N
+            probOfLitterSize: the litter-size probability dictionary
+            cacheDir: the directory the cache is kept in (None to not cache)
+        Return: the transition matrix
+    """
+    if cacheDir is None:
+        return buildTransitionMatrix( popSize, probOfLitterSize )
+
+    path = os.path.join( cacheDir, matrixHash(popSize, probOfLitterSize) + ".npz" )
+    if os.path.exists( path ):
+        return sparse.load_npz( path ).tocsr()
+
+    matrix = buildTransitionMatrix( popSize, probOfLitterSize )
+    if not os.path.exists( cacheDir ):
+        os.makedirs( cacheDir )
+    buffer = io.BytesIO()
+    sparse.save_npz( buffer, matrix )
+    with open( path + ".partial", "wb" ) as cacheFile:
+        cacheFile.write( buffer.getvalue() )
+    os.replace( path + ".partial", path )
+    return matrix
+
+
+class ExactSolution:
+    """
+        The fixation statistics of the Wright-Fisher approximation, exact for
+        the per-allele marginal chains (see the top of this file). Answers the
+        same questions as FixationStatistics (in team_2_statistics.py), so it
+        can be handed to printStatistics(); the counts are expected numbers of
+        runs. Like
+        DiffusionEstimate, it has no min or max generations to fixation (the
+        expected fewest and most in a batch of numRuns runs are given by
+        expectedExtremes() instead).
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, popSize, startingFrequencies, probOfLitterSize,
+                 numRuns=1, fixedNumberOfGenerations=0, cacheDir="markov_cache",
+                 tolerance=TOLERANCE, maxGenerations=10**6):
+        """
+            Params:
+                popSize: the population size
+                startingFrequencies: the 3-tuple of starting allele frequencies
+                probOfLitterSize: the litter-size probability dictionary
+                numRuns: the number of simulations to give expected counts for
+                fixedNumberOfGenerations: as in team_2_settings.py (0 means
+                                          every run goes on until fixation)
+                cacheDir: the directory transition matrices are cached in
+                tolerance: in runs until fixation, stop once the probability
+                           that an allele has been neither lost nor fixed yet
+                           is below this
+                maxGenerations: never follow the chain for longer than this
+        """
+        if math.fsum(probOfLitterSize.values()) != 1.0:
+            exit( "Sorry, probabilities of producing offspring must sum to 1 "
+                  + "(yours sum to " + str(math.fsum(probOfLitterSize.values()))
+                  + ")." )
+
+        self.numRuns = numRuns
+        self.fixedNumberOfGenerations = fixedNumberOfGenerations
+        totalAlleles = 2*popSize
+        counts = [ int(round(freq * totalAlleles)) for freq in startingFrequencies ]
+        matrix = loadTransitionMatrix( popSize, probOfLitterSize, cacheDir )
+        transposed = matrix.T.tocsr()
+
+        # Each allele's distribution of counts, one per column. The starting
+        # counts may not add up to exactly 2N, so the first generation is
+        # drawn from the starting frequencies directly.
+        weights = drawSizeWeights( popSize, probOfLitterSize )
+        logFactorials = np.concatenate( ( [0.0],
+            np.cumsum( np.log( np.arange(1, totalAlleles + 1) ) ) ) )
+        frequencies = [ count / sum(counts) for count in counts ]
+        distributions = np.stack( [ transitionRow( frequency, weights,
+                                                   totalAlleles, logFactorials )
+                                    for frequency in frequencies ], axis=1 )
+
+        # The probability that each allele has been fixed (lost) by each
+        # generation
+        fixed = [ [ float(frequency == 1.0) for frequency in frequencies ] ]
+        lost = [ [ float(frequency == 0.0) for frequency in frequencies ] ]
+        generation = 0
+        while True:
+            generation += 1
+            fixed.append( distributions[totalAlleles].tolist() )
+            lost.append( distributions[0].tolist() )
+            if fixedNumberOfGenerations > 0:
+                if generation >= fixedNumberOfGenerations:
+                    break
+            elif distributions[1:totalAlleles].sum( axis=0 ).max() < tolerance:
+                break
+            if generation >= maxGenerations:
+                break
+            distributions = transposed @ distributions
+
+        self.fixedByGeneration = np.array( fixed )
+        self.lostByGeneration = np.array( lost )
+        self.fixationProbabilities = tuple( self.fixedByGeneration[-1].tolist() )
+        self.fixationsByAllele = [ numRuns * p for p in self.fixationProbabilities ]
+
+        # The distribution of the generations to fixation (over the runs that
+        # reach it)
+        reached = self.fixedByGeneration.sum( axis=1 )
+        self.fixationDistribution = np.diff( reached, prepend=0.0 )
+        self.probOfFixation = float( reached[-1] )
+
+    def getPercentFixations(self):
+        """
+            Return: the percentage of simulations in which an allele is fixed
+        """
+        return 100 * self.probOfFixation
+
+    def getMean(self):
+        """
+            Return: the mean generations to fixation (over the simulations that
+                    reach it), or None if none can
+        """
+        if self.probOfFixation <= 0:
+            return None
+        generations = np.arange( len(self.fixationDistribution) )
+        return float( np.sum( generations * self.fixationDistribution )
+                      / self.probOfFixation )
+
+    def getStandardDeviation(self):
+        """
+            Return: the standard deviation of the generations to fixation, or
+                    None
+        """
+        mean = self.getMean()
+        if mean is None:
+            return None
+        generations = np.arange( len(self.fixationDistribution) )
+        variance = np.sum( (generations - mean)**2 * self.fixationDistribution ) \
+                   / self.probOfFixation
+        return math.sqrt( float(variance) )
+
+    def getPercentile(self, percent):
+        """
+            Param percent: a number between 0 and 100
+            Return: that percentile of the generations to fixation (the first
+                    generation by which that percentage of the simulations that
+                    reach fixation have reached it), or None
+        """
+        if self.probOfFixation <= 0:
+            return None
+        cumulative = np.cumsum( self.fixationDistribution ) / self.probOfFixation
+        position = np.searchsorted( cumulative, percent / 100 - 1e-12 )
+        return int( min( position, len(cumulative) - 1 ) )
+
+    def expectedExtremes(self):
+        """
+            Return: the expected (fewest, most) generations to fixation among
+                    the simulations (out of numRuns) that reach it
+        """
+        numFixed = max( int(round(self.numRuns * self.probOfFixation)), 1 )
+        cumulative = np.minimum( np.cumsum( self.fixationDistribution )
+                                 / self.probOfFixation, 1.0 )
+        fewest = np.sum( (1.0 - cumulative[:-1])**numFixed )
+        most = np.sum( 1.0 - cumulative[:-1]**numFixed )
+        return float(fewest), float(most)
+
+    def getMin(self):
+        return None
+
+    def getMax(self):
+        return None
+
+    def getLossCounts(self):
+        """
+            Return: a 3-tuple with the expected number of simulations in which
+                    each allele is lost
+        """
+        return tuple( self.numRuns * p for p in self.lostByGeneration[-1].tolist() )
+
+    def getMeanLossGenerations(self):
+        """
+            Return: a 3-tuple with the mean generation in which each allele is
+                    lost (over the simulations in which it is), or None
+        """
+        generations = np.arange( len(self.lostByGeneration) )
+        losses = []
+        for allele in range(3):
+            probOfLoss = self.lostByGeneration[-1, allele]
+            if probOfLoss <= 0:
+                losses.append( None )
+                continue
+            perGeneration = np.diff( self.lostByGeneration[:, allele], prepend=0.0 )
+            losses.append( float( np.sum(generations * perGeneration) / probOfLoss ) )
+        return tuple(losses)
+
+    def getMeanFirstLossGeneration(self):
+        """
+            Return: the mean generation in which the first allele is lost (over
+                    the simulations in which one is), or None
+        """
+        anyLost = self.lostByGeneration.sum( axis=1 ) - self.fixedByGeneration.sum( axis=1 )
+        if anyLost[-1] <= 0:
+            return None
+        generations = np.arange( len(anyLost) )
+        return float( np.sum( generations * np.diff(anyLost, prepend=0.0) )
+                      / anyLost[-1] )
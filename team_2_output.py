@@ -0,0 +1,134 @@
+"""
+    Writing a batch's output in the background, while the next simulations run.
+
+    A BackgroundWriter runs the functions it is handed (e.g. "write this
+    simulation's trajectory") one at a time, in order, on a thread of its own.
+    Writing files mostly waits on the disk (and compressing with zlib lets go
+    of the interpreter), so the simulations carry on meanwhile.
+
+    The queue of functions waiting to be run is bounded: once it is full,
+    submit() waits for room, so a slow disk slows the simulations down rather
+    than letting finished trajectories pile up in memory. If one of the
+    functions fails, the rest are thrown away, and the error is raised again
+    (in the simulating thread) by every later call to submit() or close().
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import queue
+import threading
+
+# Put on the queue to tell the writer thread to stop
+_STOP = object()
+
+
+class BackgroundWriter:
+    """
+        Runs output functions on a thread of its own (see the top of this
+        file).
+
+        Use it as a context manager, so that the thread is always stopped:
+            with BackgroundWriter() as writer:
+                writer.submit( outputFile.write, text )
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, maxPending=64):
+        """
+            Param maxPending: the most functions that can wait to be run; 0
+                              runs every function straight away, in the
+                              calling thread, instead of in the background
+        """
+        self.error = None
+        # Set for good once a function has failed (unlike error, which abort()
+        # clears), so that nothing submitted after it is ever run
+        self.failed = False
+        self.closed = False
+        self.thread = None
+        if maxPending > 0:
+            self.queue = queue.Queue( maxPending )
+            self.thread = threading.Thread( target=self.run, name="BackgroundWriter",
+                                            daemon=True )
+            self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+    def run(self):
+        """
+            The writer thread: runs each function in turn until told to stop.
+            Private to BackgroundWriter.
+        """
+        while True:
+            task = self.queue.get()
+            if task is _STOP:
+                return
+            if self.failed:
+                # Something already failed; just make room in the queue
+                continue
+            function, args = task
+            try:
+                function( *args )
+            except BaseException as error:
+                self.error = error
+                self.failed = True
+
+    def raiseError(self):
+        """
+            Raises the error a function failed with, if any. Private to
+            BackgroundWriter.
+        """
+        if self.failed and self.error is not None:
+            raise self.error
+
+    def submit(self, function, *args):
+        """
+            Runs function(*args) in the background, after everything submitted
+            before it. Waits if too many functions are already waiting.
+        """
+        if self.closed:
+            exit("Sorry, the output has already been closed.")
+        self.raiseError()
+        if self.thread is None:
+            try:
+                function( *args )
+            except BaseException as error:
+                self.error = error
+                self.failed = True
+                raise
+        else:
+            self.queue.put( (function, args) )
+
+    def close(self):
+        """
+            Waits for every function submitted to have been run, and stops the
+            writer thread. Raises the error a function failed with, if any.
+        """
+        if not self.closed:
+            self.closed = True
+            if self.thread is not None:
+                self.queue.put( _STOP )
+                self.thread.join()
+        self.raiseError()
+
+    def abort(self):
+        """
+            Stops the writer thread as soon as the function it is running (if
+            any) is done, throwing away the ones still waiting. Used when the
+            simulations themselves have failed.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self.failed = True
+            self.queue.put( _STOP )
+            self.thread.join()
+        self.error = None
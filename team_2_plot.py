@@ -0,0 +1,325 @@
+"""
+    Overview plots of a whole batch of simulations.
+
+    The sample Gnuplot scripts plot a handful of simulations, one text file
+    each. For a batch of thousands of simulations, this stage instead reads
+    the batch's output in bulk (output/trajectories.bin and output/events.tsv)
+    and reduces it to three small tables in output/plots:
+
+        bands.tsv               for each allele, the mean and the percentiles
+                                (BAND_PERCENTILES) of its frequency across all
+                                the simulations, generation by generation
+        fixation_histogram.tsv  a histogram of the generations to fixation
+        fixation_shares.tsv     how often each allele became fixed (and how
+                                often none did)
+
+    plot_overview.gp turns these into PNG images in the same directory; it is
+    run automatically if Gnuplot is installed.
+
+    The frequency percentiles are streamed: each simulation's frequencies are
+    added to a histogram (FREQUENCY_BINS bins per allele per generation) and
+    then thrown away, so the memory used doesn't depend on the number of
+    simulations. A simulation that has finished keeps its final frequencies
+    (a fixed allele stays fixed), and with a recording policy that skips
+    generations, each one keeps the frequencies last recorded. For long
+    simulations, the bands are worked out at no more than MAX_BAND_POINTS
+    evenly spaced generations.
+
+    Usage (plots the batch in the output directory):
+        $ python3 team_2_plot.py [output directory]
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+from team_2_trajectories import TrajectoryReader
+
+# The percentiles of each allele's frequency shown as bands
+BAND_PERCENTILES = [ 5, 25, 50, 75, 95 ]
+
+# The resolution of the frequency percentiles: frequencies of exactly 0 and 1
+# get a bin each, and the ones in between share the rest
+FREQUENCY_BINS = 202
+
+# The most generations at which the bands are worked out
+MAX_BAND_POINTS = 1000
+
+# The number of bars in the fixation-time histogram
+HISTOGRAM_BARS = 50
+
+# The number of simulations whose frequencies are binned together
+RUNS_PER_UPDATE = 256
+
+
+def readEvents( path ):
+    """
+        Reads the events file written by team_2_main.py.
+
+        Return: a dictionary of integer arrays, one entry per simulation:
+                "fixationGeneration" (-1 if there was no fixation),
+                "fixedAllele" (-1 if none) and "generations" (the number of
+                generations simulated), plus "finalFrequencies" (a float array
+                with a row per simulation)
+    """
+    table = np.loadtxt( path, delimiter="\t", comments="#", ndmin=2 )
+    return { "fixationGeneration": table[:, 1].astype(np.int64),
+             "fixedAllele": table[:, 2].astype(np.int64),
+             "generations": table[:, 6].astype(np.int64),
+             "finalFrequencies": table[:, 7:10] }
+
+
+def matchesEvents( reader, events ):
+    """
+        Return: true if the trajectories in reader are those of the simulations
+                in events (rather than left over from an earlier batch),
+                judging by the number of simulations and by how the first and
+                last of them ended
+    """
+    numRuns = len(events["generations"])
+    if len(reader) != numRuns or numRuns == 0:
+        return False
+    for run in { 0, numRuns - 1 }:
+        generations = reader.getGenerations(run)
+        if ( len(generations) == 0
+             or int(generations[-1]) != events["generations"][run]
+             or not np.allclose( reader[run][-1, :3],
+                                 events["finalFrequencies"][run], atol=1e-4 ) ):
+            return False
+    return True
+
+
+def bandGenerations( maxGeneration ):
+    """
+        Return: the generations at which the bands are worked out (every
+                generation up to maxGeneration, or MAX_BAND_POINTS evenly
+                spaced ones)
+    """
+    if maxGeneration + 1 <= MAX_BAND_POINTS:
+        return np.arange( maxGeneration + 1 )
+    return np.unique( np.linspace( 0, maxGeneration, MAX_BAND_POINTS )
+                      .round().astype(np.int64) )
+
+
+class BandAccumulator:
+    """
+        Streams the frequencies of many simulations into per-generation
+        histograms, from which the mean and percentiles of each allele's
+        frequency are worked out (see the top of this file).
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, generations, numAlleles=3):
+        """
+            Params:
+                generations: the (sorted) generations to work the bands out at
+                numAlleles: the number of frequency columns
+        """
+        self.generations = np.asarray( generations, dtype=np.int64 )
+        self.numAlleles = numAlleles
+        self.numRuns = 0
+        self.sums = np.zeros( (len(self.generations), numAlleles) )
+        self.histogram = np.zeros( len(self.generations) * numAlleles
+                                   * FREQUENCY_BINS, dtype=np.int64 )
+        self.pending = []
+
+        # The position of each (generation, allele) in the flat histogram
+        self.cellStarts = ( np.arange( len(self.generations) * numAlleles )
+                            * FREQUENCY_BINS ).reshape( len(self.generations),
+                                                        numAlleles )
+
+    def addRun(self, generations, values):
+        """
+            Adds one simulation's frequencies.
+
+            Params:
+                generations: the generation number of each recorded row
+                values: the recorded rows (at least numAlleles columns; any
+                        more are ignored)
+        """
+        if len(generations) == 0:
+            return
+        rows = np.searchsorted( generations, self.generations, side="right" ) - 1
+        frequencies = np.asarray( values[ np.maximum(rows, 0), :self.numAlleles ],
+                                  dtype=np.float64 )
+
+        self.sums += frequencies
+        self.numRuns += 1
+
+        bins = np.where( frequencies <= 0.0, 0,
+               np.where( frequencies >= 1.0, FREQUENCY_BINS - 1,
+                         1 + np.minimum( frequencies * (FREQUENCY_BINS - 2),
+                                         FREQUENCY_BINS - 3 ).astype(np.int64) ) )
+        self.pending.append( (self.cellStarts + bins).ravel() )
+        if len(self.pending) >= RUNS_PER_UPDATE:
+            self.flush()
+
+    def flush(self):
+        """
+            Adds the simulations added since the last flush to the histogram.
+        """
+        if len(self.pending) > 0:
+            self.histogram += np.bincount( np.concatenate(self.pending),
+                                           minlength=len(self.histogram) )
+            self.pending = []
+
+    def getMeans(self):
+        """
+            Return: an array (generations x alleles) of the mean frequencies
+        """
+        return self.sums / max(self.numRuns, 1)
+
+    def getPercentiles(self, percents):
+        """
+            Param percents: a list of numbers between 0 and 100
+            Return: an array (generations x alleles x percents) of the
+                    frequency percentiles (to the resolution of the bins)
+        """
+        self.flush()
+        cumulative = np.cumsum( self.histogram.reshape( len(self.generations),
+                                                        self.numAlleles,
+                                                        FREQUENCY_BINS ), axis=2 )
+        # The frequency each bin stands for
+        binValues = np.concatenate( ( [0.0],
+            ( np.arange(FREQUENCY_BINS - 2) + 0.5 ) / (FREQUENCY_BINS - 2),
+            [1.0] ) )
+
+        percentiles = np.empty( ( len(self.generations), self.numAlleles,
+                                  len(percents) ) )
+        for position, percent in enumerate(percents):
+            rank = percent / 100 * max(self.numRuns, 1)
+            bins = np.count_nonzero( cumulative < rank, axis=2 )
+            percentiles[:, :, position] = binValues[ np.minimum(bins,
+                                                                FREQUENCY_BINS - 1) ]
+        return percentiles
+
+
+def writeBands( path, accumulator ):
+    """
+        Writes the mean and percentiles of each allele's frequency, one line
+        per generation.
+    """
+    means = accumulator.getMeans()
+    percentiles = accumulator.getPercentiles( BAND_PERCENTILES )
+
+    outputFile = open( path, "w" )
+    header = [ "Generation" ]
+    for allele in range(accumulator.numAlleles):
+        header.append( "a_" + str(allele) + " mean" )
+        header += [ "a_" + str(allele) + " P" + str(percent)
+                    for percent in BAND_PERCENTILES ]
+    outputFile.write( "#" + "\t".join(header) + "\n" )
+    for row, generation in enumerate( accumulator.generations.tolist() ):
+        values = []
+        for allele in range(accumulator.numAlleles):
+            values.append( means[row, allele] )
+            values += percentiles[row, allele].tolist()
+        outputFile.write( str(generation) + "\t"
+                          + "\t".join( format(value, "1.4f") for value in values )
+                          + "\n" )
+    outputFile.close()
+
+
+def writeFixationHistogram( path, fixationGenerations ):
+    """
+        Writes a histogram of the generations to fixation (of the simulations
+        that reached it): the first and last generation of each bar, and the
+        number of simulations in it.
+    """
+    fixed = fixationGenerations[ fixationGenerations >= 0 ]
+    outputFile = open( path, "w" )
+    outputFile.write( "#From generation\tTo generation\tSimulations\n" )
+    if len(fixed) > 0:
+        width = max( int( np.ceil( (fixed.max() + 1) / HISTOGRAM_BARS ) ), 1 )
+        counts = np.bincount( fixed // width )
+        for bar, count in enumerate( counts.tolist() ):
+            outputFile.write( str(bar * width) + "\t" + str((bar + 1)*width - 1)
+                              + "\t" + str(count) + "\n" )
+    outputFile.close()
+
+
+def writeFixationShares( path, fixedAlleles ):
+    """
+        Writes the number and fraction of simulations in which each allele
+        became fixed, and in which none did.
+    """
+    numRuns = max( len(fixedAlleles), 1 )
+    outputFile = open( path, "w" )
+    outputFile.write( "#Allele\tSimulations\tFraction\n" )
+    for allele in range(3):
+        count = int( np.count_nonzero(fixedAlleles == allele) )
+        outputFile.write( "a_" + str(allele) + "\t" + str(count) + "\t"
+                          + format( count / numRuns, "1.4f" ) + "\n" )
+    count = int( np.count_nonzero(fixedAlleles == -1) )
+    outputFile.write( "none\t" + str(count) + "\t"
+                      + format( count / numRuns, "1.4f" ) + "\n" )
+    outputFile.close()
+
+
+def makePlots( outputDir="output", script="plot_overview.gp", render=True ):
+    """
+        Writes the overview tables of the batch of simulations in outputDir to
+        outputDir/plots, and (if Gnuplot is installed) renders them.
+
+        Params:
+            outputDir: the directory the batch was written to
+            script: the Gnuplot script that renders the tables
+            render: if false, only write the tables
+        Return: the directory the tables were written to
+    """
+    eventsPath = os.path.join( outputDir, "events.tsv" )
+    if not os.path.exists( eventsPath ):
+        exit("Sorry, there is no " + eventsPath + " to plot.")
+    events = readEvents( eventsPath )
+
+    plotDir = os.path.join( outputDir, "plots" )
+    if not os.path.exists( plotDir ):
+        os.makedirs( plotDir )
+
+    writeFixationHistogram( os.path.join(plotDir, "fixation_histogram.tsv"),
+                            events["fixationGeneration"] )
+    writeFixationShares( os.path.join(plotDir, "fixation_shares.tsv"),
+                         events["fixedAllele"] )
+
+    # The trajectories are only there if the batch saved them (and might be
+    # left over from an earlier batch, if it didn't)
+    trajectoryPath = os.path.join( outputDir, "trajectories.bin" )
+    bandsPath = os.path.join( plotDir, "bands.tsv" )
+    reader = None
+    if os.path.exists( trajectoryPath ):
+        reader = TrajectoryReader( trajectoryPath )
+        if not matchesEvents( reader, events ):
+            reader.close()
+            reader = None
+    if reader is not None:
+        accumulator = BandAccumulator( bandGenerations( int(events["generations"].max()) ) )
+        with reader:
+            for run in range(len(reader)):
+                accumulator.addRun( reader.getGenerations(run), reader[run] )
+        writeBands( bandsPath, accumulator )
+    else:
+        if os.path.exists( bandsPath ):
+            os.remove( bandsPath )
+        print( "The trajectories of this batch weren't saved, so the frequency "
+               + "bands weren't plotted (set outputFormat to \"binary\" or "
+               + "\"both\")." )
+
+    if render:
+        if shutil.which("gnuplot") is None:
+            print( "Wrote the tables to " + plotDir + "; install Gnuplot and run "
+                   + "\"gnuplot " + script + "\" to draw them." )
+        else:
+            subprocess.run( [ "gnuplot", "-e", "dir='" + plotDir + "'", script ],
+                            check=True )
+            print( "Wrote the plots to " + plotDir )
+    return plotDir
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        exit("Usage: python3 team_2_plot.py [output directory]")
+    makePlots( sys.argv[1] if len(sys.argv) == 2 else "output" )
@@ -0,0 +1,172 @@
+import numpy as np
+from team_2_individual import Individual, PackedIndividual
+from team_2_sex import Sex
+
+class Population:
+    """
+        A compact, array-backed representation of a diploid population.
+
+        Instead of a list of Individual objects, the population is stored as
+        two contiguous NumPy arrays:
+            alleles: a uint8 array of shape (N, 2); row i holds the two alleles
+                     (0, 1, or 2) carried by individual i
+            sexes:   a bool array of shape (N,); True means the individual is
+                     female (Sex.F), False means male (Sex.M)
+        The number of copies of each allele is kept alongside, so frequencies
+        never require another pass over the individuals.
+
+        At 3 bytes per individual this is roughly two orders of magnitude
+        smaller than the equivalent list of Individuals.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, alleles, sexes, alleleCounts=None, genotypeCounts=None):
+        """
+            Constructs a population from its allele matrix and sex vector.
+            Requires:
+                alleles: anything convertible to an (N, 2) array of 0, 1, or 2
+                sexes: anything convertible to a length-N array of booleans
+                       (True for female)
+            Optional:
+                alleleCounts: the number of copies of alleles 0, 1 and 2, if
+                              the caller already knows them
+                genotypeCounts: the number of individuals with each genotype
+                              (see getGenotypeCounts()), if the caller already
+                              knows them
+        """
+        self.alleles = np.ascontiguousarray(alleles, dtype=np.uint8).reshape(-1, 2)
+        self.sexes = np.ascontiguousarray(sexes, dtype=bool).reshape(-1)
+
+        if len(self.sexes) != len(self.alleles):
+            exit("Error creating population: need exactly one sex per individual.")
+
+        if alleleCounts is None:
+            alleleCounts = np.bincount(self.alleles.ravel(), minlength=3)
+            if len(alleleCounts) != 3:
+                exit("Sorry, individuals can have only alleles 0, 1, or 2.")
+        self.alleleCounts = np.asarray(alleleCounts, dtype=np.int64)
+        self.genotypeCounts = genotypeCounts # worked out when first needed
+
+    @staticmethod
+    def countGenotypes(alleles):
+        """
+            Param alleles: an (N, 2) array of alleles
+            Return: a 2-tuple of ( the genotype counts (see getGenotypeCounts()),
+                    the allele counts ), both found in a single pass
+        """
+        genotypes = 3*alleles[:, 0].astype(np.intp) + alleles[:, 1]
+        genotypeCounts = np.bincount(genotypes, minlength=9)
+        if len(genotypeCounts) != 9:
+            exit("Sorry, individuals can have only alleles 0, 1, or 2.")
+        table = genotypeCounts.reshape(3, 3)
+        return genotypeCounts, table.sum(axis=1) + table.sum(axis=0)
+
+    @classmethod
+    def fromFrequencies(cls, populationSize, frequencies, rng=None):
+        """
+            Builds a randomly arranged population with the given starting
+            allele frequencies. Uses the same rounding as the Species
+            constructor: allele i gets round(2N * frequencies[i]) copies, and
+            any surplus from rounding is discarded at random.
+
+            Params:
+                populationSize: the number of individuals
+                frequencies: a 3-tuple of allele frequencies
+                rng: a numpy.random.Generator (a fresh one is used if None)
+            Return: a new Population
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        allelesInPop = 2*populationSize # diploids; 2 alleles per individual
+        counts = [ int(round(allelesInPop*freq)) for freq in frequencies ]
+        if sum(counts) < allelesInPop:
+            exit( "Sorry, starting frequencies don't produce enough alleles for "
+                  + str(populationSize) + " individuals." )
+
+        pool = np.repeat(np.arange(3, dtype=np.uint8), counts)
+        rng.shuffle(pool) # randomize the alleles
+        # Rounding may leave an extra allele or two; like the Species
+        # constructor, we simply leave out the surplus (random) ones
+        pool = pool[:allelesInPop]
+        sexes = rng.integers(0, 2, size=populationSize).astype(bool)
+        return cls(pool.reshape(populationSize, 2), sexes)
+
+    @classmethod
+    def fromIndividuals(cls, individuals):
+        """
+            Param individuals: a list of Individuals
+            Return: the equivalent Population
+        """
+        alleles = np.array([ individual.getAlleles() for individual in individuals ],
+                           dtype=np.uint8).reshape(-1, 2)
+        sexes = np.array([ individual.getSex() == Sex.F for individual in individuals ],
+                         dtype=bool)
+        return cls(alleles, sexes)
+
+    def toIndividuals(self):
+        """
+            Return: a list of Individuals equivalent to this population (in the
+                    same order)
+        """
+        sexes = np.where(self.sexes, Sex.F, Sex.M).tolist()
+        return [ Individual(tuple(alleles), sex)
+                 for alleles, sex in zip(self.alleles.tolist(), sexes) ]
+
+    def toPackedIndividuals(self):
+        """
+            Return: a list of PackedIndividuals equivalent to this population
+                    (in the same order)
+        """
+        genotypes = ( 3*self.alleles[:, 0].astype(np.int64) + self.alleles[:, 1] ).tolist()
+        sexes = np.where(self.sexes, Sex.F, Sex.M).tolist()
+        return [ PackedIndividual(genotype, sex)
+                 for genotype, sex in zip(genotypes, sexes) ]
+
+    def __len__(self):
+        return len(self.sexes)
+
+    def getAlleleCounts(self):
+        """
+            Return: a 3-tuple with the number of copies of alleles 0, 1 and 2
+        """
+        return tuple(int(count) for count in self.alleleCounts)
+
+    def getAlleleFrequencies(self):
+        """
+            Return: a 3-tuple representing the frequencies of each of the three
+                    alleles
+        """
+        totalAlleles = 2*len(self)
+        return tuple(int(count)/totalAlleles for count in self.alleleCounts)
+
+    def getGenotypeCounts(self):
+        """
+            Return: a length-9 array whose element 3*i + j is the number of
+                    individuals with alleles (i, j)
+        """
+        if self.genotypeCounts is None:
+            self.genotypeCounts = Population.countGenotypes(self.alleles)[0]
+        return self.genotypeCounts
+
+    def getHeterozygosity(self):
+        """
+            Return: the fraction of individuals that are heterozygotes
+        """
+        genotypeCounts = self.getGenotypeCounts()
+        homozygotes = int(genotypeCounts[0] + genotypeCounts[4] + genotypeCounts[8])
+        return 1 - homozygotes/len(self)
+
+    def countSexes(self):
+        """
+            Return: a 2-tuple (number of males, number of females)
+        """
+        numFemales = int(np.count_nonzero(self.sexes))
+        return ( len(self) - numFemales, numFemales )
+
+    def nbytes(self):
+        """
+            Return: the memory (in bytes) used by the population arrays
+        """
+        return self.alleles.nbytes + self.sexes.nbytes + self.alleleCounts.nbytes
@@ -0,0 +1,167 @@
+"""
+    Optional instrumentation of the simulators.
+
+    A Profiler times the phases of each generation (e.g. partitioning the
+    parents by sex, producing the children, trimming the surplus, updating the
+    species) and counts what happened in them (children created, children
+    discarded while trimming, litters drawn). The simulators call it at the end
+    of each phase:
+        profiler.startGeneration()
+        ...                        # partition the parents
+        profiler.lap("partition")
+        ...                        # produce the children
+        profiler.lap("reproduce")
+        profiler.count("children", len(childPopulation))
+        profiler.endGeneration()
+
+    When profiling is off, the simulators use NULL_PROFILER, whose methods do
+    nothing, so the cost is a few empty method calls per generation.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import json
+import time
+from team_2_statistics import RunningSummary
+
+
+class Profiler:
+    """
+        Per-phase timers and counters for one or more simulations.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self):
+        self.phaseSeconds = {}   # phase name -> total seconds
+        self.counters = {}       # counter name -> total
+        self.numGenerations = 0
+        self.numRuns = 0
+        self.generationSeconds = RunningSummary()
+        self.lastTime = None
+        self.generationStart = None
+
+    def startGeneration(self):
+        """
+            Call at the start of each generation.
+        """
+        self.lastTime = self.generationStart = time.perf_counter()
+
+    def lap(self, phase):
+        """
+            Adds the time since the last lap (or the start of the generation)
+            to a phase.
+
+            Param phase: the name of the phase that just ended
+        """
+        now = time.perf_counter()
+        self.phaseSeconds[phase] = self.phaseSeconds.get(phase, 0.0) \
+                                   + (now - self.lastTime)
+        self.lastTime = now
+
+    def count(self, counter, amount=1):
+        """
+            Adds to a counter.
+
+            Params:
+                counter: the counter's name
+                amount: how much to add
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + int(amount)
+
+    def endGeneration(self):
+        """
+            Call at the end of each generation.
+        """
+        self.generationSeconds.add( time.perf_counter() - self.generationStart )
+        self.numGenerations += 1
+
+    def endRun(self):
+        """
+            Call once a simulation is over.
+        """
+        self.numRuns += 1
+
+    def isEnabled(self):
+        """
+            Return: true (this profiler actually records something)
+        """
+        return True
+
+    def merge(self, other):
+        """
+            Adds another profiler's totals into this one (e.g. to combine the
+            profiles of many simulations).
+
+            Param other: a Profiler
+        """
+        for phase, seconds in other.phaseSeconds.items():
+            self.phaseSeconds[phase] = self.phaseSeconds.get(phase, 0.0) + seconds
+        for counter, amount in other.counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+        self.numGenerations += other.numGenerations
+        self.numRuns += other.numRuns
+        self.generationSeconds.merge( other.generationSeconds )
+
+    def toDict(self):
+        """
+            Return: the profile as a dictionary that can be saved as JSON
+        """
+        perGeneration = max(self.numGenerations, 1)
+        return { "runs": self.numRuns,
+                 "generations": self.numGenerations,
+                 "phaseSeconds": dict(self.phaseSeconds),
+                 "phaseSecondsPerGeneration":
+                     { phase: seconds / perGeneration
+                       for phase, seconds in self.phaseSeconds.items() },
+                 "counters": dict(self.counters),
+                 "countersPerGeneration":
+                     { counter: amount / perGeneration
+                       for counter, amount in self.counters.items() },
+                 "generationSeconds": self.generationSeconds.toDict() }
+
+
+class NullProfiler:
+    """
+        A stand-in for Profiler that records nothing, used when profiling is
+        off.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def startGeneration(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+    def endGeneration(self):
+        pass
+
+    def endRun(self):
+        pass
+
+    def isEnabled(self):
+        return False
+
+
+# The profiler the simulators use when they aren't given one
+NULL_PROFILER = NullProfiler()
+
+
+def writeMetrics( path, total, runs ):
+    """
+        Writes the profiles of a batch of simulations as JSON.
+
+        Params:
+            path: the file to write
+            total: a Profiler with the totals over all the simulations
+            runs: a list of the Profilers of the individual simulations
+    """
+    with open( path, "w" ) as metricsFile:
+        json.dump( { "total": total.toDict(),
+                     "runs": [ run.toDict() for run in runs ] },
+                   metricsFile, indent=1 )
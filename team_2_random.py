@@ -0,0 +1,97 @@
+"""
+    Random number generation for the drift simulator.
+
+    Every part of the simulator that needs randomness takes an explicit
+    DriftRandom object rather than using the global random module, so that any
+    run can be reproduced from its seed, and so that parallel or batched runs
+    each get their own independent stream.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import numpy as np
+import random
+
+
+def newSeed():
+    """
+        Return: a fresh, unpredictable seed (an integer)
+    """
+    return int( np.random.SeedSequence().entropy )
+
+
+def replicateSeed( seed, replicate ):
+    """
+        Derives the seed for a single replicate from the seed of the whole batch.
+        Each replicate gets its own statistically independent stream, and the
+        seed for replicate i depends only on (seed, i), so any replicate can be
+        re-run on its own.
+
+        Params:
+            seed: the batch's seed (an integer)
+            replicate: the replicate's number (0, 1, 2, ...)
+        Return: an integer seed
+    """
+    sequence = np.random.SeedSequence( seed, spawn_key=(replicate,) )
+    return int( sequence.generate_state(1, dtype=np.uint64)[0] )
+
+
+class DriftRandom(random.Random):
+    """
+        A seedable random number generator for the simulator.
+
+        This is a random.Random (so it has choice(), shuffle(), uniform(), etc.,
+        which the per-individual code uses) paired with a numpy.random.Generator
+        (available as .generator, for the array-based code). Both are seeded
+        from the same integer seed.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, seed=None):
+        """
+            Param seed: an integer seed. If None, a fresh random seed is chosen
+                        (and remembered; see getSeed()).
+        """
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        """
+            Re-seeds both generators.
+
+            Param a: an integer seed, or None for a fresh random seed
+        """
+        if a is None:
+            a = newSeed()
+        self.initialSeed = int(a)
+        super().seed(self.initialSeed, version)
+        self.generator = np.random.default_rng(self.initialSeed)
+
+    def getSeed(self):
+        """
+            Return: the seed this generator was (last) seeded with
+        """
+        return self.initialSeed
+
+    def spawn(self, replicate):
+        """
+            Param replicate: the replicate's number (0, 1, 2, ...)
+            Return: a new, independent DriftRandom for that replicate (see
+                    replicateSeed())
+        """
+        return DriftRandom( replicateSeed(self.initialSeed, replicate) )
+
+    def getstate(self):
+        """
+            Return: the complete state of both generators
+        """
+        return ( self.initialSeed, super().getstate(),
+                 self.generator.bit_generator.state )
+
+    def setstate(self, state):
+        """
+            Param state: a state returned by getstate()
+        """
+        self.initialSeed, randomState, generatorState = state
+        super().setstate(randomState)
+        self.generator.bit_generator.state = generatorState
@@ -0,0 +1,240 @@
+"""
+    Recording policies: which generations of a simulation are kept.
+
+    By default, the simulators keep the allele frequencies of every generation.
+    For long runs (tens of thousands of generations to fixation in a large
+    population), that is mostly wasted memory and disk. A Recorder is handed
+    every generation's frequencies as the simulation goes, keeps only those its
+    policy asks for (along with their generation numbers), and independently
+    keeps track of the fixation and loss events, so that the statistics are the
+    same whatever the policy.
+
+    The policies:
+        "all":     every generation
+        "every":   every interval-th generation
+        "log":     logarithmically spaced generations (pointsPerDecade of them
+                   for every factor of 10)
+        "change":  each generation in which some allele's frequency has moved by
+                   more than threshold since the last one kept
+        "events":  only the generations in which an allele was lost or fixed
+        "summary": nothing (just the events and the final frequencies)
+    Except for "summary", the first and the final generations are always kept.
+
+    Alongside the frequencies, each kept generation has its heterozygosity (the
+    fraction of individuals that are heterozygotes), or NaN if the engine
+    doesn't know it.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import math
+import numpy as np
+
+# The recording policies a Recorder knows
+POLICIES = [ "all", "every", "log", "change", "events", "summary" ]
+
+
+class Recorder:
+    """
+        Keeps the generations of a single simulation picked out by a recording
+        policy (see the top of this file), along with the simulation's fixation
+        and loss events.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, policy="all", interval=10, pointsPerDecade=10,
+                 threshold=0.01):
+        """
+            Params:
+                policy: one of POLICIES
+                interval: the spacing of the generations kept by "every"
+                pointsPerDecade: how many generations "log" keeps for every
+                                 factor of 10
+                threshold: how far an allele's frequency has to move for
+                           "change" to keep a generation
+        """
+        if policy not in POLICIES:
+            exit("Sorry, the recording policy must be one of "
+                 + ", ".join(POLICIES) + ".")
+        if policy == "every" and interval < 1:
+            exit("Sorry, the recording interval must be at least 1.")
+        if policy == "log" and pointsPerDecade <= 0:
+            exit("Sorry, the number of points per decade must be positive.")
+
+        self.policy = policy
+        self.interval = int(interval)
+        self.pointsPerDecade = pointsPerDecade
+        self.threshold = threshold
+
+        self.generations = []
+        self.frequencies = []
+        self.heterozygosities = []
+        self.lastGeneration = -1
+        self.lastFrequencies = None
+        self.lastHeterozygosity = math.nan
+        self.fixationGeneration = -1
+        self.fixedAllele = -1
+        self.losses = [-1] * 3
+        self.nextLogGeneration = 1
+        # The Profiler of the simulation, if it was profiled (see
+        # team_2_profiling.py); set by the runner
+        self.profile = None
+
+    def record(self, generation, frequencies, heterozygosity=math.nan):
+        """
+            Hands the recorder the next generation's frequencies. Must be called
+            for every generation, in order, starting from generation 0 (or, for
+            an engine that leaps over generations, for each one it leaps to).
+
+            Params:
+                generation: the generation's number
+                frequencies: a 3-tuple of allele frequencies
+                heterozygosity: the fraction of heterozygotes (if known)
+        """
+        event = False
+        for allele in range(3):
+            if self.losses[allele] == -1 and frequencies[allele] == 0.0:
+                self.losses[allele] = generation
+                event = True
+        if self.fixationGeneration == -1 and 1.0 in frequencies:
+            self.fixationGeneration = generation
+            self.fixedAllele = list(frequencies).index(1.0)
+            event = True
+
+        if self.wants( generation, frequencies, event ):
+            self.generations.append( generation )
+            self.frequencies.append( tuple(frequencies) )
+            self.heterozygosities.append( heterozygosity )
+
+        self.lastGeneration = generation
+        self.lastFrequencies = tuple(frequencies)
+        self.lastHeterozygosity = heterozygosity
+
+    def wants(self, generation, frequencies, event):
+        """
+            Return: true if the policy keeps this generation
+        """
+        if self.policy == "all":
+            return True
+        if self.policy == "summary":
+            return False
+        if generation == 0:
+            return True
+
+        if self.policy == "every":
+            # (A leap may jump over a multiple of the interval)
+            return generation // self.interval > self.generations[-1] // self.interval
+        elif self.policy == "log":
+            if generation < self.nextLogGeneration:
+                return False
+            self.nextLogGeneration = max( generation + 1, int(math.ceil(
+                self.nextLogGeneration * 10**(1 / self.pointsPerDecade) )) )
+            return True
+        elif self.policy == "change":
+            previous = self.frequencies[-1]
+            return max( abs(frequency - before) for frequency, before
+                        in zip(frequencies, previous) ) > self.threshold
+        else: # "events"
+            return event
+
+    def finish(self):
+        """
+            Call once the simulation is over: makes sure the final generation is
+            kept (unless the policy is "summary").
+        """
+        if ( self.policy != "summary" and self.lastGeneration >= 0
+             and ( len(self.generations) == 0
+                   or self.generations[-1] != self.lastGeneration ) ):
+            self.generations.append( self.lastGeneration )
+            self.frequencies.append( self.lastFrequencies )
+            self.heterozygosities.append( self.lastHeterozygosity )
+
+    def getGenerations(self):
+        """
+            Return: the list of the generation numbers kept
+        """
+        return self.generations
+
+    def getFrequencies(self):
+        """
+            Return: the list of the 3-tuples of frequencies kept (one per entry
+                    in getGenerations())
+        """
+        return self.frequencies
+
+    def getHeterozygosities(self):
+        """
+            Return: the list of the heterozygosities kept (one per entry in
+                    getGenerations())
+        """
+        return self.heterozygosities
+
+    def getRows(self):
+        """
+            Return: a list with, for each generation kept, its frequencies and
+                    heterozygosity as a 4-tuple (see TRAJECTORY_COLUMNS in
+                    team_2_trajectories.py)
+        """
+        return [ frequencies + (heterozygosity,) for frequencies, heterozygosity
+                 in zip(self.frequencies, self.heterozygosities) ]
+
+    def getFinalFrequencies(self):
+        """
+            Return: the frequencies in the last generation simulated
+        """
+        return self.lastFrequencies
+
+    def getNumGenerations(self):
+        """
+            Return: the number of generations simulated (not counting the
+                    starting generation)
+        """
+        return self.lastGeneration
+
+    def getEvents(self):
+        """
+            Return: the simulation's events, in the form returned by runEvents()
+                    in team_2_statistics.py
+        """
+        return ( self.fixationGeneration, self.fixedAllele, tuple(self.losses) )
+
+    def toDict(self):
+        """
+            Return: the recorder's state, apart from the generations it has kept
+                    (see toArrays()), as a dictionary that can be saved as JSON
+        """
+        state = dict( vars(self) )
+        del state["profile"]
+        del state["generations"], state["frequencies"], state["heterozygosities"]
+        if self.lastFrequencies is not None:
+            state["lastFrequencies"] = list(self.lastFrequencies)
+        return state
+
+    def toArrays(self):
+        """
+            Return: a dictionary of NumPy arrays holding the generations kept
+                    so far: "generations", "frequencies" (a row per generation)
+                    and "heterozygosities"
+        """
+        return { "generations": np.asarray( self.generations, dtype=np.int64 ),
+                 "frequencies": np.asarray( self.frequencies,
+                                            dtype=np.float64 ).reshape(-1, 3),
+                 "heterozygosities": np.asarray( self.heterozygosities,
+                                                 dtype=np.float64 ) }
+
+    @classmethod
+    def fromDict(cls, state, arrays):
+        """
+            Return: the Recorder whose state was saved by toDict() and
+                    toArrays()
+        """
+        recorder = cls( state["policy"], state["interval"],
+                        state["pointsPerDecade"], state["threshold"] )
+        recorder.__dict__.update( state )
+        recorder.generations = arrays["generations"].tolist()
+        recorder.frequencies = [ tuple(row) for row in arrays["frequencies"].tolist() ]
+        recorder.heterozygosities = arrays["heterozygosities"].tolist()
+        if state["lastFrequencies"] is not None:
+            recorder.lastFrequencies = tuple(state["lastFrequencies"])
+        return recorder
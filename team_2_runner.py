@@ -0,0 +1,311 @@
+"""
+    Runs many independent replicates of the drift simulation, optionally spread
+    over several processes.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+from team_2_species import Species
+from team_2_simulator import simulateDrift, resumeDrift
+from team_2_wright_fisher import simulateDriftWrightFisher
+from team_2_leap import simulateDriftLeapFromFrequencies
+from team_2_batched import simulateDriftBatched
+from team_2_recording import Recorder
+from team_2_profiling import Profiler
+from team_2_random import DriftRandom, newSeed, replicateSeed
+import team_2_settings
+
+# The settings that decide what a replicate simulates, and so which checkpoints
+# it can be carried on from
+CHECKPOINT_SETTINGS = [ "popSize", "startingFrequencies", "probOfLitterSize",
+                        "compactPopulation", "engine", "fixedNumberOfGenerations",
+                        "reduceAfterLoss" ]
+
+def currentSettings():
+    """
+        Return: a dictionary of the simulation parameters in team_2_settings.py,
+                suitable for passing to runReplicate() and iterReplicates()
+    """
+    return { "popSize": team_2_settings.popSize,
+             "startingFrequencies": tuple(team_2_settings.startingFrequencies),
+             "probOfLitterSize": dict(team_2_settings.probOfLitterSize),
+             "name": team_2_settings.name,
+             "numberOfRuns": team_2_settings.numberOfRuns,
+             "compactPopulation": team_2_settings.compactPopulation,
+             "engine": team_2_settings.engine,
+             "leapTolerance": team_2_settings.leapTolerance,
+             "fixedNumberOfGenerations": team_2_settings.fixedNumberOfGenerations,
+             "seed": team_2_settings.seed,
+             "reduceAfterLoss": team_2_settings.reduceAfterLoss,
+             "batchSize": team_2_settings.batchSize,
+             "recordingPolicy": team_2_settings.recordingPolicy,
+             "recordingInterval": team_2_settings.recordingInterval,
+             "recordingPointsPerDecade": team_2_settings.recordingPointsPerDecade,
+             "recordingThreshold": team_2_settings.recordingThreshold,
+             "profile": team_2_settings.profile,
+             "checkpointEvery": team_2_settings.checkpointEvery,
+             "checkpointDir": team_2_settings.checkpointDir,
+             "adaptiveRuns": team_2_settings.adaptiveRuns,
+             "targetMeanHalfWidth": team_2_settings.targetMeanHalfWidth,
+             "targetProbabilityHalfWidth": team_2_settings.targetProbabilityHalfWidth,
+             "confidenceLevel": team_2_settings.confidenceLevel,
+             "adaptiveBatchRuns": team_2_settings.adaptiveBatchRuns,
+             "maxNumberOfRuns": team_2_settings.maxNumberOfRuns }
+
+
+def makeRecorder( settings ):
+    """
+        Return: a new Recorder with the recording policy in the settings
+    """
+    return Recorder( settings["recordingPolicy"], settings["recordingInterval"],
+                     settings["recordingPointsPerDecade"],
+                     settings["recordingThreshold"] )
+
+
+def checkpointPath( settings, replicate, seed ):
+    """
+        Return: the file a replicate's checkpoints are saved to. Its name
+                includes a hash of the CHECKPOINT_SETTINGS, so that a replicate
+                is never carried on from the checkpoint of a simulation with
+                other settings (e.g. another point of a sweep with the same
+                seed).
+    """
+    key = { name: settings[name] for name in CHECKPOINT_SETTINGS }
+    key["probOfLitterSize"] = sorted( key["probOfLitterSize"].items() )
+    text = json.dumps( key, sort_keys=True, separators=(",", ":") )
+    digest = hashlib.sha256( text.encode("utf-8") ).hexdigest()[:16]
+    return os.path.join( settings["checkpointDir"],
+                         "seed" + str(seed) + "_replicate" + str(replicate)
+                         + "_" + digest + ".npz" )
+
+
+def runReplicate( settings, replicate, seed ):
+    """
+        Runs a single simulation. Since each replicate's random numbers depend
+        only on (seed, replicate), this reproduces exactly the same run as
+        replicate number `replicate` of iterReplicates() with the same seed.
+
+        If checkpointing is on (see checkpointEvery in team_2_settings.py) and
+        an earlier attempt at this replicate left a checkpoint behind, the
+        replicate carries on from there instead of starting over. The
+        checkpoint is deleted once the replicate is finished.
+
+        Params:
+            settings: the simulation parameters, as returned by currentSettings()
+            replicate: the replicate's number
+            seed: the batch's seed (see replicateSeed())
+        Return: the Recorder (see team_2_recording.py) holding the replicate's
+                frequencies over time and events (and, if profiling is on, its
+                Profiler as .profile)
+    """
+    wrightFisher = settings["engine"] == "wrightfisher"
+    # The allele-count engines are never checkpointed
+    checkpointEvery = settings["checkpointEvery"]
+    if settings["engine"] in [ "wrightfisher", "leap" ]:
+        checkpointEvery = 0
+    profiler = Profiler() if settings["profile"] else None
+    path = None
+    if checkpointEvery > 0:
+        path = checkpointPath( settings, replicate, seed )
+        if os.path.exists( path ):
+            recorder = resumeDrift( path, checkpointEvery, profiler )
+            recorder.profile = profiler
+            os.remove( path )
+            return recorder
+
+    rng = DriftRandom( replicateSeed(seed, replicate) )
+    fixedNumberOfGenerations = settings["fixedNumberOfGenerations"]
+    if settings["engine"] == "leap":
+        # The leap engine doesn't even need the first generation's individuals
+        recorder = simulateDriftLeapFromFrequencies(
+            settings["popSize"], settings["startingFrequencies"],
+            settings["probOfLitterSize"], bool(fixedNumberOfGenerations > 0),
+            fixedNumberOfGenerations, rng, makeRecorder(settings), profiler,
+            settings["leapTolerance"] )
+        recorder.profile = profiler
+        return recorder
+
+    # The Wright-Fisher engine never looks at individuals, so there's no point
+    # building a list of them
+    theSpecies = Species( settings["popSize"], settings["startingFrequencies"],
+                          settings["probOfLitterSize"], settings["name"],
+                          settings["compactPopulation"] or wrightFisher, rng )
+    if wrightFisher:
+        recorder = simulateDriftWrightFisher( theSpecies,
+                                              bool(fixedNumberOfGenerations > 0),
+                                              fixedNumberOfGenerations, rng,
+                                              makeRecorder(settings), profiler )
+    else:
+        recorder = simulateDrift( theSpecies,
+                                  bool(fixedNumberOfGenerations > 0),
+                                  fixedNumberOfGenerations,
+                                  settings["engine"], rng,
+                                  settings["reduceAfterLoss"],
+                                  path, checkpointEvery, makeRecorder(settings),
+                                  profiler )
+    if path is not None and os.path.exists( path ):
+        os.remove( path )
+    recorder.profile = profiler
+    return recorder
+
+
+def runBatch( settings, firstReplicate, numReplicates, seed ):
+    """
+        Runs a batch of replicates together with the "batched" engine (see
+        team_2_batched.py). The batch's random numbers depend only on (seed,
+        firstReplicate), so the same batch can always be re-run on its own.
+
+        Params:
+            settings: the simulation parameters, as returned by currentSettings()
+            firstReplicate: the number of the batch's first replicate
+            numReplicates: the number of replicates in the batch
+            seed: the seed of the whole set of batches (see replicateSeed())
+        Return: a list of the replicates' Recorders. If profiling is on, the
+                Profiler of the whole batch is attached to the first one (as
+                .profile).
+    """
+    rng = DriftRandom( replicateSeed(seed, firstReplicate) )
+    theSpecies = Species( settings["popSize"], settings["startingFrequencies"],
+                          settings["probOfLitterSize"], settings["name"],
+                          True, rng )
+    fixedNumberOfGenerations = settings["fixedNumberOfGenerations"]
+    profiler = Profiler() if settings["profile"] else None
+    recorders = simulateDriftBatched( theSpecies, numReplicates,
+                                      bool(fixedNumberOfGenerations > 0),
+                                      fixedNumberOfGenerations, rng,
+                                      [ makeRecorder(settings)
+                                        for replicate in range(numReplicates) ],
+                                      profiler )
+    recorders[0].profile = profiler
+    return recorders
+
+
+def _runReplicateWithArgs( args ):
+    """
+        Private to iterReplicates(): unpacks the arguments for runReplicate()
+    """
+    return runReplicate( *args )
+
+
+def _runBatchWithArgs( args ):
+    """
+        Private to iterReplicates(): unpacks the arguments for runBatch()
+    """
+    return runBatch( *args )
+
+
+def iterReplicates( settings, numRuns, numWorkers=1, seed=None, firstReplicate=0 ):
+    """
+        Runs a batch of replicates, yielding each one's Recorder (holding its
+        frequencies over time and events; see team_2_recording.py).
+        Results always come back in replicate order, no matter how many workers
+        there are.
+
+        Params:
+            settings: the simulation parameters, as returned by currentSettings()
+            numRuns: the number of replicates to run
+            numWorkers: the number of processes to use. With 1, everything runs
+                        in this process.
+            seed: the batch's seed. If None, a random one is chosen.
+            firstReplicate: the number of the first replicate (so that a batch
+                            can be continued later with the same seed)
+    """
+    if seed is None:
+        seed = newSeed()
+
+    if settings["engine"] == "batched":
+        # Batches always start at multiples of batchSize (counting from
+        # firstReplicate), so the results don't depend on numWorkers
+        batchSize = max(1, settings["batchSize"])
+        lastReplicate = firstReplicate + numRuns
+        jobs = [ (settings, first, min(batchSize, lastReplicate - first), seed)
+                 for first in range(firstReplicate, lastReplicate, batchSize) ]
+        runJob = _runBatchWithArgs
+        chunkSize = 1
+    else:
+        jobs = ( (settings, replicate, seed)
+                 for replicate in range(firstReplicate, firstReplicate + numRuns) )
+        runJob = _runReplicateWithArgs
+        # Hand out replicates a few at a time, so that small, fast replicates
+        # don't spend all their time in inter-process communication
+        chunkSize = max(1, numRuns // (4*numWorkers))
+
+    if numWorkers <= 1:
+        results = map( runJob, jobs )
+    else:
+        pool = ProcessPoolExecutor(max_workers=numWorkers)
+        results = pool.map( runJob, jobs, chunksize=chunkSize )
+
+    try:
+        for result in results:
+            if runJob == _runBatchWithArgs:
+                for recorder in result:
+                    yield recorder
+            else:
+                yield result
+    finally:
+        if numWorkers > 1:
+            pool.shutdown()
+
+
+def isPreciseEnough( statistics, settings ):
+    """
+        Params:
+            statistics: the FixationStatistics of the replicates so far
+            settings: the simulation parameters, as returned by currentSettings()
+        Return: true if the confidence intervals of the mean generations to
+                fixation and of each allele's fixation probability are within
+                the targets in the settings (a target of None is always met)
+    """
+    confidence = settings["confidenceLevel"]
+    if settings["targetMeanHalfWidth"] is not None:
+        halfWidth = statistics.getMeanHalfWidth( confidence )
+        if halfWidth is None or halfWidth > settings["targetMeanHalfWidth"]:
+            return False
+    if settings["targetProbabilityHalfWidth"] is not None:
+        halfWidths = statistics.getFixationProbabilityHalfWidths( confidence )
+        if halfWidths is None or max(halfWidths) > settings["targetProbabilityHalfWidth"]:
+            return False
+    return True
+
+
+def iterAdaptiveReplicates( settings, statistics, numWorkers=1, seed=None ):
+    """
+        Runs replicates until the statistics are precise enough (see
+        isPreciseEnough()): first numberOfRuns of them, then adaptiveBatchRuns
+        at a time, up to maxNumberOfRuns in all. Yields each one's Recorder, as
+        iterReplicates() does; replicate i is the same run it would be in
+        iterReplicates() with the same seed (except with the "batched" engine,
+        whose batches are laid out differently).
+
+        The caller must add each replicate to statistics (with addEvents())
+        before asking for the next one, since that is what decides when to
+        stop.
+
+        Params:
+            settings: the simulation parameters, as returned by currentSettings()
+            statistics: the FixationStatistics the caller keeps
+            numWorkers: the number of processes to use
+            seed: the seed of all the replicates. If None, a random one is
+                  chosen.
+    """
+    if seed is None:
+        seed = newSeed()
+    if settings["adaptiveBatchRuns"] < 1:
+        exit("Sorry, adaptiveBatchRuns must be at least 1.")
+
+    numRuns = 0
+    batchRuns = min( settings["numberOfRuns"], settings["maxNumberOfRuns"] )
+    while batchRuns > 0:
+        for recorder in iterReplicates( settings, batchRuns, numWorkers, seed,
+                                        numRuns ):
+            yield recorder
+        numRuns += batchRuns
+        if isPreciseEnough( statistics, settings ):
+            return
+        batchRuns = min( settings["adaptiveBatchRuns"],
+                         settings["maxNumberOfRuns"] - numRuns )
@@ -35,6 +35,134 @@ name = "T. rex"
 # many times)
 numberOfRuns = 100
 
+# Instead of a fixed number of samples, we can keep going until the results are
+# precise enough. If adaptiveRuns is True, numberOfRuns simulations are run
+# first, then adaptiveBatchRuns more at a time, until the confidence intervals
+# (at confidenceLevel) of the mean generations to fixation and of each allele's
+# probability of becoming fixed are no wider than
+#   mean +/- targetMeanHalfWidth generations, and
+#   probability +/- targetProbabilityHalfWidth,
+# or maxNumberOfRuns simulations have been run. Set a target to None to ignore
+# it.
+adaptiveRuns = False
+targetMeanHalfWidth = 10.0
+targetProbabilityHalfWidth = 0.03
+confidenceLevel = 0.95
+adaptiveBatchRuns = 100
+maxNumberOfRuns = 10000
+
+# The number of processes to run simulations in. Each simulation is
+# independent, so on a machine with many cores you can set this as high as the
+# number of cores. With 1, everything runs in a single process.
+numberOfWorkers = 1
+
+# The seed for the random number generator. Two batches with the same seed and
+# settings produce exactly the same results, and any single simulation can be
+# re-run on its own (see runReplicate() in team_2_runner.py). Leave it at None
+# to use a different random seed every time (the seed chosen is printed with
+# the statistics).
+seed = None
+
+# If True, once one allele has been lost (so that only two are left), the rest
+# of each simulation uses the much cheaper Wright-Fisher approximation (see
+# team_2_wright_fisher.py) instead of simulating individuals. Only matters for
+# the "individual" and "vectorized" engines.
+reduceAfterLoss = False
+
+# Which generations of each simulation to keep (see team_2_recording.py):
+#   "all":     every generation
+#   "every":   every recordingInterval-th generation
+#   "log":     recordingPointsPerDecade generations for every factor of 10
+#              (e.g. 0, 1, 2, 3, 4, 6, 8, 11, 14, 18, 23, ...)
+#   "change":  only when an allele's frequency has moved by more than
+#              recordingThreshold since the last generation kept
+#   "events":  only the generations in which an allele was lost or fixed
+#   "summary": nothing but the events (no frequencies over time are saved)
+# The first and last generations are always kept (except for "summary"), and
+# the statistics are the same whichever you choose. Each generation kept is
+# saved with its heterozygosity (the fraction of individuals that are
+# heterozygotes) as a fourth column; it's "nan" for the "wrightfisher" and
+# "leap" engines and once reduceAfterLoss has taken over, since they don't
+# track individuals. (The "leap" engine only has the generations it leaps to.)
+recordingPolicy = "all"
+recordingInterval = 10
+recordingPointsPerDecade = 10
+recordingThreshold = 0.01
+
+# How to save each simulation's frequencies over time:
+#   "binary": all simulations in a single compressed file,
+#             output/trajectories.bin (see team_2_trajectories.py)
+#   "tsv":    one text file per simulation, output/frequency_over_time<N>.tsv,
+#             as read by the Gnuplot scripts
+#   "both":   both of the above
+# You can always export some simulations from the binary file as text later:
+#   $ python3 team_2_trajectories.py output/trajectories.bin output 0-9
+outputFormat = "binary"
+
+# If True, once the simulations are done, draw overview plots of the whole
+# batch in output/plots: each allele's frequency percentiles over time, a
+# histogram of the generations to fixation, and how often each allele was fixed
+# (see team_2_plot.py; the images need Gnuplot). You can also do this later:
+#   $ python3 team_2_plot.py
+plotOverview = False
+
+# The output of each simulation is written on a background thread while the
+# next ones run. Up to outputQueueSize finished simulations can wait to be
+# written (after that, the simulations wait for the disk); 0 writes each one
+# straight away instead.
+outputQueueSize = 64
+
+# If True, each population is stored as compact NumPy arrays rather than as a
+# list of Individual objects. This uses a small fraction of the memory, and is
+# recommended for population sizes of 100,000 or more.
+compactPopulation = False
+
+# The simulation engine to use. Either:
+#   "individual": the original model, which builds each child as an Individual
+#   "vectorized": the same mating model, computed a whole generation at a time
+#                 with NumPy (much faster, especially for large populations)
+#   "wrightfisher": a Wright-Fisher approximation that tracks only the allele
+#                   counts (see team_2_wright_fisher.py). Each generation takes
+#                   the same time regardless of population size.
+#   "batched": the vectorized model, but simulating batchSize simulations at
+#              once (see team_2_batched.py). By far the fastest choice for many
+#              simulations of a small population. (reduceAfterLoss and
+#              checkpointing don't apply to it.)
+#   "leap": the Wright-Fisher approximation, but leaping over many generations
+#           at a time while every allele is common (see team_2_leap.py). For
+#           populations of millions, whose simulations would otherwise take
+#           millions of generations each.
+engine = "individual"
+
+# How far the "leap" engine lets any allele's frequency move in one leap, as a
+# fraction of its distance from 0 and 1 (one standard deviation). Smaller is
+# more accurate but slower; 0 simulates every generation (as "wrightfisher").
+# Above 0.3 the results are biased (see the top of team_2_leap.py).
+leapTolerance = 0.1
+
+# The number of simulations the "batched" engine runs together. Larger batches
+# have less overhead per simulation but use more memory (about 3 bytes per
+# individual per simulation in the batch).
+batchSize = 1000
+
+# If True, time the phases of every generation (e.g. producing the children,
+# trimming the surplus) and count the children, litters, etc., and save these
+# measurements to output/metrics.json (see team_2_profiling.py). Use this to
+# see which engine and settings suit a species best.
+profile = False
+
+# To survive being interrupted, long simulations can save a checkpoint every
+# checkpointEvery generations (0 turns checkpointing off) in checkpointDir.
+# Re-running the same batch (with the same seed) then carries on each
+# unfinished simulation from its last checkpoint, with exactly the same results
+# as if it had never stopped. The "wrightfisher" and "leap" engines are never
+# checkpointed.
+# Checkpoints are kept apart by the settings they were made with, so changing
+# the settings never carries on the wrong simulation (though it does leave the
+# old checkpoints behind in checkpointDir).
+checkpointEvery = 0
+checkpointDir = "checkpoints"
+
 # If you want to simulate a fixed number of generations, give this a non-zero
 # value. Otherwise, leave it at 0 to run until fixation/extinction.
 fixedNumberOfGenerations = 0
@@ -1,11 +1,11 @@
-import random
-
 class Sex:
     """
         Represents the sex of an individual.
 
         Young, Gibson, Jennings, and Smith
     """
+    __slots__ = ( "sex", )
+
     M = 0
     F = 1
     options = [ M, F ]
@@ -1,9 +1,21 @@
 from team_2_species import Species
 from team_2_sex import Sex
-from team_2_individual import Individual
-import random, math
-
-def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0 ):
+from team_2_individual import PackedIndividual
+from team_2_kernel import simulateGenerationVectorized
+from team_2_random import DriftRandom
+from team_2_wright_fisher import advanceCounts
+from team_2_checkpoint import saveCheckpoint, loadCheckpoint
+from team_2_profiling import NULL_PROFILER
+import numpy as np
+import math
+
+# The engines simulateDrift() knows how to use
+ENGINES = [ "individual", "vectorized" ]
+
+def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0,
+                   engine="individual", rng=None, reduceAfterLoss=False,
+                   checkpointPath=None, checkpointEvery=0, recorder=None,
+                   profiler=None, resumeState=None ):
     """
        Simulates genetic drift of three alleles in a given species.
 
@@ -16,11 +28,41 @@ def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0
                                 number of generations. If false, the simulation will
                                 continue until one allele has become fixed.
            generation: the current generation
+           engine: Either "individual" (the original model, which builds one
+                   Individual at a time) or "vectorized" (the same mating model,
+                   computed for a whole generation at once with NumPy; see
+                   team_2_kernel.py). The vectorized engine is much faster.
+           rng: the DriftRandom to draw all random numbers from (a freshly
+                seeded one is used if None). Two runs from identically seeded
+                generators give identical results.
+           reduceAfterLoss: If true, as soon as one allele has been lost, the
+                rest of the simulation (which is then just a 2-allele process)
+                switches to the much cheaper Wright-Fisher allele-count engine
+                (see team_2_wright_fisher.py). The species' individuals are
+                then left as they were in the generation of the loss.
+           checkpointPath: If given (along with checkpointEvery), the file to
+                save a checkpoint of the simulation to (see team_2_checkpoint.py)
+           checkpointEvery: Save a checkpoint every this many generations (0 to
+                never save one). A checkpointed run can be carried on with
+                resumeDrift(), giving exactly the results it would have had if
+                it had never been interrupted.
+           recorder: If given, a Recorder (see team_2_recording.py) that is
+                handed every generation's frequencies and keeps only those
+                its recording policy asks for, instead of keeping them all.
+                The recorder also gets each generation's heterozygosity (the
+                fraction of heterozygous individuals), except in generations
+                simulated by the reduced engine (see reduceAfterLoss), which
+                doesn't know about individuals.
+           profiler: If given, a Profiler (see team_2_profiling.py) to time the
+                phases of each generation and count the children, litters,
+                etc.
+           resumeState: Private to resumeDrift().
 
 
        Returns: a list of 3-tuples. The 3-tuple at position i represents the
                 frequencies of the three alleles at generation i of the simulation.
                 (Note that this means position 0 contains the starting frequencies.)
+                If a recorder was given, the recorder is returned instead.
     """
 
     def finished( frequencies, generation, endAfterFixedNumGenerations ):
@@ -52,9 +94,13 @@ def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0
 
            The simulation runs as follows:
            - Begin with a parent population, separated into males and females
+             (the children of the last generation were sorted by sex as they
+             were born, so this costs nothing)
            - Randomly select two individuals to reproduce. If
            - Continue selecting individuals to reproduce until we have
              [population size] new individuals in this generation
+           - If the last litter overshot the population size, leave out a
+             random selection of the children (chosen all at once)
            - Calculate and return the allele frequencies in the new generation
 
            Parameter species: The object representing the relevant population of our
@@ -63,65 +109,169 @@ def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0
            Returns: A 3-tuple of the new frequencies for the next generation.
         """
 
-        def randomNumOffspring( probabilityDictionary ):
-            """
-                Private to simulateSingleGeneration().
-
-                Returns an integer, which is the randomly chosen number of offspring
-                in this "litter."
-                Param probabilityDictionary: a dictionary whose keys are numbers of
-                            offspring per litter and values are probabilities. See
-                            documentation in the Species constructor for more info.
-                Return: the randomly chosen number of offspring in this "litter."
-            """
-            while True: # loop until we return
-                # Select a key to "roll the dice" for; if we generate a probability
-                # matching this number's associated probability, we return that
-                # number
-                keyToRollFor = random.choice( list(probabilityDictionary.keys()) )
-                r = random.uniform(0, 1)
-                if r < probabilityDictionary[keyToRollFor]:
-                    return keyToRollFor
-
-
-
         size = species.getPopulationSize()
-
-        parentPop = species.getPopulation()
-        random.shuffle(parentPop) # randomize the population; this is important!!
-
-        # Separate the parents by sex
-        def isMale(x): return x.getSex() == Sex.M
-        daddies = list( filter( isMale, parentPop ) )
-        def isFemale(x): return not isMale(x)
-        mommies = list( filter( isFemale, parentPop ) )
-
+        litterSampler = species.getLitterSizeSampler()
+
+        # The parents, separated by sex. (Since parents are chosen uniformly
+        # at random, the order they're in doesn't matter.)
+        daddies, mommies = species.getSexPartitions()
+        if len(daddies) == 0 or len(mommies) == 0:
+            exit( "Sorry, the population can no longer reproduce (it has "
+                  + str(len(daddies)) + " males and " + str(len(mommies))
+                  + " females)." )
+        profiler.lap("partition")
+
+        # The children, along with their sexes (so that they can be sorted
+        # into the next generation's daddies and mommies as they're born)
         childPopulation = []
+        childSexes = []
+        childDaddies = []
+        childMommies = []
+        genotypeCounts = [0] * 9 # kept up to date as children are born
+        numLitters = 0
         while len(childPopulation) < size:
             # Create a "child" with one allele from two parents
-            dad = random.choice(daddies)
-            mom = random.choice(mommies)
+            dad = rng.choice(daddies)
+            mom = rng.choice(mommies)
 
-            totalOffspring = \
-                randomNumOffspring( species.getProbOfProducingNumOffspring() )
+            totalOffspring = litterSampler.draw( rng )
+            numLitters += 1
             for offspring in range(totalOffspring):
-                childAlleles = [ random.choice(dad.getAlleles()),
-                                 random.choice(mom.getAlleles()) ]
+                childAlleles = [ rng.choice(dad.getAlleles()),
+                                 rng.choice(mom.getAlleles()) ]
                 # Shuffle so that allele0 doesn't always come from dad
-                random.shuffle( childAlleles )
+                rng.shuffle( childAlleles )
 
-                child = Individual( tuple(childAlleles), random.choice(Sex.options))
+                sex = rng.choice(Sex.options)
+                genotype = 3*childAlleles[0] + childAlleles[1]
+                child = PackedIndividual( genotype, sex )
+                genotypeCounts[genotype] += 1
                 childPopulation.append( child )
+                childSexes.append( sex )
+                if sex == Sex.M:
+                    childDaddies.append( child )
+                else:
+                    childMommies.append( child )
 
         # Because the number of offspring produced may be greater than the fixed
         # population size (due to the fact that parents can have more than one child
         # at a time), we'll randomly bring the population size back to the desired
-        # value
-        while len(childPopulation) > size:
-            del childPopulation[ random.choice(range(len(childPopulation))) ]
+        # value. All the children to leave out are picked at once, and the rest
+        # are kept (in birth order) in a single pass.
+        profiler.lap("reproduce")
+        surplus = len(childPopulation) - size
+        profiler.count("litters", numLitters)
+        profiler.count("children", len(childPopulation))
+        profiler.count("childrenDiscarded", surplus)
+        if surplus > 0:
+            leftOut = set( rng.sample( range(len(childPopulation)), surplus ) )
+            survivors = []
+            childDaddies = []
+            childMommies = []
+            for index, child in enumerate(childPopulation):
+                if index in leftOut:
+                    genotypeCounts[child.genotype] -= 1
+                    continue
+                survivors.append( child )
+                if childSexes[index] == Sex.M:
+                    childDaddies.append( child )
+                else:
+                    childMommies.append( child )
+            childPopulation = survivors
+        profiler.lap("trim")
+
+        species.setPackedPopulation( childPopulation, childDaddies, childMommies,
+                                     genotypeCounts )
+        profiler.lap("update")
+
+    def simulateSingleGenerationVectorized( species ):
+        """
+           Private to simulateDrift().
 
-        species.setPopulation( childPopulation )
+           Simulates a single generation with the vectorized kernel. For a
+           non-compact species, the new Individuals are only built once the
+           simulation is over (see below); until then, we just keep the
+           species' frequencies up to date.
+        """
+        nonlocal population
+        population = simulateGenerationVectorized(
+            population, species.getLitterSizeSampler(), rng.generator, profiler )
+        if species.isCompact():
+            species.setPopulationArrays( population )
+        else:
+            species.setAlleleFrequencies( population.getAlleleFrequencies() )
+        profiler.lap("update")
 
+    def simulateSingleGenerationReduced( species ):
+        """
+           Private to simulateDrift().
+
+           Simulates a single generation with the Wright-Fisher allele-count
+           engine. Only used once an allele has been lost (see reduceAfterLoss).
+        """
+        nonlocal counts, numMales
+        popSize = species.getPopulationSize()
+        counts = advanceCounts( counts, numMales, popSize,
+                                species.getProbOfProducingNumOffspring(),
+                                rng.generator )
+        # The children become the next parents; each has a random sex
+        numMales = int( rng.generator.binomial(popSize, 0.5) )
+        species.setAlleleFrequencies(
+            tuple( int(count)/(2*popSize) for count in counts ) )
+        profiler.lap("reduced")
+
+    def switchToReducedEngine( species ):
+        """
+           Private to simulateDrift().
+
+           Hands the rest of the simulation over to the allele-count engine.
+        """
+        nonlocal counts, numMales, stepForward
+        if engine == "vectorized":
+            species.setPopulationArrays( population )
+        counts = np.array( species.getAlleleCounts(), dtype=np.int64 )
+        numMales = species.getPopulationArrays().countSexes()[0]
+        stepForward = simulateSingleGenerationReduced
+
+    def checkpoint( species ):
+        """
+           Private to simulateDrift().
+
+           Saves everything needed to carry on the simulation from here.
+        """
+        if engine == "vectorized" and stepForward != simulateSingleGenerationReduced:
+            currentPopulation = population
+        else:
+            currentPopulation = species.getPopulationArrays()
+        metadata = { "popSize": species.getPopulationSize(),
+                     "startingFrequencies": list(startingFrequencies),
+                     "probOfLitterSize":
+                        sorted( species.getProbOfProducingNumOffspring().items() ),
+                     "name": species.getName(),
+                     "compact": species.isCompact(),
+                     "endAfterFixedNumGenerations": endAfterFixedNumGenerations,
+                     "numGenerations": numGenerations,
+                     "engine": engine,
+                     "reduceAfterLoss": reduceAfterLoss,
+                     "checkpointEvery": checkpointEvery,
+                     "currentGen": currentGen,
+                     "reduced": stepForward == simulateSingleGenerationReduced,
+                     "numMales": numMales }
+        saveCheckpoint( checkpointPath, currentPopulation, results, rng, metadata,
+                        counts, recorder )
+
+    def heterozygosity( species ):
+        """
+           Private to simulateDrift().
+
+           Return: the fraction of heterozygotes in the current generation (or
+                   NaN if the reduced engine doesn't know it)
+        """
+        if stepForward == simulateSingleGenerationReduced:
+            return math.nan
+        if engine == "vectorized":
+            return population.getHeterozygosity()
+        return species.getHeterozygosity()
 
 
 
@@ -133,7 +283,9 @@ def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0
     elif endAfterFixedNumGenerations and numGenerations < 0:
         exit("Sorry, number of generations to simulate must be positive.")
 
-    if math.fsum(species.getAlleleFrequencies()) != 1.0:
+    # (A resumed run's frequencies are those of a generation in progress, not
+    # the starting frequencies the user asked for)
+    if resumeState is None and math.fsum(species.getAlleleFrequencies()) != 1.0:
         exit( "Sorry, starting allele frequencies must sum to 1 "\
               + "(yours sum to " + str(sum(species.getAlleleFrequencies())) + ")." )
 
@@ -146,24 +298,128 @@ def simulateDrift( species, endAfterFixedNumGenerations=False, numGenerations=0
     if( len(species.getAlleleFrequencies()) != 3 ):
         exit("Sorry, we require exactly 3 alleles in the population.")
 
+    if engine not in ENGINES:
+        exit("Sorry, the engine must be one of " + ", ".join(ENGINES) + ".")
+
+    if rng is None:
+        rng = DriftRandom()
+
+    if profiler is None:
+        profiler = NULL_PROFILER
+
+    if checkpointEvery < 0:
+        exit("Sorry, the number of generations between checkpoints can't be negative.")
+    elif checkpointEvery > 0 and checkpointPath is None:
+        exit("Sorry, you must give a file to save checkpoints to.")
+
+    startingFrequencies = species.getAlleleFrequencies()
+
+    if engine == "vectorized":
+        population = species.getPopulationArrays()
+        stepForward = simulateSingleGenerationVectorized
+    else:
+        stepForward = simulateSingleGeneration
 
 
-    # Store the initial frequencies
+
+    counts = None
+    numMales = None
+
+    # Store the initial frequencies (in the recorder, if there is one)
     currentGen = 0
     results = []
-    results.append( species.getAlleleFrequencies() )
+    if recorder is None:
+        remember = results.append
+    else:
+        remember = lambda frequencies: recorder.record( currentGen, frequencies,
+                                                        heterozygosity(species) )
+
+    # Or pick up where a checkpointed run left off
+    if resumeState is not None:
+        results, counts, numMales, startingFrequencies, currentGen = resumeState
+        if recorder is None:
+            remember = results.append
+            species.setAlleleFrequencies( results[-1] )
+        else:
+            species.setAlleleFrequencies( recorder.getFinalFrequencies() )
+        if counts is not None:
+            stepForward = simulateSingleGenerationReduced
+    else:
+        remember( species.getAlleleFrequencies() )
 
     # Until our (complex) exit condition is satisfied, simulate a single generation
     while( not finished( species.getAlleleFrequencies(),
                          currentGen, endAfterFixedNumGenerations ) ):
+        profiler.startGeneration()
+
+        # Once an allele has been lost, we're left with a 2-allele process
+        if ( reduceAfterLoss and stepForward != simulateSingleGenerationReduced
+             and 0.0 in species.getAlleleFrequencies() ):
+            switchToReducedEngine( species )
+
         # Perform a simulation of a single generation, and update the species
         # object accordingly
-        simulateSingleGeneration( species )
-
-        # Remember these frequencies
-        results.append( species.getAlleleFrequencies() )
+        stepForward( species )
 
         # Increment the counter
         currentGen += 1
 
+        # Remember these frequencies
+        remember( species.getAlleleFrequencies() )
+        profiler.lap("record")
+
+        if checkpointEvery > 0 and currentGen % checkpointEvery == 0:
+            checkpoint( species )
+            profiler.lap("checkpoint")
+
+        profiler.endGeneration()
+
+    if ( engine == "vectorized" and not species.isCompact()
+         and stepForward != simulateSingleGenerationReduced ):
+        species.setPopulationArrays( population )
+
+    profiler.endRun()
+
+    if recorder is not None:
+        recorder.finish()
+        return recorder
     return results
+
+
+def resumeDrift( checkpointPath, checkpointEvery=None, profiler=None ):
+    """
+       Carries on a simulation from a checkpoint saved by simulateDrift(). The
+       random number generator picks up exactly where it was, so the results
+       are identical to those of the original run, had it not been interrupted.
+
+       Parameters:
+           checkpointPath: the checkpoint file. New checkpoints are saved to the
+                           same file.
+           checkpointEvery: how often to save new checkpoints (by default, as
+                            often as the original run did)
+           profiler: a Profiler for the rest of the run (see simulateDrift())
+
+       Returns: the frequencies over time for the whole run (including the
+                generations before the checkpoint), as returned by
+                simulateDrift() (so a Recorder, if the original run had one)
+    """
+    population, results, rngState, metadata, counts, recorder = \
+        loadCheckpoint( checkpointPath )
+    if checkpointEvery is None:
+        checkpointEvery = metadata["checkpointEvery"]
+
+    species = Species( metadata["popSize"], tuple(metadata["startingFrequencies"]),
+                       { int(size): probability
+                         for size, probability in metadata["probOfLitterSize"] },
+                       metadata["name"], metadata["compact"],
+                       population=population )
+    rng = DriftRandom()
+    rng.setstate( rngState )
+
+    return simulateDrift( species, metadata["endAfterFixedNumGenerations"],
+                          metadata["numGenerations"], metadata["engine"], rng,
+                          metadata["reduceAfterLoss"], checkpointPath,
+                          checkpointEvery, recorder, profiler,
+                          resumeState=( results, counts, metadata["numMales"],
+                                        tuple(metadata["startingFrequencies"]),
+                                        metadata["currentGen"] ) )
@@ -1,5 +1,7 @@
-import random, math
-from team_2_individual import Individual
+from team_2_individual import PackedIndividual
+from team_2_litter import LitterSizeSampler
+from team_2_population import Population
+from team_2_random import DriftRandom
 from team_2_sex import Sex
 
 class Species:
@@ -14,7 +16,8 @@ class Species:
     """
 
     def __init__(self, populationSize, startingFrequencies,
-                 probOfOffspringInLitter, name="species"):
+                 probOfOffspringInLitter, name="species", compact=False,
+                 rng=None, population=None):
         """
            The constructor for the species. Requires:
                populationSize: the number of individuals in the population
@@ -31,13 +34,36 @@ class Species:
            Optional:
                name: The name of this species (only used when creating a string
                      representation)
+               compact: If true, the population is stored as a Population
+                        (contiguous NumPy arrays) instead of a list of
+                        Individuals. Use this for very large populations.
+               rng: The DriftRandom used to arrange the initial population (a
+                    freshly seeded one is used if None)
+               population: A Population to start from, instead of a randomly
+                    arranged one with the starting frequencies (e.g. when
+                    resuming from a checkpoint). No random numbers are drawn.
         """
         self.popSize = populationSize
         self.freqs = startingFrequencies
         self.pOffspring = probOfOffspringInLitter
+        self.litterSampler = LitterSizeSampler(probOfOffspringInLitter)
         self.name = str(name)
+        self.compact = bool(compact)
+        self.pop = None         # list of PackedIndividuals (if not compact)
+        self.population = None  # Population (if compact)
+        self.males = None       # the Individuals in pop, split by sex (if
+        self.females = None     # not compact; worked out when first needed)
+        self.genotypeCounts = None # (if not compact; see getGenotypeCounts())
+        if population is not None:
+            self.setPopulationArrays(population)
+            return
+        if rng is None:
+            rng = DriftRandom()
 
-
+        if self.compact:
+            self.setPopulationArrays(
+                Population.fromFrequencies(self.popSize, self.freqs, rng.generator) )
+            return
 
         # Set up the initial population
         allelesInPop = 2*self.popSize # diploids; 2 alleles per individual
@@ -45,16 +71,16 @@ class Species:
         remainingAlleles = [0] * int(round(allelesInPop*self.freqs[0]))
         remainingAlleles.extend( [1] * int(round(allelesInPop*self.freqs[1])) )
         remainingAlleles.extend( [2] * int(round(allelesInPop*self.freqs[2])) )
-        random.shuffle(remainingAlleles) # randomize the alleles
+        rng.shuffle(remainingAlleles) # randomize the alleles
 
-        population = [] # The population is a list of Individuals
+        population = [] # The population is a list of (Packed)Individuals
         for individual in range(self.popSize):
             alleles = ( remainingAlleles.pop(),  # since the list was randomized,
                         remainingAlleles.pop() ) # this gives 2 random alleles
-            sex = random.choice( Sex.options )
-            population.append( Individual(alleles, sex) )
+            sex = rng.choice( Sex.options )
+            population.append( PackedIndividual(3*alleles[0] + alleles[1], sex) )
 
-        self.setPopulation(population)
+        self.setPackedPopulation(population)
 
 
         
@@ -96,14 +122,91 @@ class Species:
         """
         return self.pOffspring
 
+    def getLitterSizeSampler(self):
+        """
+            Return: a LitterSizeSampler for this species' litter sizes (built
+                    once, when the species was created)
+        """
+        return self.litterSampler
+
+    def isCompact(self):
+        """
+            Return: true if the population is stored as arrays (see Population)
+        """
+        return self.compact
+
     def getPopulation(self):
         """
-            Return: a list of whose elements are either 0, 1, or 2
-                    (indicating that the individual represented by that number
-                    carried allele 0, 1, or 2)
+            Return: a list of the individuals in the population, as
+                    PackedIndividuals (which can be read just like
+                    Individuals; see team_2_individual.py)
+                    Note: for a compact species, this builds a new list on
+                    every call.
         """
+        if self.compact:
+            return self.population.toPackedIndividuals()
         return self.pop
 
+    def getPopulationArrays(self):
+        """
+            Return: the population as a Population (arrays of alleles and
+                    sexes). For a non-compact species, this is built from the
+                    list of Individuals.
+        """
+        if self.compact:
+            return self.population
+        return Population.fromIndividuals(self.pop)
+
+    def setPopulationArrays(self, newPopulation):
+        """
+            Modifies the species' population, and resets the allele frequencies
+            from the population's (already known) allele counts.
+
+            Param newPopulation: a Population
+        """
+        if len(newPopulation) != self.popSize:
+            exit( "Sorry, new population must have exactly " + str(self.popSize) \
+                  + " individuals. This population has " + str(len(newPopulation)) \
+                  + "." )
+
+        if self.compact:
+            self.population = newPopulation
+        else:
+            self.pop = newPopulation.toPackedIndividuals()
+            self.males = self.females = None
+            self.genotypeCounts = newPopulation.getGenotypeCounts().tolist()
+        self.setAlleleFrequencies( newPopulation.getAlleleFrequencies() )
+
+    def getAlleleCounts(self):
+        """
+            Return: a 3-tuple with the number of copies of alleles 0, 1 and 2
+                    in the current population
+        """
+        if self.compact:
+            return self.population.getAlleleCounts()
+        return tuple( int(round(freq * 2*self.popSize)) for freq in self.freqs )
+
+    def getSexPartitions(self):
+        """
+            Return: a 2-tuple of lists of the males and the females in the
+                    population. These are remembered (or, better, handed to
+                    setPackedPopulation()), so that the population doesn't have to be
+                    split up again every generation.
+        """
+        if self.compact:
+            population = self.population.toPackedIndividuals()
+            return ( [ individual for individual, female
+                       in zip(population, self.population.sexes) if not female ],
+                     [ individual for individual, female
+                       in zip(population, self.population.sexes) if female ] )
+
+        if self.males is None:
+            def isMale(x): return x.getSex() == Sex.M
+            self.males = list( filter( isMale, self.pop ) )
+            def isFemale(x): return not isMale(x)
+            self.females = list( filter( isFemale, self.pop ) )
+        return ( self.males, self.females )
+
     def setPopulation(self, newPopulation):
         """
             Modifies the species' population, and automatically resets the allele
@@ -138,9 +241,59 @@ class Species:
                   + " individuals. This population has " + str(len(newPopulation)) \
                   + "." )
 
-        self.pop = newPopulation
+        if self.compact:
+            self.setPopulationArrays( Population.fromIndividuals(newPopulation) )
+            return
+
+        self.pop = [ PackedIndividual.fromIndividual(individual)
+                     for individual in newPopulation ]
+        self.males = self.females = None
+        self.genotypeCounts = None
         self.setAlleleFrequencies( getNewFreqs( newPopulation ) )
 
+    def setPackedPopulation(self, newPopulation, males=None, females=None,
+                            genotypeCounts=None):
+        """
+            Modifies the species' population, and automatically resets the allele
+            frequencies. Unlike setPopulation(), this trusts its input (it's
+            meant for the simulator's own, already valid, children).
+
+            Param newPopulation: a list whose elements are PackedIndividuals
+            Optional:
+                males, females: the individuals in newPopulation, already split
+                                by sex (if the caller knows them; otherwise
+                                they're worked out when needed)
+                genotypeCounts: the number of individuals in newPopulation with
+                                each genotype (see getGenotypeCounts()), if the
+                                caller kept count as they were born
+        """
+        if len(newPopulation) != self.popSize:
+            exit( "Sorry, new population must have exactly " + str(self.popSize) \
+                  + " individuals. This population has " + str(len(newPopulation)) \
+                  + "." )
+
+        if self.compact:
+            self.setPopulationArrays( Population.fromIndividuals(newPopulation) )
+            return
+
+        if genotypeCounts is None:
+            genotypeCounts = [0] * 9
+            for individual in newPopulation:
+                genotypeCounts[individual.genotype] += 1
+        numAlleles = [0] * 3
+        for genotype, count in enumerate(genotypeCounts):
+            numAlleles[genotype // 3] += count
+            numAlleles[genotype % 3] += count
+
+        self.pop = newPopulation
+        self.males = males
+        self.females = females
+        self.genotypeCounts = list(genotypeCounts)
+        totalAlleles = 2*self.popSize
+        self.setAlleleFrequencies( [ numAlleles[0]/totalAlleles,
+                                     numAlleles[1]/totalAlleles,
+                                     numAlleles[2]/totalAlleles ] )
+
 
     def getName(self):
         """
@@ -154,24 +307,41 @@ class Species:
         """
         return self.popSize
 
+    def getGenotypeCounts(self):
+        """
+            Return: a list of 9 numbers, where element 3*i + j is the number of
+                    individuals with alleles (i, j). These are kept up to date
+                    as the population changes, so this is cheap to call every
+                    generation.
+        """
+        if self.compact:
+            return self.population.getGenotypeCounts().tolist()
+        if self.genotypeCounts is None:
+            self.genotypeCounts = [0] * 9
+            for individual in self.pop:
+                self.genotypeCounts[individual.genotype] += 1
+        return self.genotypeCounts
+
+    def getHeterozygosity(self):
+        """
+            Return: the fraction of individuals that are heterozygotes
+        """
+        genotypeCounts = self.getGenotypeCounts()
+        homozygotes = genotypeCounts[0] + genotypeCounts[4] + genotypeCounts[8]
+        return 1 - homozygotes/self.popSize
+
     def countThisGenerationsHeterozygotes(self):
         """
             Counts (and remembers for future use) the number of individuals that
             are heterozygotes, homozygous for allele 0, homozygous for allele 1,
-            and homozygous for allele 2.
-        """
-        self.numHeterozygotes = 0
-        self.numHomozygotesA0 = 0
-        self.numHomozygotesA1 = 0
-        self.numHomozygotesA2 = 0
-        for individual in self.pop:
-            if individual.alleles == (0,0):
-                self.numHomozygotesA0 += 1
-            elif individual.alleles == (1,1):
-                self.numHomozygotesA1 += 1
-            elif individual.alleles == (2,2):
-                self.numHomozygotesA2 += 1
-            else:
-                self.numHeterozygotes += 1
+            and homozygous for allele 2. (These come straight from the genotype
+            counts, which are kept up to date as the population changes.)
+        """
+        genotypeCounts = self.getGenotypeCounts()
+        self.numHomozygotesA0 = int(genotypeCounts[0]) # (0,0)
+        self.numHomozygotesA1 = int(genotypeCounts[4]) # (1,1)
+        self.numHomozygotesA2 = int(genotypeCounts[8]) # (2,2)
+        self.numHeterozygotes = self.popSize - self.numHomozygotesA0 \
+                                - self.numHomozygotesA1 - self.numHomozygotesA2
 
 
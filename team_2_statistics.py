@@ -0,0 +1,434 @@
+"""
+    Streaming statistics on the fixation events of many simulations.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+from collections import Counter
+from statistics import NormalDist
+import math
+
+# Fixation times are kept exactly below 2^HISTOGRAM_BITS generations; above
+# that, only their HISTOGRAM_BITS most significant bits are kept, so the
+# histogram has at most 2^(HISTOGRAM_BITS-1) bins per doubling of the
+# generations, each less than 2^(1-HISTOGRAM_BITS) of its value wide
+HISTOGRAM_BITS = 12
+
+
+def generationsToFixation(freqsOverTime):
+    """
+        Return: the first generation in which an allele became fixed in the
+                frequency-over-time data
+    """
+    for i in range(len(freqsOverTime)):
+        if 1.0 in freqsOverTime[i]:
+            return i
+    return -1
+
+
+def lossGenerations(freqsOverTime):
+    """
+        Return: a 3-tuple with, for each allele, the first generation in which
+                it had been lost (its frequency was 0) in the frequency-over-time
+                data, or -1 if it never was
+    """
+    losses = [-1] * 3
+    for i in range(len(freqsOverTime)):
+        for allele in range(3):
+            if losses[allele] == -1 and freqsOverTime[i][allele] == 0.0:
+                losses[allele] = i
+        if -1 not in losses:
+            break
+    return tuple(losses)
+
+
+def histogramBin(generation):
+    """
+        Return: the first generation of the fixation-time histogram bin that
+                this generation falls in (see HISTOGRAM_BITS)
+    """
+    shift = max( int(generation).bit_length() - HISTOGRAM_BITS, 0 )
+    return (int(generation) >> shift) << shift
+
+
+def histogramBinMiddle(start):
+    """
+        Return: the middle of the fixation-time histogram bin that starts at
+                this generation (the generation itself, if the bin holds just
+                one)
+    """
+    shift = max( int(start).bit_length() - HISTOGRAM_BITS, 0 )
+    return start + ((1 << shift) - 1) / 2
+
+
+def zScore(confidence):
+    """
+        Return: the number of standard errors either side of an estimate that a
+                (two-sided, normal) confidence interval at this level spans,
+                e.g. 1.96 for 0.95
+    """
+    return NormalDist().inv_cdf( (1 + confidence) / 2 )
+
+
+def runEvents(freqsOverTime):
+    """
+        Return: a 3-tuple describing the events of a single simulation:
+                ( the first generation in which an allele was fixed, or -1,
+                  the allele that became fixed, or -1,
+                  the 3-tuple returned by lossGenerations() )
+    """
+    generation = generationsToFixation(freqsOverTime)
+    fixedAllele = -1
+    if generation != -1:
+        fixedAllele = list(freqsOverTime[generation]).index(1.0)
+    return ( generation, fixedAllele, lossGenerations(freqsOverTime) )
+
+
+class RunningSummary:
+    """
+        The count, mean, variance (using Welford's online algorithm), min and
+        max of a stream of numbers, without keeping the numbers themselves.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.sumOfSquares = 0.0 # sum of squared deviations from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """
+            Param value: the next number in the stream
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.sumOfSquares += delta * (value - self.mean)
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def getMean(self):
+        """
+            Return: the mean, or None if there are no values
+        """
+        if self.count == 0:
+            return None
+        return self.mean
+
+    def getVariance(self):
+        """
+            Return: the sample variance, or None if there are fewer than two
+                    values
+        """
+        if self.count < 2:
+            return None
+        return self.sumOfSquares / (self.count - 1)
+
+    def getStandardDeviation(self):
+        """
+            Return: the sample standard deviation, or None if there are fewer
+                    than two values
+        """
+        variance = self.getVariance()
+        if variance is None:
+            return None
+        return math.sqrt(variance)
+
+    def merge(self, other):
+        """
+            Adds all of another summary's values to this one (using Chan et
+            al.'s parallel form of Welford's algorithm), as if they had been
+            added one at a time.
+
+            Param other: a RunningSummary
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean = other.count, other.mean
+            self.sumOfSquares = other.sumOfSquares
+            self.min, self.max = other.min, other.max
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.sumOfSquares += other.sumOfSquares \
+                             + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def toDict(self):
+        """
+            Return: a JSON-friendly dictionary holding this summary
+        """
+        return { "count": self.count, "mean": self.mean,
+                 "sumOfSquares": self.sumOfSquares,
+                 "min": self.min, "max": self.max }
+
+    @classmethod
+    def fromDict(cls, dictionary):
+        """
+            Param dictionary: a dictionary returned by toDict()
+            Return: the equivalent RunningSummary
+        """
+        summary = cls()
+        summary.count = dictionary["count"]
+        summary.mean = dictionary["mean"]
+        summary.sumOfSquares = dictionary["sumOfSquares"]
+        summary.min = dictionary["min"]
+        summary.max = dictionary["max"]
+        return summary
+
+
+class FixationStatistics:
+    """
+        Accumulates statistics on the fixation events of many simulations, one
+        simulation at a time. Each simulation's frequencies over time can be
+        thrown away as soon as it has been added, so the memory used doesn't
+        grow with the number or the length of the simulations.
+
+        Tracks:
+            - the number of simulations, and how many of them reached fixation
+            - the mean and variance of the generations to fixation (using
+              Welford's online algorithm), plus the min and max
+            - the number of times each allele became fixed
+            - when each allele was lost, and when the first allele was lost
+              (i.e., when the simulation became a 2-allele process)
+            - a histogram of the generations to fixation, from which the
+              percentiles are calculated. Below 2^HISTOGRAM_BITS (4096)
+              generations each fixation time has its own bin, so the
+              percentiles are exact; above that the bins are log-spaced, at
+              most 2^(HISTOGRAM_BITS-1) per doubling, so the percentiles are
+              within 0.05%. However many simulations are added, the
+              histogram has at most 2^(HISTOGRAM_BITS-1) bins per doubling of
+              the longest fixation time past 4096 (about 41000 bins in all
+              for a billion generations)
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self):
+        self.numRuns = 0
+        self.numFixations = 0
+        self.fixationTimes = RunningSummary()
+        self.fixationsByAllele = [0] * 3
+        self.histogram = Counter()
+        self.lossTimes = [ RunningSummary() for allele in range(3) ]
+        self.firstLossTimes = RunningSummary()
+
+    def addRun(self, freqsOverTime):
+        """
+            Adds a single simulation's results.
+
+            Param freqsOverTime: the frequencies over time, as returned by
+                                 simulateDrift()
+        """
+        self.addEvents( *runEvents(freqsOverTime) )
+
+    def addEvents(self, fixationGeneration, fixedAllele, lossGenerations=None):
+        """
+            Adds a single simulation's results, when the caller already knows
+            when (and which) allele became fixed.
+
+            Params:
+                fixationGeneration: the first generation in which an allele was
+                                    fixed, or -1 if none was
+                fixedAllele: the allele (0, 1, or 2) that became fixed, or -1
+                lossGenerations: for each allele, the first generation in which
+                                 it had been lost, or -1 if it never was (as
+                                 returned by lossGenerations())
+        """
+        self.numRuns += 1
+
+        if lossGenerations is not None:
+            losses = [ generation for generation in lossGenerations
+                       if generation != -1 ]
+            for allele in range(3):
+                if lossGenerations[allele] != -1:
+                    self.lossTimes[allele].add( lossGenerations[allele] )
+            if len(losses) > 0:
+                self.firstLossTimes.add( min(losses) )
+
+        if fixationGeneration == -1:
+            return
+
+        self.numFixations += 1
+        self.fixationsByAllele[fixedAllele] += 1
+        self.histogram[ histogramBin(fixationGeneration) ] += 1
+        self.fixationTimes.add( fixationGeneration )
+
+    def getMean(self):
+        """
+            Return: the mean generations to fixation (over the simulations
+                    that reached fixation), or None if none did
+        """
+        return self.fixationTimes.getMean()
+
+    def getStandardDeviation(self):
+        """
+            Return: the sample standard deviation of the generations to
+                    fixation, or None if fewer than two simulations reached
+                    fixation
+        """
+        return self.fixationTimes.getStandardDeviation()
+
+    def getMin(self):
+        """
+            Return: the fewest generations to fixation, or None
+        """
+        return self.fixationTimes.min
+
+    def getMax(self):
+        """
+            Return: the most generations to fixation, or None
+        """
+        return self.fixationTimes.max
+
+    def getLossCounts(self):
+        """
+            Return: a 3-tuple with the number of simulations in which each allele
+                    was lost
+        """
+        return tuple( summary.count for summary in self.lossTimes )
+
+    def getMeanLossGenerations(self):
+        """
+            Return: a 3-tuple with the mean generation in which each allele was
+                    lost (over the simulations in which it was), or None
+        """
+        return tuple( summary.getMean() for summary in self.lossTimes )
+
+    def getMeanFirstLossGeneration(self):
+        """
+            Return: the mean generation in which the first allele was lost
+                    (over the simulations in which one was), or None
+        """
+        return self.firstLossTimes.getMean()
+
+    def getPercentile(self, percent):
+        """
+            Param percent: a number between 0 and 100
+            Return: that percentile of the generations to fixation (linearly
+                    interpolated between the two closest ranks, like
+                    numpy.percentile(), with the fixation times above
+                    2^HISTOGRAM_BITS taken to be the middle of their bin),
+                    or None if no simulation reached fixation
+        """
+        if self.numFixations == 0:
+            return None
+
+        position = (percent / 100) * (self.numFixations - 1)
+        lowerRank = math.floor(position)
+        upperRank = math.ceil(position)
+
+        lowerValue = upperValue = None
+        seen = 0
+        for start in sorted(self.histogram):
+            seen += self.histogram[start]
+            value = histogramBinMiddle(start)
+            if lowerValue is None and seen > lowerRank:
+                lowerValue = value
+            if seen > upperRank:
+                upperValue = value
+                break
+        return lowerValue + (upperValue - lowerValue) * (position - lowerRank)
+
+    def getPercentFixations(self):
+        """
+            Return: the percentage of simulations in which an allele was fixed
+        """
+        if self.numRuns == 0:
+            return 0.0
+        return (self.numFixations / self.numRuns) * 100
+
+    def merge(self, other):
+        """
+            Adds all of another FixationStatistics' simulations to this one, as
+            if they had been added one at a time (e.g. to combine the
+            statistics of batches run on different machines).
+
+            Param other: a FixationStatistics
+        """
+        self.numRuns += other.numRuns
+        self.numFixations += other.numFixations
+        self.fixationTimes.merge( other.fixationTimes )
+        for allele in range(3):
+            self.fixationsByAllele[allele] += other.fixationsByAllele[allele]
+            self.lossTimes[allele].merge( other.lossTimes[allele] )
+        self.histogram.update( other.histogram )
+        self.firstLossTimes.merge( other.firstLossTimes )
+
+    def getMeanHalfWidth(self, confidence=0.95):
+        """
+            Param confidence: the confidence level, e.g. 0.95
+            Return: the half-width of the confidence interval of the mean
+                    generations to fixation, or None if fewer than two
+                    simulations reached fixation
+        """
+        sd = self.getStandardDeviation()
+        if sd is None:
+            return None
+        return zScore(confidence) * sd / math.sqrt(self.numFixations)
+
+    def getFixationProbabilityHalfWidths(self, confidence=0.95):
+        """
+            Param confidence: the confidence level, e.g. 0.95
+            Return: a 3-tuple with the half-width of the (Wilson score)
+                    confidence interval of the probability that each allele
+                    becomes fixed, or None if there are no simulations. Unlike
+                    the usual p +/- z sqrt(p(1-p)/n), these don't shrink to 0
+                    while an allele has never (or always) been fixed.
+        """
+        if self.numRuns == 0:
+            return None
+        z = zScore(confidence)
+        halfWidths = []
+        for fixations in self.fixationsByAllele:
+            p = fixations / self.numRuns
+            halfWidths.append( z / (1 + z*z/self.numRuns)
+                               * math.sqrt( p*(1 - p)/self.numRuns
+                                            + z*z/(4*self.numRuns**2) ) )
+        return tuple(halfWidths)
+
+    def toDict(self):
+        """
+            Return: a JSON-friendly dictionary holding these statistics
+        """
+        return { "numRuns": self.numRuns,
+                 "numFixations": self.numFixations,
+                 "fixationTimes": self.fixationTimes.toDict(),
+                 "fixationsByAllele": list(self.fixationsByAllele),
+                 "histogram": sorted( [ generation, count ] for generation, count
+                                      in self.histogram.items() ),
+                 "lossTimes": [ summary.toDict() for summary in self.lossTimes ],
+                 "firstLossTimes": self.firstLossTimes.toDict() }
+
+    @classmethod
+    def fromDict(cls, dictionary):
+        """
+            Param dictionary: a dictionary returned by toDict()
+            Return: the equivalent FixationStatistics
+        """
+        statistics = cls()
+        statistics.numRuns = dictionary["numRuns"]
+        statistics.numFixations = dictionary["numFixations"]
+        statistics.fixationTimes = RunningSummary.fromDict( dictionary["fixationTimes"] )
+        statistics.fixationsByAllele = list( dictionary["fixationsByAllele"] )
+        # (Statistics saved before the histogram was binned have a bin for
+        # every fixation time)
+        statistics.histogram = Counter()
+        for generation, count in dictionary["histogram"]:
+            statistics.histogram[ histogramBin(generation) ] += count
+        statistics.lossTimes = [ RunningSummary.fromDict(summary)
+                                 for summary in dictionary["lossTimes"] ]
+        statistics.firstLossTimes = RunningSummary.fromDict(
+            dictionary["firstLossTimes"] )
+        return statistics
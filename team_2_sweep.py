@@ -0,0 +1,313 @@
+"""
+    Parameter sweeps with a result cache.
+
+    A sweep runs the full batch of simulations (numberOfRuns replicates) for
+    every combination of the parameter values in a grid. Each grid point's
+    statistics are stored in a cache directory under a hash of everything that
+    affects its results (the parameters, the seed and CACHE_VERSION), so points
+    that were already computed are skipped. An interrupted sweep simply picks up
+    where it left off when it is run again.
+
+    The grid is a JSON file mapping setting names (as in team_2_settings.py) to
+    lists of values; any setting not in the grid keeps its value from the
+    settings file. E.g.:
+        { "popSize": [ 50, 95, 200 ],
+          "probOfLitterSize": [ { "1": 0.95, "2": 0.05 }, { "1": 1.0 } ] }
+
+    Usage:
+        $ python3 team_2_sweep.py grid.json --seed 1234 --workers 8
+
+    Each point's estimate (see team_2_estimate.py: exact for small populations,
+    from diffusion theory otherwise) goes into the summary alongside its
+    simulated statistics, and into the cache with them. With
+    --max-estimated-generations, points whose estimated mean generations to
+    fixation are above the limit aren't simulated at all, which is a quick way
+    to leave out the expensive corners of a grid.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+from team_2_runner import currentSettings, iterReplicates, iterAdaptiveReplicates
+from team_2_statistics import FixationStatistics
+from team_2_estimate import estimateStatistics
+import team_2_settings
+
+# Change this whenever the simulation code changes in a way that changes
+# results, so that stale cache entries aren't used
+CACHE_VERSION = 1
+
+# The settings that affect a grid point's results (and so go into its hash)
+HASHED_SETTINGS = [ "popSize", "startingFrequencies", "probOfLitterSize",
+                    "numberOfRuns", "fixedNumberOfGenerations", "engine",
+                    "compactPopulation", "reduceAfterLoss" ]
+
+# The settings that also affect a grid point's results when adaptiveRuns is on
+ADAPTIVE_SETTINGS = [ "adaptiveRuns", "targetMeanHalfWidth",
+                      "targetProbabilityHalfWidth", "confidenceLevel",
+                      "adaptiveBatchRuns", "maxNumberOfRuns" ]
+
+
+def normalizeParameters( parameters ):
+    """
+        Puts parameters read from JSON into the form the simulator expects
+        (e.g. JSON turns the litter sizes in probOfLitterSize into strings).
+
+        Return: the normalized copy of parameters
+    """
+    parameters = dict(parameters)
+    if "probOfLitterSize" in parameters:
+        parameters["probOfLitterSize"] = { int(size): float(probability)
+            for size, probability in parameters["probOfLitterSize"].items() }
+    if "startingFrequencies" in parameters:
+        parameters["startingFrequencies"] = tuple(
+            float(freq) for freq in parameters["startingFrequencies"] )
+    return parameters
+
+
+def pointHash( parameters, seed ):
+    """
+        Return: a hash (a hex string) of everything that affects the results of
+                the grid point with these parameters and seed
+    """
+    key = { name: parameters[name] for name in HASHED_SETTINGS }
+    key["probOfLitterSize"] = sorted( key["probOfLitterSize"].items() )
+    # How the replicates are split into batches changes the batched engine's
+    # random numbers (but nobody else's)
+    if parameters["engine"] == "batched":
+        key["batchSize"] = parameters["batchSize"]
+    # The leap engine's results depend on how far it leaps
+    if parameters["engine"] == "leap":
+        key["leapTolerance"] = parameters["leapTolerance"]
+    # With adaptive runs, the targets decide how many replicates there are
+    if parameters["adaptiveRuns"]:
+        for name in ADAPTIVE_SETTINGS:
+            key[name] = parameters[name]
+    key["seed"] = seed
+    key["version"] = CACHE_VERSION
+    text = json.dumps( key, sort_keys=True, separators=(",", ":") )
+    return hashlib.sha256( text.encode("utf-8") ).hexdigest()
+
+
+def expandGrid( grid, base=None ):
+    """
+        Params:
+            grid: a dictionary mapping setting names to lists of values
+            base: the settings to use for anything not in the grid (by default,
+                  those in team_2_settings.py)
+        Return: a list of parameter dictionaries, one per grid point
+    """
+    if base is None:
+        base = currentSettings()
+    for name in grid:
+        if name not in base:
+            exit("Sorry, '" + name + "' isn't a setting we can sweep over.")
+
+    names = sorted(grid)
+    points = []
+    for values in itertools.product( *( grid[name] for name in names ) ):
+        parameters = dict(base)
+        parameters.update( zip(names, values) )
+        points.append( normalizeParameters(parameters) )
+    return points
+
+
+def runPoint( parameters, seed, numWorkers=1 ):
+    """
+        Runs all replicates for a single grid point (or, with adaptiveRuns,
+        just enough of them; see team_2_settings.py).
+
+        Return: the FixationStatistics of the replicates
+    """
+    # Only the events matter here, so don't keep any frequencies over time
+    parameters = dict( parameters, recordingPolicy="summary" )
+    statistics = FixationStatistics()
+    if parameters["adaptiveRuns"]:
+        replicates = iterAdaptiveReplicates( parameters, statistics, numWorkers,
+                                             seed )
+    else:
+        replicates = iterReplicates( parameters, parameters["numberOfRuns"],
+                                     numWorkers, seed )
+    for recorder in replicates:
+        statistics.addEvents( *recorder.getEvents() )
+    return statistics
+
+
+def summarizeEstimate( estimate ):
+    """
+        Param estimate: a grid point's estimate, as returned by
+                        estimateStatistics()
+        Return: the parts of it that go into the summary, as a JSON-friendly
+                dictionary: "mean" (the estimated mean generations to fixation)
+                and "fixationProbabilities"
+    """
+    return { "mean": estimate.getMean(),
+             "fixationProbabilities": [ float(p) for p in
+                                        estimate.fixationProbabilities ] }
+
+
+def loadCachedPoint( cacheDir, hashValue ):
+    """
+        Return: a 2-tuple of the cached FixationStatistics for a grid point and
+                its estimate (see summarizeEstimate(); None in entries from
+                before estimates were cached), or (None, None) if it hasn't
+                been computed yet
+    """
+    path = os.path.join( cacheDir, hashValue + ".json" )
+    if not os.path.exists( path ):
+        return None, None
+    with open( path ) as cacheFile:
+        entry = json.load(cacheFile)
+    return ( FixationStatistics.fromDict( entry["statistics"] ),
+             entry.get("estimate") )
+
+
+def storeCachedPoint( cacheDir, hashValue, parameters, seed, statistics,
+                      estimate ):
+    """
+        Saves a grid point's statistics and estimate (see summarizeEstimate()).
+        The file is written under a temporary name and then renamed, so a crash
+        never leaves a half-written entry.
+    """
+    if not os.path.exists( cacheDir ):
+        os.makedirs( cacheDir )
+    path = os.path.join( cacheDir, hashValue + ".json" )
+    entry = { "parameters": dict( parameters,
+                                  probOfLitterSize=sorted(
+                                      parameters["probOfLitterSize"].items() ) ),
+              "seed": seed,
+              "version": CACHE_VERSION,
+              "statistics": statistics.toDict(),
+              "estimate": estimate }
+    with open( path + ".partial", "w" ) as cacheFile:
+        json.dump( entry, cacheFile )
+    os.replace( path + ".partial", path )
+
+
+def runSweep( grid, seed, cacheDir="sweep_cache", numWorkers=1, base=None,
+              verbose=True, maxEstimatedGenerations=None ):
+    """
+        Runs every point of a parameter grid, skipping those already in the
+        cache.
+
+        Params:
+            grid: a dictionary mapping setting names to lists of values
+            seed: the seed for every grid point's batch of replicates
+            cacheDir: the directory the cache is kept in
+            numWorkers: the number of processes to run replicates in
+            base: the settings to use for anything not in the grid
+            verbose: if true, print progress
+            maxEstimatedGenerations: if given, skip (don't simulate) the points
+                     whose estimated mean generations to fixation are above it
+        Return: a list of (parameters, FixationStatistics, estimate) triples,
+                one per grid point (see summarizeEstimate()); the statistics
+                are None for the points that were skipped, and the estimate
+                for cached points from before estimates were cached
+    """
+    points = expandGrid( grid, base )
+    results = []
+    for index, parameters in enumerate(points):
+        hashValue = pointHash( parameters, seed )
+        statistics, estimate = loadCachedPoint( cacheDir, hashValue )
+        # The exact estimate of a small population takes a while, so it is
+        # only worked out for the points that aren't cached (which need it to
+        # decide whether to skip them, or are about to be simulated anyway);
+        # entries from before estimates were cached go without
+        if statistics is None:
+            estimate = summarizeEstimate( estimateStatistics( parameters ) )
+        if ( statistics is None and maxEstimatedGenerations is not None
+             and estimate["mean"] is not None
+             and estimate["mean"] > maxEstimatedGenerations ):
+            status = "skipped"
+        elif statistics is None:
+            statistics = runPoint( parameters, seed, numWorkers )
+            storeCachedPoint( cacheDir, hashValue, parameters, seed, statistics,
+                              estimate )
+            status = "computed"
+        else:
+            status = "cached"
+        if verbose:
+            print( "[" + str(index + 1) + "/" + str(len(points)) + "] "
+                   + status + " " + hashValue[:12] + " "
+                   + describePoint( parameters, grid ) )
+        results.append( ( parameters, statistics, estimate ) )
+    return results
+
+
+def describePoint( parameters, grid ):
+    """
+        Return: a short description of the grid values of a point
+    """
+    return ", ".join( name + "=" + str(parameters[name]) for name in sorted(grid) )
+
+
+def writeSummary( path, results, grid ):
+    """
+        Writes one tab-separated line per grid point, with its grid values and
+        the main statistics (None for the points that were skipped), and the
+        estimates (None where there is none).
+    """
+    names = sorted(grid)
+    outputFile = open( path, "w" )
+    outputFile.write( "#" + "\t".join( names
+        + [ "Runs", "Percent fixed", "Mean generations to fixation",
+            "Standard deviation", "Fixations a_0", "Fixations a_1",
+            "Fixations a_2", "Estimated mean generations",
+            "Estimated fixation probability a_0",
+            "Estimated fixation probability a_1",
+            "Estimated fixation probability a_2" ] ) + "\n" )
+    for parameters, statistics, estimate in results:
+        row = [ parameters[name] for name in names ]
+        if statistics is None:
+            row += [ None ] * 7
+        else:
+            row += [ statistics.numRuns, statistics.getPercentFixations(),
+                     statistics.getMean(), statistics.getStandardDeviation() ]
+            row += statistics.fixationsByAllele
+        if estimate is None:
+            row += [ None ] * 4
+        else:
+            row += [ estimate["mean"] ] + estimate["fixationProbabilities"]
+        outputFile.write( "\t".join( str(value) for value in row ) + "\n" )
+    outputFile.close()
+
+
+def main( arguments ):
+    parser = argparse.ArgumentParser( description="Run a parameter sweep." )
+    parser.add_argument( "grid", help="a JSON file describing the grid" )
+    parser.add_argument( "--seed", type=int, default=team_2_settings.seed )
+    parser.add_argument( "--cache", default="sweep_cache",
+                         help="the cache directory" )
+    parser.add_argument( "--workers", type=int,
+                         default=team_2_settings.numberOfWorkers )
+    parser.add_argument( "--summary", default="output/sweep.tsv",
+                         help="where to write the summary table" )
+    parser.add_argument( "--max-estimated-generations", type=float, default=None,
+                         help="skip the points whose estimated mean generations "
+                              + "to fixation are above this" )
+    options = parser.parse_args( arguments )
+
+    if options.seed is None:
+        exit("Sorry, a sweep needs a fixed seed (use --seed, or set seed in "
+             + "team_2_settings.py) so that it can be resumed.")
+
+    with open( options.grid ) as gridFile:
+        grid = json.load( gridFile )
+
+    results = runSweep( grid, options.seed, options.cache, options.workers,
+                        maxEstimatedGenerations=options.max_estimated_generations )
+
+    summaryDir = os.path.dirname( options.summary )
+    if summaryDir != "" and not os.path.exists( summaryDir ):
+        os.makedirs( summaryDir )
+    writeSummary( options.summary, results, grid )
+    print( "Wrote the summary to " + options.summary )
+
+
+if __name__ == "__main__":
+    main( sys.argv[1:] )
@@ -0,0 +1,362 @@
+"""
+    Reading and writing the frequency-over-time data of many simulations.
+
+    Rather than one small text file per simulation, all of a batch's
+    trajectories go into a single binary file:
+
+        magic           8 bytes, b"T2DRIFT" followed by the format version
+        chunks          each chunk holds the rows of several whole runs: a
+                        uint32 generation number per row, followed by the
+                        row values as float32 (rows x columns), the whole
+                        thing compressed with zlib (unless compression is off)
+        metadata        UTF-8 JSON: the column names and compression level
+        index           int64 arrays: the first global row of each run (plus
+                        one past the end), the first global row of each chunk
+                        (plus one past the end), and each chunk's file offset
+                        and stored size
+        footer          index offset, metadata length, number of runs, number
+                        of chunks (4 x uint64), then the magic again
+
+    Since runs are of different lengths, a run is located through the index:
+    run i is made of global rows runOffsets[i] to runOffsets[i+1], all of which
+    are in a single chunk. The reader memory-maps the file and only decodes
+    the chunk it needs; with compression off, it returns views straight into
+    the mapped file.
+
+    The tab-separated format used by the Gnuplot scripts is still available,
+    both directly (writeTsv()) and as an export from the binary file.
+
+    Usage (export runs 0 to 9 to output/frequency_over_time<N>.tsv):
+        $ python3 team_2_trajectories.py output/trajectories.bin output 0-9
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+import numpy as np
+
+MAGIC = b"T2DRIFT\x01"
+FOOTER = struct.Struct("<4Q8s")
+FREQUENCY_COLUMNS = ( "Allele0 Freq", "Allele1 Freq", "Allele2 Freq" )
+# The columns of a Recorder's rows (see team_2_recording.py)
+TRAJECTORY_COLUMNS = FREQUENCY_COLUMNS + ( "Heterozygosity", )
+
+
+def writeTsv( path, values, generations=None, columns=FREQUENCY_COLUMNS ):
+    """
+        Writes a single simulation's frequencies over time as tab-separated text
+        (the format the Gnuplot scripts read).
+
+        Params:
+            path: the file to write
+            values: a sequence of rows (e.g. the 3-tuples of frequencies
+                    returned by simulateDrift())
+            generations: the generation number of each row (by default, row i
+                         is generation i)
+            columns: the names of the columns in values
+    """
+    if generations is None:
+        generations = range(len(values))
+
+    outputFile = open( path, "w" )
+    # Write the header
+    outputFile.write("#Generation\t" + "\t".join(columns) + "\n")
+
+    # Write the actual data
+    for generation, row in zip(generations, values):
+        outputFile.write( str(generation) + "\t" )
+        outputFile.write( '\t'.join( format( value, "1.4f") for value in row ) )
+        outputFile.write( "\n" )
+
+    outputFile.close()
+
+
+class TrajectoryWriter:
+    """
+        Writes many simulations' trajectories to a single binary file (see the
+        top of this file for the layout). Runs are buffered and written a chunk
+        at a time. The file only appears under its final name once close() has
+        been called.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, path, columns=FREQUENCY_COLUMNS, chunkRows=1 << 16,
+                 compressionLevel=6):
+        """
+            Params:
+                path: the file to write
+                columns: the names of the values in each row
+                chunkRows: the (approximate) number of rows per chunk
+                compressionLevel: the zlib compression level (0 for none)
+        """
+        self.path = path
+        self.columns = tuple(columns)
+        self.chunkRows = chunkRows
+        self.compressionLevel = compressionLevel
+
+        self.file = open( path + ".partial", "wb" )
+        self.file.write(MAGIC)
+
+        self.runOffsets = [0]
+        self.chunkFirstRows = [0]
+        self.chunkFileOffsets = []
+        self.chunkSizes = []
+        self.pendingGenerations = []
+        self.pendingValues = []
+        self.pendingRows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __len__(self):
+        return len(self.runOffsets) - 1
+
+    def addRun(self, values, generations=None):
+        """
+            Adds one simulation's trajectory.
+
+            Params:
+                values: a sequence of rows, one value per column
+                generations: the generation number of each row (by default,
+                             row i is generation i)
+        """
+        values = np.asarray(values, dtype=np.float32).reshape(-1, len(self.columns))
+        if generations is None:
+            generations = np.arange(len(values), dtype=np.uint32)
+        else:
+            generations = np.asarray(generations, dtype=np.uint32)
+
+        self.pendingGenerations.append(generations)
+        self.pendingValues.append(values)
+        self.pendingRows += len(values)
+        self.runOffsets.append( self.runOffsets[-1] + len(values) )
+
+        if self.pendingRows >= self.chunkRows:
+            self.flush()
+
+    def flush(self):
+        """
+            Writes any buffered runs out as a chunk.
+        """
+        if self.pendingRows == 0:
+            return
+
+        data = ( np.concatenate(self.pendingGenerations).tobytes()
+                 + np.concatenate(self.pendingValues).tobytes() )
+        if self.compressionLevel > 0:
+            data = zlib.compress(data, self.compressionLevel)
+
+        self.chunkFileOffsets.append( self.file.tell() )
+        self.chunkSizes.append( len(data) )
+        self.file.write(data)
+        self.chunkFirstRows.append( self.chunkFirstRows[-1] + self.pendingRows )
+
+        self.pendingGenerations = []
+        self.pendingValues = []
+        self.pendingRows = 0
+
+    def close(self):
+        """
+            Writes the remaining runs and the index, and moves the file into
+            place.
+        """
+        self.flush()
+
+        metadata = json.dumps( { "columns": self.columns,
+                                 "compressionLevel": self.compressionLevel } )
+        metadata = metadata.encode("utf-8")
+        indexOffset = self.file.tell()
+        self.file.write(metadata)
+        for array in ( self.runOffsets, self.chunkFirstRows,
+                       self.chunkFileOffsets, self.chunkSizes ):
+            self.file.write( np.asarray(array, dtype=np.int64).tobytes() )
+        self.file.write( FOOTER.pack( indexOffset, len(metadata), len(self),
+                                      len(self.chunkSizes), MAGIC ) )
+        self.file.close()
+
+        os.replace( self.path + ".partial", self.path )
+
+    def discard(self):
+        """
+            Closes the file without finishing it, and deletes it. Does nothing
+            if the file has already been closed (and moved into place).
+        """
+        if not self.file.closed:
+            self.file.close()
+            os.remove( self.path + ".partial" )
+
+
+class TrajectoryReader:
+    """
+        Reads a file written by TrajectoryWriter. reader[i] is the values of
+        run i (an array with one row per recorded generation), and
+        reader.getGenerations(i) is the matching generation numbers.
+
+        Young, Gibson, Jennings, and Smith
+    """
+
+    def __init__(self, path):
+        """
+            Param path: the file to read
+        """
+        self.file = open( path, "rb" )
+        self.map = mmap.mmap( self.file.fileno(), 0, access=mmap.ACCESS_READ )
+
+        if self.map[:len(MAGIC)] != MAGIC or self.map[-len(MAGIC):] != MAGIC:
+            exit("Sorry, " + path + " is not a trajectory file.")
+
+        indexOffset, metadataLength, numRuns, numChunks, _ = \
+            FOOTER.unpack( self.map[-FOOTER.size:] )
+        metadata = json.loads( self.map[indexOffset:indexOffset + metadataLength]
+                               .decode("utf-8") )
+        self.columns = tuple(metadata["columns"])
+        self.compressed = metadata["compressionLevel"] > 0
+
+        # Read the index
+        offset = indexOffset + metadataLength
+        arrays = []
+        for length in ( numRuns + 1, numChunks + 1, numChunks, numChunks ):
+            arrays.append( np.frombuffer( self.map, dtype=np.int64, count=length,
+                                          offset=offset ).copy() )
+            offset += 8*length
+        self.runOffsets, self.chunkFirstRows, self.chunkFileOffsets, \
+            self.chunkSizes = arrays
+
+        self.cachedChunk = None
+        self.cachedData = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        self.cachedChunk = None
+        self.cachedData = None
+        try:
+            self.map.close()
+        except BufferError:
+            # Someone still holds an array that views the mapped file; the map
+            # will be closed when the last one goes away
+            pass
+        self.file.close()
+
+    def __len__(self):
+        return len(self.runOffsets) - 1
+
+    def lengths(self):
+        """
+            Return: an array with the number of recorded rows in each run
+        """
+        return np.diff(self.runOffsets)
+
+    def readChunk(self, chunk):
+        """
+            Return: a 2-tuple of the generations and values in a chunk
+        """
+        if chunk != self.cachedChunk:
+            start = int(self.chunkFileOffsets[chunk])
+            size = int(self.chunkSizes[chunk])
+            numRows = int(self.chunkFirstRows[chunk + 1] - self.chunkFirstRows[chunk])
+            if self.compressed:
+                data = zlib.decompress( self.map[start:start + size] )
+                start = 0
+            else:
+                data = self.map
+            generations = np.frombuffer( data, dtype=np.uint32, count=numRows,
+                                         offset=start )
+            values = np.frombuffer( data, dtype=np.float32,
+                                    count=numRows*len(self.columns),
+                                    offset=start + 4*numRows )
+            self.cachedChunk = chunk
+            self.cachedData = ( generations, values.reshape(numRows, -1) )
+        return self.cachedData
+
+    def locate(self, run):
+        """
+            Return: a 3-tuple of the chunk run `run` is stored in, and its first
+                    and last (exclusive) row in that chunk
+        """
+        if run < 0:
+            run += len(self)
+        if not 0 <= run < len(self):
+            raise IndexError("run " + str(run) + " is out of range")
+        start = int(self.runOffsets[run])
+        end = int(self.runOffsets[run + 1])
+        chunk = int(np.searchsorted(self.chunkFirstRows, start, side="right")) - 1
+        chunk = min(chunk, len(self.chunkSizes) - 1)
+        firstRow = start - int(self.chunkFirstRows[chunk])
+        return chunk, firstRow, firstRow + (end - start)
+
+    def __getitem__(self, run):
+        chunk, start, end = self.locate(run)
+        if start == end:
+            return np.empty( (0, len(self.columns)), dtype=np.float32 )
+        return self.readChunk(chunk)[1][start:end]
+
+    def getGenerations(self, run):
+        """
+            Return: the generation number of each row of run `run`
+        """
+        chunk, start, end = self.locate(run)
+        if start == end:
+            return np.empty( 0, dtype=np.uint32 )
+        return self.readChunk(chunk)[0][start:end]
+
+    def __iter__(self):
+        for run in range(len(self)):
+            yield self[run]
+
+    def exportTsv(self, outputDir, runs=None, prefix="frequency_over_time"):
+        """
+            Writes runs out as tab-separated files, for the Gnuplot scripts.
+
+            Params:
+                outputDir: the directory to write to
+                runs: the runs to export (all of them if None)
+                prefix: run N is written to <outputDir>/<prefix><N>.tsv
+        """
+        if runs is None:
+            runs = range(len(self))
+        for run in runs:
+            writeTsv( os.path.join(outputDir, prefix + str(run) + ".tsv"),
+                      self[run], self.getGenerations(run), self.columns )
+
+
+def parseRuns( text ):
+    """
+        Param text: a comma-separated list of run numbers and ranges, e.g.
+                    "0-9,15"
+        Return: the list of run numbers
+    """
+    runs = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            runs.extend( range(int(first), int(last) + 1) )
+        else:
+            runs.append( int(part) )
+    return runs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        exit("Usage: python3 team_2_trajectories.py <trajectory file> "
+             + "<output directory> [runs, e.g. 0-9,15]")
+
+    with TrajectoryReader( sys.argv[1] ) as reader:
+        runs = parseRuns( sys.argv[3] ) if len(sys.argv) == 4 else None
+        reader.exportTsv( sys.argv[2], runs )
@@ -0,0 +1,277 @@
+"""
+    A Wright-Fisher approximation to the drift simulator.
+
+    Everything printStatistics() reports depends only on the allele frequencies,
+    so for large populations we don't need to simulate individuals at all.
+    This engine advances the vector of allele counts directly, with a single
+    multinomial draw per generation, so each generation costs the same no
+    matter how large the population is.
+
+    Effective population size
+    -------------------------
+    The individual-based model is not an ideal Wright-Fisher population: the
+    parents are split into Nm males and Nf females, and children in the same
+    litter share both parents. Both effects increase the variance of allele
+    frequency change, so the multinomial draw uses the effective population
+    size Ne implied by the model rather than the census size N.
+
+    Pick two distinct gene copies at random from the child generation. If they
+    sit in the same child, one came from its father and one from its mother, so
+    they can't be copies of the same parental gene. Otherwise (probability
+    (2N-2)/(2N-1)) each is paternal or maternal with probability 1/2, and two
+    paternal copies come from the same father if the children are littermates
+    (probability s) or if two different litters picked the same father
+    (probability (1-s)/Nm); they are then copies of the same gene with
+    probability 1/2. Likewise for mothers. This gives the probability that the
+    two copies coalesce in the parent generation,
+
+        c = (2N-2)/(2N-1) * (1/8) * [ 2s + (1-s) * (1/Nm + 1/Nf) ],
+
+    and Ne = 1/(2c). With K the litter size drawn from probOfLitterSize, the
+    probability that two children are littermates is approximately
+
+        s = (E[K^2] - E[K]) / (E[K] * (N-1)).
+
+    Without litters (K = 1 always) this reduces to the classic sex-ratio
+    correction, Ne = 4 Nm Nf / (Nm + Nf). Since each child's sex is random,
+    Nm is redrawn from Binomial(N, 1/2) every generation.
+
+    Each generation we then draw n = round(2 Ne) gene copies multinomially from
+    the current frequencies (giving Var(dp) = p(1-p)/(2 Ne)), and scale the
+    result back to the 2N gene copies of the population. Each scaled count is
+    rounded up with probability equal to its fractional part (see
+    roundCounts()), so rounding doesn't favour common alleles over rare ones.
+    Lost and fixed alleles stay lost and fixed, just as in the individual-based
+    model.
+
+    The approximation is good when litters are small compared to the
+    population. When a handful of litters make up a whole generation (e.g.
+    the sea turtle example in team_2_settings.py with a small popSize), the
+    within-family structure matters and this engine fixes somewhat sooner
+    than the individual-based model.
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+from team_2_random import DriftRandom
+from team_2_profiling import NULL_PROFILER
+import numpy as np
+import math
+
+# How many standard deviations either side of N/2 probOfNumMales() covers; the
+# numbers of males further out are too unlikely to matter in double precision
+MALES_SPREAD = 40
+
+
+def probOfLittermates( popSize, probOfLitterSize ):
+    """
+        Return: the (approximate) probability that two distinct children,
+                chosen at random from one generation, came from the same litter
+    """
+    if popSize <= 1:
+        return 0.0
+    meanSize = sum( k * p for k, p in probOfLitterSize.items() )
+    meanSquare = sum( k * k * p for k, p in probOfLitterSize.items() )
+    if meanSize <= 0:
+        return 0.0
+    s = (meanSquare - meanSize) / (meanSize * (popSize - 1))
+    return min( max(s, 0.0), 1.0 )
+
+
+def effectivePopulationSize( popSize, numMales, probOfLitterSize ):
+    """
+        Calculates the effective population size of a generation (see the
+        documentation at the top of this file).
+
+        Params:
+            popSize: the census population size N
+            numMales: the number of males in the parent generation (the rest
+                      are female)
+            probOfLitterSize: the litter-size probability dictionary
+        Return: the effective population size Ne (a float)
+    """
+    numFemales = popSize - numMales
+    if numMales <= 0 or numFemales <= 0:
+        exit( "Sorry, the population can no longer reproduce (it has "
+              + str(numMales) + " males and " + str(numFemales) + " females)." )
+
+    s = probOfLittermates( popSize, probOfLitterSize )
+    sameCopy = (1/8) * ( 2*s + (1 - s) * (1/numMales + 1/numFemales) )
+    if popSize > 1:
+        sameCopy *= (2*popSize - 2) / (2*popSize - 1)
+    return 1 / (2*sameCopy)
+
+
+def probOfNumMales( popSize ):
+    """
+        Return: a 2-tuple of arrays: the possible numbers of males in a
+                generation that can reproduce (1 ... N-1, or for large N the
+                ones within MALES_SPREAD standard deviations of N/2), and the
+                probability of each (Binomial(N, 1/2), leaving out the all-male
+                and all-female generations)
+    """
+    spread = int( math.ceil( MALES_SPREAD * math.sqrt(popSize) / 2 ) )
+    numMales = np.arange( max(1, popSize//2 - spread),
+                          min(popSize - 1, popSize//2 + spread) + 1 )
+    logProbs = np.array( [ math.lgamma(popSize + 1) - math.lgamma(males + 1)
+                           - math.lgamma(popSize - males + 1)
+                           for males in numMales.tolist() ] )
+    probs = np.exp( logProbs - logProbs.max() )
+    return numMales, probs / probs.sum()
+
+
+def roundCounts( exact, total, rng ):
+    """
+        Rounds a vector of (non-negative) counts to whole numbers summing to
+        total, without biasing any of them: each count is rounded up with
+        probability equal to its fractional part, and down otherwise. The
+        counts to round up are picked by systematic sampling (one uniform
+        draw, stepping through the fractional parts a whole unit at a time),
+        so exactly enough of them are rounded up to make the total. Whole
+        counts (zero in particular) are never changed.
+
+        Params:
+            exact: the counts to round (summing, up to rounding error, to total)
+            total: the total the rounded counts must sum to
+            rng: a numpy.random.Generator
+        Return: the rounded counts (an integer array)
+    """
+    exact = np.asarray(exact, dtype=np.float64)
+    rounded = np.floor(exact).astype(np.int64)
+    shortfall = int(total - rounded.sum())
+    fractional = np.flatnonzero( exact > rounded )
+    if shortfall > 0 and len(fractional) > 0:
+        cumulative = np.cumsum( exact[fractional] - rounded[fractional] )
+        # The fractional parts add up to shortfall, up to rounding error
+        cumulative *= shortfall / cumulative[-1]
+        points = rng.random() + np.arange(shortfall)
+        picked = np.searchsorted( cumulative, points, side="right" )
+        rounded[ fractional[ np.minimum(picked, len(fractional) - 1) ] ] += 1
+    return rounded
+
+
+def rescaleCounts( counts, total, rng ):
+    """
+        Scales a vector of counts to a new total, rounding with roundCounts(),
+        so the expected value of each scaled count is exactly its share of the
+        new total. Zero counts stay zero, and (as long as the new total isn't
+        smaller than the old one) nonzero counts stay nonzero.
+
+        Return: the rescaled counts (an integer array summing to total)
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    return roundCounts( counts * (total / counts.sum()), total, rng )
+
+
+def advanceCounts( counts, numMales, popSize, probOfLitterSize, rng ):
+    """
+        Advances the allele counts by one generation.
+
+        Params:
+            counts: the number of copies of each allele (summing to 2*popSize)
+            numMales: the number of males in the parent generation
+            popSize: the population size
+            probOfLitterSize: the litter-size probability dictionary
+            rng: a numpy.random.Generator
+        Return: the new counts (an integer array summing to 2*popSize)
+    """
+    totalAlleles = 2*popSize
+    Ne = effectivePopulationSize( popSize, numMales, probOfLitterSize )
+    numDraws = min( max(int(round(2*Ne)), 1), totalAlleles )
+
+    counts = np.asarray(counts, dtype=np.int64)
+    drawn = rng.multinomial( numDraws, counts / counts.sum() )
+    if numDraws == totalAlleles:
+        return drawn
+    return rescaleCounts( drawn, totalAlleles, rng )
+
+
+def simulateDriftWrightFisher( species, endAfterFixedNumGenerations=False,
+                               numGenerations=0, rng=None, recorder=None,
+                               profiler=None ):
+    """
+        Simulates genetic drift of three alleles in a given species, using the
+        Wright-Fisher approximation described at the top of this file. Takes
+        the same parameters as simulateDrift(), and returns results in the same
+        form.
+
+        Note: only the species' allele frequencies are updated; its individuals
+        are left as they were in the first generation.
+
+        Parameters:
+            species: An object of the Species class
+            endAfterFixedNumGenerations: If true, the simulation will run for
+                                numGenerations generations. If false, it will
+                                continue until one allele has become fixed.
+            numGenerations: the number of generations to simulate
+            rng: a DriftRandom (a freshly seeded one is used if None)
+            recorder: a Recorder to hand each generation's frequencies to,
+                      instead of keeping them all (see team_2_recording.py)
+            profiler: a Profiler to time each generation with (see
+                      team_2_profiling.py)
+
+        Returns: a list of 3-tuples. The 3-tuple at position i represents the
+                 frequencies of the three alleles at generation i. (If a
+                 recorder was given, the recorder is returned instead.)
+    """
+    # Sanity-check the input
+    if (not endAfterFixedNumGenerations) and numGenerations != 0:
+        exit("Sorry, you can't request that we simulate drift until fixation while "
+             + "also running a fixed number of generations.")
+    elif endAfterFixedNumGenerations and numGenerations < 0:
+        exit("Sorry, number of generations to simulate must be positive.")
+
+    if math.fsum(species.getProbOfProducingNumOffspring().values()) != 1.0:
+        exit( "Sorry, probabilities of producing offspring must sum to 1 "\
+              + "(yours sum to "\
+              + str( math.fsum(species.getProbOfProducingNumOffspring().values()) )\
+              + ")." )
+
+    if rng is None:
+        rng = DriftRandom()
+    if profiler is None:
+        profiler = NULL_PROFILER
+
+    popSize = species.getPopulationSize()
+    probOfLitterSize = species.getProbOfProducingNumOffspring()
+    totalAlleles = 2*popSize
+
+    counts = np.array( species.getAlleleCounts(), dtype=np.int64 )
+    numMales = species.getPopulationArrays().countSexes()[0]
+
+    currentGen = 0
+    frequencies = species.getAlleleFrequencies()
+    results = []
+    if recorder is None:
+        results.append( frequencies )
+    else:
+        recorder.record( currentGen, frequencies )
+    while True:
+        if endAfterFixedNumGenerations:
+            if currentGen >= numGenerations:
+                break
+        elif counts.max() == totalAlleles:
+            break
+
+        profiler.startGeneration()
+        counts = advanceCounts( counts, numMales, popSize, probOfLitterSize,
+                                rng.generator )
+        # The children become the next parents; each has a random sex
+        numMales = int( rng.generator.binomial(popSize, 0.5) )
+        profiler.lap("advance")
+
+        frequencies = tuple(int(count)/totalAlleles for count in counts)
+        currentGen += 1
+        if recorder is None:
+            results.append( frequencies )
+        else:
+            recorder.record( currentGen, frequencies )
+        profiler.lap("record")
+        profiler.endGeneration()
+
+    profiler.endRun()
+    species.setAlleleFrequencies( frequencies )
+    if recorder is not None:
+        recorder.finish()
+        return recorder
+    return results
@@ -0,0 +1,65 @@
+"""
+    Checks the "wrightfisher" engine against the exact solution of the chain
+    it simulates (see team_2_markov.py).
+
+    Run with: python3 -m unittest test_team_2_wright_fisher
+
+    Young, Gibson, Jennings, and Smith
+"""
+
+import math
+import unittest
+import numpy as np
+from team_2_species import Species
+from team_2_random import DriftRandom, replicateSeed
+from team_2_wright_fisher import roundCounts, simulateDriftWrightFisher
+from team_2_markov import ExactSolution, isAvailable
+
+# A small population with a rare allele, so that biased rounding (which loses
+# rare alleles early) shows up in a few seconds' worth of simulations
+POP_SIZE = 30
+STARTING_FREQUENCIES = ( 0.45, 0.45, 0.1 )
+PROB_OF_LITTER_SIZE = { 1: 0.95, 2: 0.05 }
+NUM_RUNS = 3000
+SEED = 11
+
+
+class TestRoundCounts(unittest.TestCase):
+
+    def test_keeps_total_and_zeros(self):
+        rng = np.random.default_rng( SEED )
+        exact = np.array( [0.3, 5.45, 0.0, 14.25] )
+        for _ in range(1000):
+            rounded = roundCounts( exact, 20, rng )
+            self.assertEqual( rounded.sum(), 20 )
+            self.assertEqual( rounded[2], 0 )
+            self.assertTrue( np.all( np.abs(rounded - exact) < 1 ) )
+
+    def test_is_unbiased(self):
+        rng = np.random.default_rng( SEED )
+        exact = np.array( [0.3, 5.45, 0.0, 14.25] )
+        total = sum( roundCounts(exact, 20, rng) for _ in range(20000) )
+        np.testing.assert_allclose( total / 20000, exact, atol=0.02 )
+
+
+@unittest.skipUnless( isAvailable(), "the exact solution needs SciPy" )
+class TestAgainstExactSolution(unittest.TestCase):
+
+    def test_mean_generations_to_fixation(self):
+        generations = []
+        for replicate in range(NUM_RUNS):
+            rng = DriftRandom( replicateSeed(SEED, replicate) )
+            species = Species( POP_SIZE, STARTING_FREQUENCIES,
+                               PROB_OF_LITTER_SIZE, rng=rng )
+            results = simulateDriftWrightFisher( species, rng=rng )
+            generations.append( len(results) - 1 )
+
+        exact = ExactSolution( POP_SIZE, STARTING_FREQUENCIES,
+                               PROB_OF_LITTER_SIZE, cacheDir=None )
+        standardError = np.std(generations) / math.sqrt(NUM_RUNS)
+        self.assertLess( abs( np.mean(generations) - exact.getMean() ),
+                         4*standardError )
+
+
+if __name__ == "__main__":
+    unittest.main()